@@ -0,0 +1,112 @@
+"""
+Wall time of N queries answered one by one, concurrently, and with search_many.
+
+    python -m benchmarks.bench_batch_search [--sizes 1,8,32,64] [--mode conceptual] [--with-summary]
+
+Runs offline against benchmarks.fakes: the fake Gemini adds --embed-latency and
+--generate-latency per call, and an in-memory Milvus collection holds
+--chunks synthetic chunks. Queries come from ground_truth.json (cycled when
+N is larger). The three columns are:
+
+    sequential   await run_semantic_search for each query in turn
+    concurrent   asyncio.gather of N run_semantic_search calls
+    batch        search_many: one embed request, one multi-vector search and
+                 a shared rerank budget
+
+The LLM calls per query are the same in every column. What batching saves is
+the N embed requests and N search round trips, and how the reranks are
+scheduled.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.bench_offline import FILLER
+
+
+def _corpus(ground_truth: list[str], chunks: int, seed: int = 0):
+    rng = random.Random(seed)
+    for i in range(chunks):
+        topic = ground_truth[i % len(ground_truth)].split()
+        words = [rng.choice(topic) if rng.random() < 0.3 else rng.choice(FILLER) for _ in range(150)]
+        yield f"file-{i // 10:04d}", f"file-{i // 10:04d}:bench:{i:06d}", " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,8,32,64")
+    parser.add_argument("--mode", choices=["conceptual", "keyword"], default="conceptual")
+    parser.add_argument("--with-summary", action="store_true")
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--embed-latency", type=float, default=0.1)
+    parser.add_argument("--generate-latency", type=float, default=0.5)
+    parser.add_argument("--ground-truth", default="ground_truth.json")
+    args = parser.parse_args()
+
+    with open(args.ground_truth, encoding="utf-8") as f:
+        queries = [item["query"] for item in json.load(f)]
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    os.environ.setdefault("EMBED_CACHE_ENABLED", "0")
+    workdir = tempfile.mkdtemp(prefix="bench-batch-")
+    os.environ["LEXICAL_INDEX_DB"] = os.path.join(workdir, "lexical.sqlite")
+    os.environ.setdefault("GEMINI_RATE_LIMITS", json.dumps({
+        "models/embedding-001": {"rpm": 1_000_000, "tpm": 1_000_000_000},
+        "gemini-1.5-pro": {"rpm": 1_000_000, "tpm": 1_000_000_000},
+    }))
+
+    from benchmarks.fakes import FakeGemini, install_fake_gemini, install_in_memory_milvus, hash_embedding
+    from utils.search_pipeline import run_semantic_search, search_many
+    from vectorstore.milvus_client import get_milvus_client
+
+    fake = install_fake_gemini(FakeGemini(args.embed_latency, args.generate_latency))
+    install_in_memory_milvus()
+    rows = {"pdf_id": [], "file_id": [], "chunk": [], "embedding": []}
+    for file_id, pdf_id, text in _corpus(queries, args.chunks):
+        rows["pdf_id"].append(pdf_id)
+        rows["file_id"].append(file_id)
+        rows["chunk"].append(text)
+        rows["embedding"].append(hash_embedding(text))
+    get_milvus_client().insert(rows)
+
+    api_key = os.environ["GEMINI_API_KEY"]
+
+    async def sequential(batch):
+        for query in batch:
+            await run_semantic_search(query, args.mode, api_key, timings={}, include_summary=args.with_summary)
+
+    async def concurrent(batch):
+        await asyncio.gather(*(run_semantic_search(query, args.mode, api_key, timings={},
+                                                   include_summary=args.with_summary) for query in batch))
+
+    async def batched(batch):
+        async for _ in search_many(batch, args.mode, api_key, include_summary=args.with_summary):
+            pass
+
+    async def run():
+        await batched(queries[:2])  # warm up the scheduler and executors
+        print(f"{'N':>4} {'sequential':>12} {'concurrent':>12} {'batch':>12} {'batch/query':>12} {'batch embeds':>12}")
+        for n in (int(size) for size in args.sizes.split(",")):
+            batch = [queries[i % len(queries)] for i in range(n)]
+            timings = []
+            for fn in (sequential, concurrent, batched):
+                before = fake.calls["embed"]
+                start = time.perf_counter()
+                await fn(batch)
+                timings.append(time.perf_counter() - start)
+                embed_calls = fake.calls["embed"] - before
+            print(f"{n:>4} {timings[0]:>11.2f}s {timings[1]:>11.2f}s {timings[2]:>11.2f}s "
+                  f"{timings[2] / n * 1000:>10.0f}ms {embed_calls:>12}")
+
+    try:
+        asyncio.run(run())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
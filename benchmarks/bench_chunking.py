@@ -0,0 +1,95 @@
+"""
+Compare the old encode/decode chunker with the offset-based chunk_pages.
+
+    python -m benchmarks.bench_chunking --pdf big.pdf [--pdf other.pdf]
+    python -m benchmarks.bench_chunking --pages 300     # synthetic document
+
+Reports wall time, chunk count, the largest chunk and how many chunks differ
+from the source text (decoded chunks carry [CLS]/[SEP] and rewritten spacing).
+"""
+import argparse
+import random
+import time
+
+from embedding.generator import chunk_pages, get_tokenizer, MAX_CHUNK_CHARS
+from utils.pdf_utils import extract_pages_from_pdf
+
+WORDS = (
+    "neural network gradient descent backpropagation dataset model training inference "
+    "artificial intelligence machine learning regression classification clustering "
+    "the of and to in is that for with as on by this be are from"
+).split()
+
+
+def legacy_chunk_text_by_tokens(text, tokenizer, chunk_size=512, overlap=100):
+    # The previous implementation, kept here as the baseline
+    tokens = tokenizer.encode(text)
+    chunks = []
+    for i in range(0, len(tokens), chunk_size - overlap):
+        chunks.append(tokenizer.decode(tokens[i:i + chunk_size]))
+    return chunks
+
+
+def synthetic_pages(n_pages: int, words_per_page: int = 450, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    pages = []
+    for p in range(n_pages):
+        lines = []
+        for _ in range(words_per_page // 15):
+            lines.append(" ".join(rng.choice(WORDS) for _ in range(15)).capitalize() + ".")
+        pages.append(f"Page {p + 1}\n" + "\n".join(lines) + "\n")
+    return pages
+
+
+def run(name: str, pages: list[str], repeat: int) -> dict:
+    tokenizer = get_tokenizer()
+    text = "".join(pages)
+
+    legacy_times, new_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        legacy = legacy_chunk_text_by_tokens(text, tokenizer)
+        legacy_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        new = chunk_pages(pages, tokenizer=tokenizer)
+        new_times.append(time.perf_counter() - start)
+
+    legacy_s, new_s = min(legacy_times), min(new_times)
+    return {
+        "document": name,
+        "pages": len(pages),
+        "chars": len(text),
+        "legacy_seconds": round(legacy_s, 4),
+        "offset_seconds": round(new_s, 4),
+        "speedup": round(legacy_s / new_s, 2) if new_s else None,
+        "legacy_chunks": len(legacy),
+        "offset_chunks": len(new),
+        "legacy_not_in_source": sum(1 for c in legacy if c not in text),
+        "offset_not_in_source": sum(1 for c in new if c["text"] not in text),
+        "legacy_over_limit": sum(1 for c in legacy if len(c.encode("utf-8")) > MAX_CHUNK_CHARS),
+        "offset_max_chunk_bytes": max((len(c["text"].encode("utf-8")) for c in new), default=0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", action="append", default=[], help="PDF file(s) to chunk")
+    parser.add_argument("--pages", type=int, default=300, help="synthetic page count when no --pdf is given")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    documents = [(path, extract_pages_from_pdf(path)) for path in args.pdf]
+    if not documents:
+        documents = [(f"synthetic-{args.pages}p", synthetic_pages(args.pages))]
+
+    for name, pages in documents:
+        result = run(name, pages, args.repeat)
+        print(f"\n📄 {result['document']} ({result['pages']} pages, {result['chars']} chars)")
+        for key, value in result.items():
+            if key not in ("document", "pages", "chars"):
+                print(f"   {key:<22} {value}")
+
+
+if __name__ == "__main__":
+    main()
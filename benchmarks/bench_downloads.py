@@ -0,0 +1,158 @@
+"""
+Drive download throughput and failure handling, against benchmarks.drive_standin.
+
+    python -m benchmarks.bench_downloads [--files 40] [--size-mb 2] [--workers 8] [--bandwidth-mb 8] [--json out.json]
+
+Throughput: --files PDFs of --size-mb each, served at --bandwidth-mb MB/s per
+connection with --latency seconds before the headers. Two columns:
+
+    legacy     the old download_pdf_by_id: requests.get per file, no session,
+               whole body through response.content, one file at a time
+    streamed   ingest.downloads over the shared session, --workers files at
+               once (as IngestionPipeline's download workers run them)
+
+Reported: wall seconds, MB/s, TCP connections opened and the peak Python heap
+(tracemalloc), which shows the whole-body buffering of the legacy path.
+
+Checks, each against its own stand-in, exit non-zero if any fails:
+
+    confirm      a file above the size limit behind the virus-scan warning page
+    resume       every first response drops after 64 KiB; Range resumes it
+    no_ranges    the same drops on a server that ignores Range; restarts
+    private      a 200 HTML sign-in page is rejected, nothing left on disk
+    not_pdf      a binary that is not a PDF is rejected after the first bytes
+    missing      404
+    in_memory    download_drive_bytes with a drop and a resume
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+MB = 1 << 20
+
+
+def make_pdf(size: int, seed: int) -> bytes:
+    body = random.Random(seed).randbytes(max(0, size - 32))
+    return b"%PDF-1.7\n" + body + b"\n%%EOF\n"
+
+
+def legacy_download(base_url: str, file_id: str, dest_folder: str) -> str:
+    # The download_pdf_by_id this subsystem replaced
+    import requests
+    response = requests.get(f"{base_url}?export=download&id={file_id}")
+    path = os.path.join(dest_folder, f"{file_id}.pdf")
+    with open(path, "wb") as f:
+        f.write(response.content)
+    return path
+
+
+def throughput(args, workdir: str) -> dict:
+    from benchmarks.drive_standin import DriveStandIn
+    from ingest.downloads import download_drive_file
+
+    files = {f"file-{i:04d}": make_pdf(int(args.size_mb * MB), i) for i in range(args.files)}
+    total_mb = sum(len(body) for body in files.values()) / MB
+    report = {}
+    for name in ("legacy", "streamed"):
+        dest = os.path.join(workdir, name)
+        os.makedirs(dest)
+        with DriveStandIn(files, bandwidth=args.bandwidth_mb * MB, latency=args.latency) as server:
+            base_url = server.url + "/uc"
+            tracemalloc.start()
+            start = time.perf_counter()
+            if name == "legacy":
+                paths = [legacy_download(base_url, file_id, dest) for file_id in files]
+            else:
+                with ThreadPoolExecutor(args.workers) as pool:
+                    paths = list(pool.map(lambda file_id: download_drive_file(file_id, dest, base_url), files))
+            seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            connections = server.connections
+        ok = all(p and os.path.getsize(p) == len(files[file_id]) for p, file_id in zip(paths, files))
+        report[name] = {
+            "seconds": round(seconds, 2),
+            "mb_per_second": round(total_mb / seconds, 2),
+            "connections": connections,
+            "peak_heap_mb": round(peak / MB, 1),
+            "complete": ok,
+        }
+        print(f"{name:<9} {seconds:>7.2f}s  {total_mb / seconds:>7.2f} MB/s  {connections:>3} connections  "
+              f"peak heap {peak / MB:>7.1f} MB  {'ok' if ok else 'INCOMPLETE'}")
+    return report
+
+
+def checks(workdir: str) -> dict:
+    from benchmarks.drive_standin import DriveStandIn
+    from ingest.downloads import download_drive_bytes, download_drive_file
+
+    small, large = make_pdf(300 << 10, 1), make_pdf(3 * MB, 2)
+    files = {"small": small, "large": large, "junk": random.Random(3).randbytes(200 << 10)}
+
+    def same(path, body):
+        if not path:
+            return False
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).digest() == hashlib.sha256(body).digest()
+
+    def nothing_left(dest, file_id):
+        return not any(name.startswith(file_id) for name in os.listdir(dest))
+
+    cases = {
+        "confirm": ({"confirm_bytes": 1 * MB}, lambda d, u: same(download_drive_file("large", d, u), large)),
+        "resume": ({"drop_first": 1}, lambda d, u: same(download_drive_file("large", d, u), large)),
+        "no_ranges": ({"drop_first": 1, "ranges": False},
+                      lambda d, u: same(download_drive_file("large", d, u), large)),
+        "private": ({}, lambda d, u: download_drive_file("private-x", d, u) is None and nothing_left(d, "private-x")),
+        "not_pdf": ({}, lambda d, u: download_drive_file("junk", d, u) is None and nothing_left(d, "junk")),
+        "missing": ({}, lambda d, u: download_drive_file("nope", d, u) is None),
+        "in_memory": ({"drop_first": 1, "drop_after": 100 << 10}, lambda d, u: download_drive_bytes("small", u) == small),
+    }
+    results = {}
+    for name, (options, check) in cases.items():
+        dest = os.path.join(workdir, f"check-{name}")
+        os.makedirs(dest)
+        with DriveStandIn(files, **options) as server:
+            try:
+                passed = bool(check(dest, server.url + "/uc"))
+            except Exception as e:
+                print(f"   {name}: raised {e!r}")
+                passed = False
+            results[name] = {"passed": passed, "requests": {f"{p} {s}": n for (p, s), n in server.requests.items()}}
+        print(f"{'✅' if passed else '❌'} {name:<10} {results[name]['requests']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--size-mb", type=float, default=2)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--bandwidth-mb", type=float, default=8, help="per connection; 0 = unthrottled")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DOWNLOAD_BACKOFF", "0.05")
+    os.environ.setdefault("DOWNLOAD_POOL_SIZE", str(args.workers))
+    workdir = tempfile.mkdtemp(prefix="bench-downloads-")
+    try:
+        report = {"throughput": throughput(args, workdir), "checks": checks(workdir)}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if not all(result["passed"] for result in report["checks"].values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Recall / latency sweep over vector index configurations.
+
+    python -m benchmarks.bench_index_sweep [--chunks 20000] [--top-k 20] [--uri path-or-url] [--json out.json]
+
+Runs offline on Milvus Lite (a file in a temporary directory) unless --uri
+points at a real server. A synthetic corpus is generated from ground_truth.json:
+every relevant file gets --chunks-per-file chunks about its queries and the
+rest of --chunks are distractors. Embeddings come from benchmarks.fakes.hash_embedding,
+so no Gemini calls are made. Every configuration gets its own collection, built
+through MilvusClient with an IndexSpec, and every ground-truth query is searched
+one at a time with each set of search params. Reported per row:
+
+    build_s      insert + flush + compaction + index rebuild + load
+    p50/p95 ms   single-query search latency
+    recall@k     overlap with the exact top-k (numpy, same metric)
+    file_recall  share of the query's relevant files among the files of the top-k hits
+    bytes/vec    IndexSpec.bytes_per_vector
+
+Milvus Lite has no IVF_PQ and no FLOAT16 vectors; those rows are reported as
+unsupported there and measured against a real server.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_offline import _paragraph
+
+# (index type, metric, vector type, build params, [search params...])
+CONFIGS = [
+    ("IVF_FLAT", "L2", "FLOAT", {}, [{"nprobe": 10}, {"nprobe": 32}]),
+    ("IVF_FLAT", "COSINE", "FLOAT", {}, [{"nprobe": 10}]),
+    ("IVF_SQ8", "COSINE", "FLOAT", {}, [{"nprobe": 8}, {"nprobe": 16}, {"nprobe": 64}]),
+    ("IVF_PQ", "COSINE", "FLOAT", {}, [{"nprobe": 32}]),
+    ("HNSW", "COSINE", "FLOAT", {}, [{"ef": 64}, {"ef": 128}, {"ef": 256}, {"ef": 512}]),
+    ("HNSW", "IP", "FLOAT", {}, [{"ef": 256}]),
+    ("HNSW", "COSINE", "FLOAT16", {}, [{"ef": 256}]),
+]
+LITE_UNSUPPORTED = ("IVF_PQ", "FLOAT16")
+
+
+def build_rows(ground_truth: list[dict], chunks: int, chunks_per_file: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    topics: dict[str, list[str]] = {}
+    for item in ground_truth:
+        for file_id in item["relevant_file_ids"]:
+            topics.setdefault(file_id, []).extend(item["query"].lower().split())
+    rows = {"pdf_id": [], "file_id": [], "chunk": []}
+
+    def add(file_id, i, text):
+        rows["pdf_id"].append(f"{file_id[:40]}:sweep:{i:06d}")
+        rows["file_id"].append(file_id)
+        rows["chunk"].append(text)
+
+    for file_id, words in topics.items():
+        for i in range(chunks_per_file):
+            add(file_id, i, _paragraph(rng, words))
+    for i in range(max(0, chunks - len(rows["pdf_id"]))):
+        add(f"distractor-{i // chunks_per_file:05d}", i, _paragraph(rng, []))
+    return rows
+
+
+def exact_top_k(spec, matrix: np.ndarray, queries: np.ndarray, top_k: int) -> list[list[int]]:
+    if spec.metric == "L2":
+        scores = -((queries ** 2).sum(axis=1)[:, None] - 2 * queries @ matrix.T + (matrix ** 2).sum(axis=1)[None, :])
+    else:
+        scores = queries @ matrix.T  # both sides are unit length under COSINE/IP
+    return [list(np.argsort(-row)[:top_k]) for row in scores]
+
+
+def sweep(args) -> list[dict]:
+    from benchmarks.fakes import hash_embedding
+    from vectorstore.index_config import IndexSpec
+    from pymilvus import utility
+    from vectorstore.milvus_client import MilvusClient
+
+    with open(args.ground_truth, encoding="utf-8") as f:
+        ground_truth = json.load(f)
+    rows = build_rows(ground_truth, args.chunks, args.chunks_per_file)
+    rows["embedding"] = [hash_embedding(text) for text in rows["chunk"]]
+    position = {pdf_id: i for i, pdf_id in enumerate(rows["pdf_id"])}
+    queries = [item["query"] for item in ground_truth]
+    relevant = [set(item["relevant_file_ids"]) for item in ground_truth]
+    query_vectors = [hash_embedding(query) for query in queries]
+    print(f"📚 {len(rows['pdf_id'])} chunks, {len(queries)} queries, top_k={args.top_k}")
+
+    lite = not os.environ["MILVUS_URL"].startswith(("http://", "https://", "tcp://"))
+    results = []
+    for n, (index_type, metric, vector_type, build, variants) in enumerate(CONFIGS):
+        spec = IndexSpec(index_type, metric, vector_type, build)
+        label = f"{index_type}/{metric}/{vector_type}"
+        if lite and (index_type in LITE_UNSUPPORTED or vector_type in LITE_UNSUPPORTED):
+            # Lite accepts an IVF_PQ index but silently searches without it
+            print(f"⚠️ {label}: not supported by Milvus Lite, run with --uri against a server")
+            results.append({"config": label, "error": "not supported by Milvus Lite"})
+            continue
+        start = time.perf_counter()
+        try:
+            client = MilvusClient(alias=f"sweep_{n}", collection_name=f"sweep_{n}", spec=spec)
+            with client.bulk_writer(mirror=False) as writer:
+                writer.add(rows)
+            # Lite builds segment indexes in the background after a flush and reports them
+            # finished early; an explicit rebuild returns only once the index is in place
+            client.compact_and_reindex(rebuild_index=True)
+        except Exception as e:
+            print(f"⚠️ {label}: unsupported here ({str(e).splitlines()[0][:100]})")
+            results.append({"config": label, "error": str(e).splitlines()[0]})
+            continue
+        build_seconds = time.perf_counter() - start
+
+        matrix = spec.normalize(rows["embedding"])
+        exact = exact_top_k(spec, matrix, spec.normalize(query_vectors), args.top_k)
+        for search in variants:
+            searched = IndexSpec(index_type, metric, vector_type, build, search)
+            latencies, overlap, file_recall = [], [], []
+            client.collection.search(data=searched.prepare(query_vectors[:1]), anns_field="embedding",
+                                     param=searched.search_param(), limit=args.top_k)  # warm-up
+            for query_vector, truth, wanted in zip(query_vectors, exact, relevant):
+                t = time.perf_counter()
+                hits = client.collection.search(data=searched.prepare([query_vector]), anns_field="embedding",
+                                                param=searched.search_param(), limit=args.top_k,
+                                                output_fields=["pdf_id", "file_id"])[0]
+                latencies.append(time.perf_counter() - t)
+                found = {position[hit.entity.get("pdf_id")] for hit in hits}
+                overlap.append(len(found & set(truth)) / len(truth))
+                files = {hit.entity.get("file_id") for hit in hits}
+                file_recall.append(len(files & wanted) / len(wanted) if wanted else 1.0)
+            result = {
+                "config": label, "search": search, "build_s": round(build_seconds, 2),
+                "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+                "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 2),
+                f"recall@{args.top_k}": round(float(np.mean(overlap)), 4),
+                "file_recall": round(float(np.mean(file_recall)), 4),
+                "bytes_per_vector": spec.bytes_per_vector(),
+            }
+            results.append(result)
+            print(f"{label:<24} {json.dumps(search):<16} build {build_seconds:>6.1f}s  "
+                  f"p50 {result['p50_ms']:>6.2f}ms  p95 {result['p95_ms']:>6.2f}ms  "
+                  f"recall@{args.top_k} {result[f'recall@{args.top_k}']:.3f}  "
+                  f"file_recall {result['file_recall']:.3f}  {result['bytes_per_vector']} B/vec")
+        client.collection.release()
+        utility.drop_collection(client.collection_name, using=client.alias)
+        client.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--chunks-per-file", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--ground-truth", default="ground_truth.json")
+    parser.add_argument("--uri", help="Milvus server URL or Lite file (default: a temporary Lite file)")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-index-")
+    os.environ["MILVUS_URL"] = args.uri or os.path.join(workdir, "milvus.db")
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    os.environ["LEXICAL_INDEX_DB"] = os.path.join(workdir, "lexical.sqlite")
+    try:
+        results = sweep(args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
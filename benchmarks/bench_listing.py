@@ -0,0 +1,120 @@
+"""
+Drive folder listing: fixture parsing, HTTP listing, cache sharing and revalidation.
+
+    python -m benchmarks.bench_listing [--latency 0.2] [--json out.json]
+
+Parses the saved pages in benchmarks/fixtures/drive, then serves them from
+benchmarks.drive_standin (with --latency seconds per request) and lists the
+folder through ingest.drive_listing with the browser fallback off. Exits
+non-zero if any check fails:
+
+    fixture:*     every saved page parses to the expected files / next page
+    http          a two-page folder lists in full over HTTP
+    cached        a second listing within the TTL makes no request
+    singleflight  8 concurrent first listings of a folder make one fetch
+    revalidate    after the TTL an unchanged folder answers 304 and keeps its files
+    private       a sign-in page raises ListingError
+
+The old listing launched headless Chrome and slept 5 s per call; the timings
+printed here are for the HTTP path and a cache hit.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "drive")
+EXPECTED = {
+    "embedded_page1.html": (["1AbcPdf000001", "1AbcPdf000002"], True),
+    "embedded_page2.html": (["1AbcPdf000003"], False),
+    "embedded_empty.html": ([], False),
+    "folder_page.html": (["1AbcPdf000001", "1AbcPdf000002", "1AbcPdf000003"], False),
+    "sign_in.html": (None, False),
+}
+TTL = 1.0
+
+
+def fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def run(args) -> dict:
+    from benchmarks.drive_standin import DriveStandIn
+
+    pages = [fixture("embedded_page1.html"), fixture("embedded_page2.html")]
+    folders = {"course": pages, "course-2": pages, "empty": [fixture("embedded_empty.html")]}
+    results = {}
+
+    def check(name: str, passed: bool, **details):
+        results[name] = {"passed": bool(passed), **details}
+        print(f"{'✅' if passed else '❌'} {name:<26} {json.dumps(details, ensure_ascii=False)}")
+
+    with DriveStandIn({}, folders=folders, latency=args.latency) as server:
+        # Module settings are read at import time, so the environment goes first
+        os.environ["DRIVE_FOLDER_VIEW_URL"] = server.url + "/embeddedfolderview"
+        os.environ["LISTING_CACHE_TTL"] = str(TTL)
+        os.environ["LISTING_BROWSER_FALLBACK"] = "0"
+        from ingest.drive_listing import ListingError, list_folder, parse_folder_page
+
+        for name, (ids, has_next) in EXPECTED.items():
+            parsed = parse_folder_page(fixture(name))
+            got = None if parsed is None else [f["file_id"] for f in parsed[0]]
+            passed = got == ids and (parsed is None or bool(parsed[1]) == has_next)
+            check(f"fixture:{name.removesuffix('.html')}", passed, files=got, next_page=parsed and parsed[1])
+
+        def requests_made():
+            return sum(n for (path, _), n in server.requests.items() if path == "/embeddedfolderview")
+
+        url = "https://drive.google.com/drive/folders/course?usp=sharing"
+        start = time.perf_counter()
+        listing = list_folder(url)
+        http_ms = (time.perf_counter() - start) * 1000
+        check("http", [f["file_id"] for f in listing["files"]] == EXPECTED["folder_page.html"][0]
+              and listing["source"] == "http", ms=round(http_ms, 1), requests=requests_made(),
+              names=[f["file_name"] for f in listing["files"]])
+
+        before = requests_made()
+        start = time.perf_counter()
+        listing = list_folder(url)
+        cached_ms = (time.perf_counter() - start) * 1000
+        check("cached", listing["cached"] and requests_made() == before, ms=round(cached_ms, 3),
+              requests=requests_made() - before)
+
+        before = requests_made()
+        with ThreadPoolExecutor(8) as pool:
+            listings = list(pool.map(lambda _: list_folder("https://drive.google.com/drive/folders/course-2"),
+                                     range(8)))
+        check("singleflight", requests_made() - before == 2 and sum(not l["cached"] for l in listings) == 1,
+              requests=requests_made() - before, fetched=sum(not l["cached"] for l in listings))
+
+        time.sleep(TTL + 0.1)
+        listing = list_folder(url)
+        not_modified = server.requests.get(("/embeddedfolderview", 304), 0)
+        check("revalidate", not_modified == 1 and len(listing["files"]) == 3 and not listing["cached"],
+              not_modified=not_modified)
+
+        try:
+            list_folder("https://drive.google.com/drive/folders/private-abc")
+            check("private", False, error=None)
+        except ListingError as e:
+            check("private", True, error=str(e)[:80])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per stand-in request")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    results = run(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if not all(result["passed"] for result in results.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Search latency and recall of the local mmap index against exact search
+(and optionally against a Milvus collection).
+
+    python -m benchmarks.bench_local_index [--rows 300000] [--queries 200] [--nprobe 16]
+    python -m benchmarks.bench_local_index --milvus     # also time Milvus at MILVUS_URL
+
+The corpus is synthetic and clustered (like real chunk embeddings), and is
+written to a temporary directory as a new index generation. Recall@k is
+measured against the exact top-k from the same index.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+import vectorstore.local_index as local_index
+from vectorstore.local_index import LocalVectorIndex, build_generation, DIM
+
+
+def synthetic_batches(rows: int, clusters: int = 500, batch: int = 10000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, DIM)).astype(np.float32)
+    for start in range(0, rows, batch):
+        n = min(batch, rows - start)
+        vectors = centers[rng.integers(0, clusters, n)] + 0.35 * rng.normal(size=(n, DIM)).astype(np.float32)
+        ids = [f"f{(start + i) // 50}.pdf:bench:{start + i:07d}" for i in range(n)]
+        yield ids, [pdf_id.split(":")[0] for pdf_id in ids], ["chunk"] * n, vectors
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def timed(fn, queries) -> tuple[list[float], list]:
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(fn(q))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, results
+
+
+def report(name: str, latencies: list[float], recall: float | None = None):
+    line = (f"{name:<18} p50 {statistics.median(latencies):7.2f} ms   p95 {percentile(latencies, 95):7.2f} ms"
+            f"   max {max(latencies):7.2f} ms")
+    if recall is not None:
+        line += f"   recall@k {recall:.3f}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=300000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--nprobe", type=int, default=local_index.LOCAL_INDEX_NPROBE)
+    parser.add_argument("--milvus", action="store_true", help="also time search_chunks against Milvus")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        build_generation(synthetic_batches(args.rows), root)
+        print(f"built {args.rows} rows in {time.perf_counter() - start:.1f}s")
+        index = LocalVectorIndex(root)
+        print(index.stats())
+
+        rng = np.random.default_rng(1)
+        sample = rng.choice(index.count, size=args.queries, replace=False)
+        queries = [np.asarray(index.vectors[i]) + 0.1 * rng.normal(size=DIM).astype(np.float32) for i in sample]
+
+        def top_ids(results):
+            return {r["pdf_id"] for r in results}
+
+        mode = local_index.LOCAL_INDEX_MODE
+        local_index.LOCAL_INDEX_MODE = "exact"
+        exact_lat, exact = timed(lambda q: index.search(q, args.top_k), queries)
+        local_index.LOCAL_INDEX_MODE = mode
+        report("local exact", exact_lat)
+
+        if index.centroids is not None:
+            ivf_lat, ivf = timed(lambda q: index.search(q, args.top_k, nprobe=args.nprobe), queries)
+            recall = statistics.mean(len(top_ids(a) & top_ids(e)) / args.top_k for a, e in zip(ivf, exact))
+            report(f"local ivf/{args.nprobe}", ivf_lat, recall)
+
+        if args.milvus:
+            from utils.serach_chunks import search_chunks
+            milvus_lat, _ = timed(lambda q: search_chunks(q.tolist(), args.top_k), queries)
+            report("milvus", milvus_lat)
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+End-to-end benchmark that runs fully offline.
+
+    python -m benchmarks.bench_offline [--milvus memory|lite] [--concurrency 1,8,32]
+    python -m benchmarks.bench_offline --update-baseline      # rewrite benchmarks/baseline.json
+    python -m benchmarks.bench_offline --fail-on-regression   # exit 1 past --tolerance
+
+Gemini is replaced by benchmarks.fakes.FakeGemini: deterministic embeddings
+and rerank scores, with configurable latency and a retryable error rate.
+Milvus is either an in-memory fake behind the MilvusClient interface or
+Milvus Lite in a local file. A synthetic PDF corpus is generated from
+ground_truth.json: every relevant file gets pages about its queries, plus
+distractor files. The run measures:
+
+    ingest    files/s, chunks/s and wall time of IngestionPipeline over the corpus
+    query     every ground-truth query in both modes at each concurrency level:
+              p50/p95/p99 per stage, throughput, errors, precision/recall
+    memory    peak RSS of this process and of the parse worker processes
+
+The results are compared with benchmarks/baseline.json, metric by metric.
+The baseline is a committed file, so a regression also shows up in its diff
+when it is rewritten. Chunking needs the CHUNK_TOKENIZER tokenizer available
+locally (--tokenizer takes a path). Everything else, including the SQLite
+state, lives in a temporary directory.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+FILLER = (
+    "the of and to in is that for with as on by this be are from which system value method result "
+    "section example chapter figure table note process data model level used given general case form "
+    "number time point order between each first second also will can may these such other different"
+).split()
+# Metrics where a larger value is an improvement; everything else should go down
+HIGHER_IS_BETTER = ("per_second", "qps", "precision", "recall", "f1")
+
+
+# -- corpus ----------------------------------------------------------------------------
+
+def _paragraph(rng: random.Random, topic_words: list[str], words: int = 120) -> str:
+    out = []
+    for i in range(words):
+        out.append(rng.choice(topic_words) if topic_words and rng.random() < 0.3 else rng.choice(FILLER))
+    return " ".join(out).capitalize() + "."
+
+
+def build_corpus(ground_truth: dict[str, list[str]], dest: str, pages: int = 4,
+                 distractors: int = 40, seed: int = 0) -> list[str]:
+    """Write one synthetic PDF per file id (named <file_id>.pdf); returns the file ids."""
+    import pymupdf
+
+    rng = random.Random(seed)
+    topics: dict[str, list[str]] = {}
+    for query, file_ids in ground_truth.items():
+        for file_id in file_ids:
+            topics.setdefault(file_id, []).append(query)
+    for i in range(distractors):
+        topics[f"distractor-{i:04d}"] = []
+
+    os.makedirs(dest, exist_ok=True)
+    for file_id, queries in topics.items():
+        topic_words = " ".join(queries).split()
+        doc = pymupdf.open()
+        for p in range(pages):
+            page = doc.new_page()
+            heading = queries[p % len(queries)] if queries else f"Notes {p + 1}"
+            # insert_htmlbox shapes non-Latin scripts (the Hindi queries) with fallback fonts
+            html = f"<h3>{heading}</h3>" + "".join(f"<p>{_paragraph(rng, topic_words)}</p>" for _ in range(3))
+            page.insert_htmlbox(pymupdf.Rect(48, 48, 564, 794), html)
+        doc.save(os.path.join(dest, f"{file_id}.pdf"))
+        doc.close()
+    return list(topics)
+
+
+# -- measurement -----------------------------------------------------------------------
+
+def peak_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_ingest(file_ids: list[str], corpus: str, workdir: str, download_latency: float) -> dict:
+    from ingest.pipeline import IngestionPipeline
+
+    def download(file_id: str, dest_folder: str) -> str:
+        if download_latency:
+            time.sleep(download_latency)
+        os.makedirs(dest_folder, exist_ok=True)
+        path = os.path.join(dest_folder, f"{file_id}.pdf")
+        shutil.copyfile(os.path.join(corpus, f"{file_id}.pdf"), path)
+        return path
+
+    report = IngestionPipeline(download, os.path.join(workdir, "downloads")).run(file_ids)
+    wall = report["wall_seconds"]
+    chunks = report["stages"]["write"]["units"]
+    return {
+        "files": len(file_ids),
+        "chunks": chunks,
+        "wall_seconds": round(wall, 2),
+        "files_per_second": round(len(file_ids) / wall, 2),
+        "chunks_per_second": round(chunks / wall, 1),
+        "errors": sum(stage["errors"] for stage in report["stages"].values()),
+    }
+
+
+async def run_queries(ground_truth: dict, levels: list[int], modes: tuple) -> dict:
+    from utils.evaluation import evaluate
+    from utils.search_pipeline import run_semantic_search
+
+    # One untimed query so connections and lazily built state are in place
+    await run_semantic_search(next(iter(ground_truth)), "conceptual", os.environ["GEMINI_API_KEY"])
+    results = {}
+    for level in levels:
+        report = await evaluate(ground_truth, modes, level, include_summary=True)
+        wall = report["run"]["wall_seconds"]
+        level_result = {"qps": round(len(ground_truth) * len(modes) / wall, 2), "wall_seconds": wall}
+        for mode in modes:
+            scores = report["summary"][mode]
+            stages = report["latency"][mode]
+            level_result[mode] = {
+                "precision": scores["avg_precision"],
+                "recall": scores["avg_recall"],
+                "errors": scores["errors"],
+                **{f"{stage}_{p}": stats[p] for stage, stats in stages.items() if stats["count"]
+                   for p in ("p50_ms", "p95_ms", "p99_ms")},
+            }
+        results[f"c{level}"] = level_result
+        print(f"⚡ concurrency {level}: {level_result['qps']} queries/s, "
+              + ", ".join(f"{mode} p95 {level_result[mode].get('total_p95_ms')}ms" for mode in modes))
+    return results
+
+
+# -- baseline --------------------------------------------------------------------------
+
+def flatten(report: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current: dict, baseline: dict, tolerance: float, min_delta_ms: float = 5.0) -> list[str]:
+    """
+    Print each metric next to the baseline; return the ones that got worse by
+    more than `tolerance`. Latencies that moved less than `min_delta_ms` are
+    never flagged, since sub-millisecond stages swing by 100% on noise.
+    """
+    now, before = flatten(current["metrics"]), flatten(baseline["metrics"])
+    regressions = []
+    print(f"\n{'metric':<40} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in sorted(now.keys() | before.keys()):
+        if name not in now or name not in before:
+            print(f"{name:<40} {before.get(name, '-'):>10} {now.get(name, '-'):>10}")
+            continue
+        old, new = before[name], now[name]
+        change = (new - old) / old if old else (0.0 if new == old else float("inf"))
+        worse = -change if any(word in name for word in HIGHER_IS_BETTER) else change
+        flag = ""
+        noise = name.endswith("_ms") and abs(new - old) < min_delta_ms
+        if worse > tolerance and not noise and not name.endswith(("files", "chunks")):
+            flag = " ⚠️"
+            regressions.append(name)
+        print(f"{name:<40} {old:>10} {new:>10} {change:>+8.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--milvus", choices=["memory", "lite"], default="memory")
+    parser.add_argument("--ground-truth", default="ground_truth.json")
+    parser.add_argument("--pages", type=int, default=4, help="pages per synthetic PDF")
+    parser.add_argument("--distractors", type=int, default=40, help="extra files no query is about")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated query concurrency levels")
+    parser.add_argument("--modes", default="conceptual,keyword")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="mean fake embed latency (s)")
+    parser.add_argument("--generate-latency", type=float, default=0.3, help="mean fake generate latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="fraction of fake calls failing 429/503")
+    parser.add_argument("--download-latency", type=float, default=0.0, help="sleep per simulated download (s)")
+    parser.add_argument("--tokenizer", help="local tokenizer path (sets CHUNK_TOKENIZER)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative change before flagging")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore smaller latency changes")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--out", help="also write this run's report here")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary working directory")
+    args = parser.parse_args()
+
+    with open(args.ground_truth, encoding="utf-8") as f:
+        ground_truth = {item["query"]: item["relevant_file_ids"] for item in json.load(f)}
+    workdir = tempfile.mkdtemp(prefix="bench-offline-")
+
+    # Module-level settings are read at import time, so the environment goes first
+    os.environ.update({
+        "PROCESSED_DB": os.path.join(workdir, "processed.sqlite"),
+        "LEXICAL_INDEX_DB": os.path.join(workdir, "lexical.sqlite"),
+        "LOCAL_INDEX_DIR": os.path.join(workdir, "local_index"),
+        "EMBED_CACHE_DIR": os.path.join(workdir, "embedding_cache"),
+    })
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    os.environ.setdefault("EMBED_CACHE_ENABLED", "0")  # every query pays for its embedding
+    os.environ.setdefault("GEMINI_BACKOFF_BASE", "0.05")
+    os.environ.setdefault("GEMINI_BACKOFF_MAX", "1")
+    # Measure our own code, not the production quota
+    os.environ.setdefault("GEMINI_RATE_LIMITS", json.dumps({
+        "models/embedding-001": {"rpm": 1_000_000, "tpm": 1_000_000_000},
+        "gemini-1.5-pro": {"rpm": 1_000_000, "tpm": 1_000_000_000},
+    }))
+    if args.tokenizer:
+        os.environ["CHUNK_TOKENIZER"] = args.tokenizer
+    if args.milvus == "lite":
+        os.environ["MILVUS_URL"] = os.path.join(workdir, "milvus.db")
+
+    import asyncio
+
+    from benchmarks.fakes import FakeGemini, install_fake_gemini, install_in_memory_milvus
+
+    fake = install_fake_gemini(FakeGemini(args.embed_latency, args.generate_latency, args.error_rate))
+    if args.milvus == "memory":
+        install_in_memory_milvus()
+
+    try:
+        start = time.perf_counter()
+        file_ids = build_corpus(ground_truth, os.path.join(workdir, "corpus"), args.pages, args.distractors)
+        print(f"📄 Built {len(file_ids)} synthetic PDFs in {time.perf_counter() - start:.1f}s")
+
+        ingest = run_ingest(file_ids, os.path.join(workdir, "corpus"), workdir, args.download_latency)
+        ingest_rss = peak_rss_mb()
+        levels = [int(level) for level in args.concurrency.split(",")]
+        query = asyncio.run(run_queries(ground_truth, levels, tuple(args.modes.split(","))))
+
+        report = {
+            "config": {
+                "milvus": args.milvus, "pages": args.pages, "distractors": args.distractors,
+                "embed_latency": args.embed_latency, "generate_latency": args.generate_latency,
+                "error_rate": args.error_rate, "download_latency": args.download_latency,
+                "python": sys.version.split()[0], "cpus": os.cpu_count(),
+            },
+            "metrics": {
+                "ingest": ingest,
+                "query": query,
+                "memory": {
+                    "peak_rss_mb_after_ingest": ingest_rss,
+                    "peak_rss_mb": peak_rss_mb(),
+                    "peak_rss_mb_parse_workers": peak_rss_mb(resource.RUSAGE_CHILDREN),
+                },
+            },
+            "fake_gemini_calls": fake.calls,
+        }
+    finally:
+        from vectorstore.milvus_client import close_milvus
+        close_milvus()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    regressions = []
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != {**report["config"], "python": baseline["config"].get("python"),
+                                       "cpus": baseline["config"].get("cpus")}:
+            print("⚠️ Baseline was recorded with different settings; comparison is indicative only")
+        regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write("\n")
+        print(f"💾 Wrote baseline {args.baseline}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+How long a fresh worker takes to go from cold start to ready.
+
+    python -m benchmarks.bench_startup [--repeat 5] [--port 8765]
+
+For each run this starts `uvicorn main:app` in a new process and polls
+/ready until it returns 200. It reports the time until the port accepts
+connections, the time until ready and the per-resource load times from the
+registry. Separately it measures `import main` alone and lists the slowest
+imports (python -X importtime). GEMINI_API_KEY and MILVUS_URL are taken from
+the environment; pointing MILVUS_URL at a local Milvus Lite file
+(e.g. /tmp/bench.db) keeps the run offline.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+def _get(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def time_to_ready(port: int, timeout: float) -> dict:
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    listening = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+            try:
+                status, body = _get(f"http://127.0.0.1:{port}/ready")
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.02)
+                continue
+            if listening is None:
+                listening = time.perf_counter() - start
+            if status == 200:
+                return {
+                    "listening_seconds": round(listening, 3),
+                    "ready_seconds": round(time.perf_counter() - start, 3),
+                    "resources": {name: r["load_seconds"] for name, r in body["resources"].items()},
+                }
+            time.sleep(0.02)
+        raise TimeoutError(f"/ready did not return 200 within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def time_import() -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit: int = 10) -> list[tuple[str, float]]:
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            rows.append((name.strip(), int(cumulative) / 1e6))
+        except ValueError:
+            continue
+    # Only report top-level packages so nested imports are not double counted
+    top = {}
+    for name, seconds in rows:
+        root = name.split(".")[0]
+        top[root] = max(top.get(root, 0.0), seconds)
+    return sorted(top.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    if not os.getenv("GEMINI_API_KEY"):
+        os.environ["GEMINI_API_KEY"] = "benchmark"  # warmup only configures the SDK, no request is made
+
+    imports = [time_import() for _ in range(args.repeat)]
+    runs = [time_to_ready(args.port, args.timeout) for _ in range(args.repeat)]
+
+    print(f"import main        median {statistics.median(imports):.3f}s  min {min(imports):.3f}s")
+    listening = [r["listening_seconds"] for r in runs]
+    ready = [r["ready_seconds"] for r in runs]
+    print(f"accepting requests median {statistics.median(listening):.3f}s  min {min(listening):.3f}s")
+    print(f"ready              median {statistics.median(ready):.3f}s  min {min(ready):.3f}s")
+    print("resource load (median):")
+    for name in sorted(runs[0]["resources"]):
+        seconds = [r["resources"][name] for r in runs if r["resources"].get(name) is not None]
+        if seconds:
+            print(f"   {name:<32} {statistics.median(seconds):.3f}s")
+    print("slowest imports:")
+    for name, seconds in slowest_imports():
+        print(f"   {name:<32} {seconds:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Per-stage recall of the local scoring cascade against ground_truth.json.
+
+    python -m benchmarks.cascade_recall [--n 5,8,10,15,20] [--rerank] [--out cascade_recall.json]
+
+For every ground-truth query this embeds the query, takes the top 20 vector
+hits (with stored embeddings) and runs the cascade. File-level recall is
+reported after each stage:
+
+    retrieved     all vector hits (the ceiling for everything after it)
+    scored@N      top N by lexical + cosine score
+    deduped@N     top N after near-duplicate suppression (what the LLM sees)
+    reranked@N    files in the final top 10 after the LLM rerank (--rerank only;
+                  makes real Gemini calls)
+
+The LLM calls each setting would make per query are shown beside it, so the
+cost of a lower N can be weighed against the recall it loses. Needs
+GEMINI_API_KEY and a populated Milvus (or SEARCH_BACKEND=local index).
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+
+from utils.get_query_embedding import get_query_embedding
+from utils.local_scoring import cascade
+from utils.rerank_results_with_model import (rerank_results_with_model_parallel, RERANK_MODE,
+                                             RERANK_BATCH_SIZE)
+from utils.serach_chunks import search_chunks
+
+
+def _file(file_id: str) -> str:
+    # Single-PDF ingestion stores "<drive id>.pdf"; ground truth uses bare Drive ids
+    return file_id[:-4] if file_id.endswith(".pdf") else file_id
+
+
+def recall(relevant: set, file_ids) -> float:
+    return len(relevant & {_file(f) for f in file_ids}) / len(relevant) if relevant else 0.0
+
+
+def llm_calls(n: int) -> int:
+    return math.ceil(n / RERANK_BATCH_SIZE) if RERANK_MODE == "listwise" else n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ground-truth", default="ground_truth.json")
+    parser.add_argument("--n", default="5,8,10,15,20", help="comma-separated candidate counts to try")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--rerank", action="store_true", help="also measure recall after the LLM rerank")
+    parser.add_argument("--out", help="write per-query stage lists and the summary as JSON")
+    args = parser.parse_args()
+
+    sizes = sorted({int(n) for n in args.n.split(",")})
+    with open(args.ground_truth, encoding="utf-8") as f:
+        ground_truth = [(item["query"], set(item["relevant_file_ids"])) for item in json.load(f)]
+
+    stages = {"retrieved": []}
+    for n in sizes:
+        stages[f"scored@{n}"] = []
+        stages[f"deduped@{n}"] = []
+        if args.rerank:
+            stages[f"reranked@{n}"] = []
+    details = []
+
+    for query, relevant in ground_truth:
+        embedding = get_query_embedding(query)
+        results = search_chunks(embedding, args.top_k, with_embeddings=True)
+        file_of = {r["pdf_id"]: r["file_id"] for r in results}
+        trace = {}
+        cascade(query, embedding, results, top_n=max(sizes), trace=trace)
+
+        row = {"query": query, "retrieved": recall(relevant, file_of.values())}
+        stages["retrieved"].append(row["retrieved"])
+        for n in sizes:
+            for stage, ids in (("scored", trace["scored"][:n]), ("deduped", trace["deduplicated"][:n])):
+                value = recall(relevant, (file_of[pdf_id] for pdf_id in ids))
+                stages[f"{stage}@{n}"].append(value)
+                row[f"{stage}@{n}"] = value
+            if args.rerank:
+                reranked = rerank_results_with_model_parallel(query, results, os.getenv("GEMINI_API_KEY"),
+                                                              top_k=10, query_embedding=embedding,
+                                                              cascade_top_n=n)
+                value = recall(relevant, (r["file_id"] for r in reranked))
+                stages[f"reranked@{n}"].append(value)
+                row[f"reranked@{n}"] = value
+        details.append(row)
+        print(f"✅ {query}: retrieved recall {row['retrieved']:.2f}")
+
+    baseline_calls = llm_calls(args.top_k)
+    print(f"\n{'stage':<14} {'recall':>7} {'LLM calls/query':>16} {'calls saved':>12}")
+    summary = {}
+    for stage, values in stages.items():
+        n = args.top_k if stage == "retrieved" else int(stage.split("@")[1])
+        calls = llm_calls(n) if stage != "retrieved" else baseline_calls
+        summary[stage] = {"recall": round(statistics.mean(values), 4) if values else 0.0, "llm_calls": calls}
+        print(f"{stage:<14} {summary[stage]['recall']:>7.3f} {calls:>16} {baseline_calls - calls:>12}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "details": details}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
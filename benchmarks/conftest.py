@@ -0,0 +1,23 @@
+"""
+Unit tests for the pieces the benchmarks exercise end to end, run offline:
+
+    python -m pytest benchmarks
+
+Every on-disk store points into a scratch directory before any app module
+is imported, since those modules read their paths at import time.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.mkdtemp(prefix="search-tests-")
+os.environ.update({
+    "RESPONSE_CACHE_VERSION_FILE": os.path.join(_scratch, "collection.version"),
+    "LEXICAL_INDEX_DB": os.path.join(_scratch, "lexical.sqlite"),
+    "LOCAL_INDEX_DIR": os.path.join(_scratch, "local_index"),
+    "PROCESSED_DB": os.path.join(_scratch, "processed.sqlite"),
+    "EMBED_CACHE_DIR": os.path.join(_scratch, "embed_cache"),
+    "INGEST_JOBS_DB": os.path.join(_scratch, "jobs.sqlite"),
+})
@@ -0,0 +1,174 @@
+"""
+Local stand-in for Drive's download and folder endpoints, for exercising
+ingest.downloads and ingest.drive_listing offline.
+
+    GET /uc?export=download&id=<id>     the file, or the large-file warning page
+    GET /download?id=<id>&confirm=t     the file after the warning page
+    GET /embeddedfolderview?id=<id>     page 1 of a folder; &pageToken=tok-page-<n> for page n
+
+Files come from a dict {file_id: bytes}. Behaviour per request:
+
+- files of at least `confirm_bytes` first get Drive's "can't scan for
+  viruses" page, whose form leads to /download;
+- ids starting with `private-` get a 200 HTML sign-in page, unknown ids a 404;
+- the first `drop_first` responses for a file close the connection after
+  `drop_after` bytes, so the client has to resume;
+- `Range: bytes=N-` is honoured (206) unless `ranges=False`;
+- `bandwidth` (bytes/sec per connection) and `latency` (seconds before the
+  headers) simulate a remote server;
+- folders come from a dict {folder_id: [page html, ...]} (see
+  benchmarks/fixtures/drive); page 1 carries an ETag and answers a matching
+  If-None-Match with 304 unless `etags=False`.
+
+    with DriveStandIn(files) as server:
+        os.environ["DRIVE_DOWNLOAD_URL"] = server.url + "/uc"
+"""
+import hashlib
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_WARNING_PAGE = """<!DOCTYPE html><html><head><title>Google Drive - Virus scan warning</title></head>
+<body><div class="uc-main"><p class="uc-warning-subcaption">Google Drive can't scan this file for viruses.</p>
+<form id="download-form" action="/download" method="get">
+<input type="submit" id="uc-download-link" value="Download anyway"/>
+<input type="hidden" name="id" value="{id}"><input type="hidden" name="export" value="download">
+<input type="hidden" name="confirm" value="t"><input type="hidden" name="uuid" value="0f1e2d3c">
+</form></div></body></html>"""
+_SIGN_IN_PAGE = "<!DOCTYPE html><html><head><title>Google Drive: Sign-in</title></head><body>Sign in</body></html>"
+_RANGE = re.compile(r"bytes=(\d+)-$")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hang up mid-body on purpose (non-PDF responses); only report real errors
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class DriveStandIn:
+    def __init__(self, files: dict[str, bytes], confirm_bytes: int = 25 << 20, drop_first: int = 0,
+                 drop_after: int = 64 << 10, ranges: bool = True, bandwidth: float = 0, latency: float = 0,
+                 folders: dict[str, list[str]] | None = None, etags: bool = True):
+        self.files = files
+        self.folders = folders or {}
+        self.etags = etags
+        self.confirm_bytes = confirm_bytes
+        self.drop_first = drop_first
+        self.drop_after = drop_after
+        self.ranges = ranges
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.requests = Counter()  # (path, status) -> count
+        self.connections = 0
+        self._served = Counter()  # file_id -> body responses started
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is visible
+
+            def setup(self):
+                super().setup()
+                with standin._lock:
+                    standin.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str, headers: dict | None = None,
+                      drop_after: int | None = None):
+                with standin._lock:
+                    standin.requests[(urlparse(self.path).path, status)] += 1
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                sent = 0
+                step = 16 << 10
+                while sent < len(body):
+                    if drop_after is not None and sent >= drop_after:
+                        self.close_connection = True
+                        self.connection.shutdown(2)  # mid-body, as a flaky network would
+                        return
+                    piece = body[sent:sent + step]
+                    self.wfile.write(piece)
+                    sent += len(piece)
+                    if standin.bandwidth:
+                        time.sleep(len(piece) / standin.bandwidth)
+
+            def do_GET(self):
+                if standin.latency:
+                    time.sleep(standin.latency)
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                file_id = query.get("id", "")
+                if url.path == "/embeddedfolderview":
+                    return self._folder(file_id, query.get("pageToken", ""))
+                if file_id.startswith("private-"):
+                    return self._send(200, _SIGN_IN_PAGE.encode(), "text/html; charset=utf-8")
+                body = standin.files.get(file_id)
+                if url.path not in ("/uc", "/download") or body is None:
+                    return self._send(404, b"Not Found", "text/plain")
+                if url.path == "/uc" and len(body) >= standin.confirm_bytes:
+                    return self._send(200, _WARNING_PAGE.format(id=file_id).encode(), "text/html; charset=utf-8")
+
+                status, headers, offset = 200, {"Accept-Ranges": "bytes"} if standin.ranges else {}, 0
+                match = _RANGE.match(self.headers.get("Range", ""))
+                if match and standin.ranges:
+                    offset = int(match.group(1))
+                    status = 206
+                    headers["Content-Range"] = f"bytes {offset}-{len(body) - 1}/{len(body)}"
+                with standin._lock:
+                    standin._served[file_id] += 1
+                    drop = standin._served[file_id] <= standin.drop_first
+                content_type = "application/pdf" if body.startswith(b"%PDF-") else "application/octet-stream"
+                self._send(status, body[offset:], content_type, headers, standin.drop_after if drop else None)
+
+            def _folder(self, folder_id: str, token: str):
+                pages = standin.folders.get(folder_id)
+                if folder_id.startswith("private-"):
+                    return self._send(200, _SIGN_IN_PAGE.encode(), "text/html; charset=utf-8")
+                page = int(token.removeprefix("tok-page-")) - 1 if token.startswith("tok-page-") else 0
+                if pages is None or not 0 <= page < len(pages):
+                    return self._send(404, b"Not Found", "text/plain")
+                body = pages[page].encode()
+                headers = {}
+                if standin.etags and page == 0:
+                    headers["ETag"] = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+                    if self.headers.get("If-None-Match") == headers["ETag"]:
+                        with standin._lock:
+                            standin.requests[("/embeddedfolderview", 304)] += 1
+                        self.send_response(304)
+                        self.send_header("ETag", headers["ETag"])
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                self._send(200, body, "text/html; charset=utf-8", headers)
+
+        return Handler
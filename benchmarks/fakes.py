@@ -0,0 +1,291 @@
+"""
+Offline stand-ins for Gemini and Milvus, used by the benchmarks.
+
+FakeGemini mimics the parts of google.generativeai the app uses
+(embed_content[_async], GenerativeModel.generate_content[_async], streaming).
+It is deterministic and adds configurable latency and a retryable error rate.
+Embeddings hash word tokens into 768 dimensions, so texts that share words
+end up close together. Rerank prompts are scored by query-term overlap.
+
+InMemoryCollection implements the pymilvus Collection calls made by
+MilvusClient and MilvusSearchPool, using a brute-force L2 scan.
+install_fake_gemini() and install_in_memory_milvus() swap them in behind the
+resource registry and the Milvus singletons.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+
+DIM = 768
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokens(text: str) -> list[str]:
+    return [token.lower() for token in _TOKEN.findall(text)]
+
+
+def hash_embedding(text: str, dim: int = DIM) -> list[float]:
+    """Signed feature hashing of the word tokens, L2-normalised."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in _tokens(text):
+        h = zlib.crc32(token.encode("utf-8"))
+        vector[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[zlib.crc32(text.encode("utf-8")) % dim] = 1.0
+        norm = 1.0
+    return (vector / norm).tolist()
+
+
+class FakeGeminiError(Exception):
+    """Looks like a google.api_core error to gemini_scheduler.is_retryable."""
+
+    def __init__(self, code: int):
+        super().__init__(f"fake Gemini error {code}")
+        self.code = code
+
+
+class FakeGemini:
+    """Deterministic google.generativeai replacement."""
+
+    def __init__(self, embed_latency: float = 0.05, generate_latency: float = 0.5,
+                 error_rate: float = 0.0, summary_words: int = 200, seed: int = 0):
+        self.embed_latency = embed_latency
+        self.generate_latency = generate_latency
+        self.error_rate = error_rate
+        self.summary_words = summary_words
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = {"embed": 0, "generate": 0, "errors": 0}
+        fake = self
+
+        class GenerativeModel:
+            def __init__(self, model_name: str = "gemini-1.5-pro", **kwargs):
+                self.model_name = model_name
+
+            def generate_content(self, prompt, stream: bool = False, **kwargs):
+                time.sleep(fake._latency(fake.generate_latency))
+                fake._maybe_fail("generate")
+                return fake._response(str(prompt), stream)
+
+            async def generate_content_async(self, prompt, stream: bool = False, **kwargs):
+                await asyncio.sleep(fake._latency(fake.generate_latency))
+                fake._maybe_fail("generate")
+                return fake._response(str(prompt), stream, asynchronous=True)
+
+        self.GenerativeModel = GenerativeModel
+
+    def configure(self, **kwargs):
+        pass
+
+    # -- behaviour -------------------------------------------------------------------
+
+    def _latency(self, base: float) -> float:
+        # Uniform +-50% jitter around the configured mean, from a seeded generator
+        with self._lock:
+            return base * (0.5 + self._rng.random()) if base > 0 else 0.0
+
+    def _maybe_fail(self, kind: str):
+        with self._lock:
+            self.calls[kind] += 1
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+            if fail:
+                self.calls["errors"] += 1
+                code = self._rng.choice((429, 503))
+        if fail:
+            raise FakeGeminiError(code)
+
+    def _embed(self, content):
+        if isinstance(content, str):
+            return {"embedding": hash_embedding(content)}
+        return {"embedding": [hash_embedding(text) for text in content]}
+
+    def embed_content(self, model: str, content, task_type: str = None, **kwargs):
+        time.sleep(self._latency(self.embed_latency))
+        self._maybe_fail("embed")
+        return self._embed(content)
+
+    async def embed_content_async(self, model: str, content, task_type: str = None, **kwargs):
+        await asyncio.sleep(self._latency(self.embed_latency))
+        self._maybe_fail("embed")
+        return self._embed(content)
+
+    def _reply(self, prompt: str) -> str:
+        if prompt.rstrip().endswith("JSON scores:"):
+            query = prompt.split("Query:\n", 1)[1].split("\n\nChunks:", 1)[0]
+            blocks = re.findall(r"### pdf_id: (\S+)\n(.*?)(?=\n\n### pdf_id: |\n\nJSON scores:)", prompt, re.DOTALL)
+            return json.dumps({pdf_id: self._overlap(query, text) for pdf_id, text in blocks})
+        if prompt.rstrip().endswith("Score (0-100):"):
+            query = prompt.split("Query:\n", 1)[1].split("\n\nContent:\n", 1)[0]
+            content = prompt.split("\n\nContent:\n", 1)[1]
+            return str(self._overlap(query, content))
+        words = _tokens(prompt)[-50:] or ["summary"]
+        body = " ".join(words[i % len(words)] for i in range(self.summary_words))
+        return f"## Summary\n\n{body}\n"
+
+    @staticmethod
+    def _overlap(query: str, text: str) -> int:
+        terms = set(_tokens(query))
+        return round(100 * len(terms & set(_tokens(text))) / len(terms)) if terms else 0
+
+    def _response(self, prompt: str, stream: bool, asynchronous: bool = False):
+        text = self._reply(prompt)
+        usage = SimpleNamespace(prompt_token_count=max(1, len(prompt) // 4),
+                                candidates_token_count=max(1, len(text) // 4))
+        if not stream:
+            return SimpleNamespace(text=text, usage_metadata=usage)
+        pieces = [SimpleNamespace(text=text[i:i + 80]) for i in range(0, len(text), 80)]
+        return _AsyncStream(pieces) if asynchronous else iter(pieces)
+
+
+class _AsyncStream:
+    def __init__(self, pieces):
+        self._pieces = pieces
+
+    async def __aiter__(self):
+        for piece in self._pieces:
+            await asyncio.sleep(0)
+            yield piece
+
+
+def install_fake_gemini(fake: FakeGemini):
+    """Serve `fake` wherever the app asks the registry for the Gemini SDK."""
+    from utils.resources import registry
+
+    registry.register("genai", lambda: fake)
+    return fake
+
+
+# -- Milvus ----------------------------------------------------------------------------
+
+class _Hit:
+    def __init__(self, row: dict, distance: float):
+        self.entity = row
+        self.distance = distance
+
+
+class InMemoryCollection:
+    """
+    The subset of pymilvus.Collection that MilvusClient and the search pool use.
+    Like Milvus, insert() does not deduplicate primary keys (a key written twice
+    is returned twice); upsert() replaces them.
+    """
+
+    def __init__(self, dim: int = DIM):
+        self.dim = dim
+        self._rows: list[dict] = []
+        self._matrix = None
+        self._snapshot_rows: list[dict] = []
+        self._lock = threading.Lock()
+
+    @property
+    def num_entities(self) -> int:
+        return len(self._rows)
+
+    def _append(self, columns: list):
+        for pdf_id, file_id, chunk, embedding in zip(*columns):
+            self._rows.append({"pdf_id": pdf_id, "file_id": file_id, "chunk": chunk, "embedding": list(embedding)})
+        self._matrix = None
+
+    def insert(self, columns: list):
+        with self._lock:
+            self._append(columns)
+
+    def upsert(self, columns: list):
+        replaced = set(columns[0])
+        with self._lock:
+            self._rows = [row for row in self._rows if row["pdf_id"] not in replaced]
+            self._append(columns)
+
+    def delete(self, expr: str):
+        match = re.fullmatch(r'file_id == "(.*)" and not \(pdf_id like "(.*)%"\)', expr)
+        if not match:
+            raise ValueError(f"Unsupported delete expression: {expr}")
+        file_id, prefix = match.groups()
+        with self._lock:
+            kept = [row for row in self._rows
+                    if row["file_id"] != file_id or row["pdf_id"].startswith(prefix)]
+            deleted = len(self._rows) - len(kept)
+            if deleted:
+                self._rows = kept
+                self._matrix = None
+        return SimpleNamespace(delete_count=deleted)
+
+    def _snapshot(self):
+        with self._lock:
+            if self._matrix is None:
+                self._snapshot_rows = list(self._rows)
+                self._matrix = (np.asarray([row["embedding"] for row in self._snapshot_rows], dtype=np.float32)
+                                if self._snapshot_rows else np.zeros((0, self.dim), dtype=np.float32))
+            return self._snapshot_rows, self._matrix
+
+    def search(self, data, anns_field: str, param: dict, limit: int, output_fields: list, **kwargs):
+        rows, matrix = self._snapshot()
+        results = []
+        for query in data:
+            if not rows:
+                results.append([])
+                continue
+            q = np.asarray(query, dtype=np.float32)
+            distances = ((matrix - q) ** 2).sum(axis=1)  # squared L2, as Milvus reports it
+            top = np.argsort(distances)[:limit]
+            results.append([
+                _Hit({field: rows[i][field] for field in output_fields}, float(distances[i]))
+                for i in top
+            ])
+        return results
+
+    def query(self, expr: str, output_fields: list, **kwargs):
+        match = re.fullmatch(r"pdf_id in (\[.*\])", expr)
+        if not match:
+            raise ValueError(f"Unsupported query expression: {expr}")
+        wanted = set(json.loads(match.group(1)))
+        with self._lock:
+            return [{field: row[field] for field in output_fields} for row in self._rows if row["pdf_id"] in wanted]
+
+    # Segment management has nothing to do in memory
+    def flush(self): pass
+    def load(self): pass
+    def release(self): pass
+    def compact(self): pass
+    def wait_for_compaction_completed(self): pass
+    def drop_index(self): pass
+    def create_index(self, *args, **kwargs): pass
+
+
+def install_in_memory_milvus(collection: InMemoryCollection | None = None) -> InMemoryCollection:
+    """Point get_milvus_client() and get_search_pool() at one shared in-memory collection."""
+    import queue
+
+    import vectorstore.milvus_client as milvus_client
+    from vectorstore.index_config import IndexSpec
+
+    collection = collection or InMemoryCollection()
+
+    def make_client(alias: str):
+        client = milvus_client.MilvusClient.__new__(milvus_client.MilvusClient)
+        client.collection_name = milvus_client.COLLECTION_NAME
+        client.alias = alias
+        client.spec = IndexSpec("FLAT", "L2", "FLOAT")  # the brute-force scan above
+        client.collection = collection
+        client.reconnect = client.close = client.load = lambda: None
+        return client
+
+    pool = milvus_client.MilvusSearchPool.__new__(milvus_client.MilvusSearchPool)
+    pool._clients = [make_client(f"memory_search_{i}") for i in range(max(1, milvus_client.MILVUS_POOL_SIZE))]
+    pool.spec = pool._clients[0].spec
+    pool._idle = queue.Queue()
+    for client in pool._clients:
+        pool._idle.put(client)
+
+    with milvus_client._lock:
+        milvus_client._client = make_client("memory")
+        milvus_client._pool = pool
+    return collection
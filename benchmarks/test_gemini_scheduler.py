@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils import gemini_scheduler
+from utils.gemini_scheduler import (BATCH, INTERACTIVE, CircuitOpenError, GeminiScheduler, SchedulerBusyError)
+
+
+def half_open(scheduler: GeminiScheduler, model: str):
+    state = scheduler._state(model)
+    state.consecutive_failures = gemini_scheduler.GEMINI_BREAKER_THRESHOLD
+    state.opened_at = time.monotonic() - gemini_scheduler.GEMINI_BREAKER_COOLDOWN - 1
+    return state
+
+
+def drain(state):
+    state.requests.level = 0
+    state.requests.updated = time.monotonic()
+
+
+async def ok():
+    return "ok"
+
+
+def test_breaker_opens_after_retryable_failures_and_fails_fast():
+    scheduler = GeminiScheduler({"m": {"rpm": 10**6, "tpm": 10**9}})
+
+    def fail():
+        raise ConnectionError("upstream reset")
+
+    for _ in range(gemini_scheduler.GEMINI_BREAKER_THRESHOLD):
+        with pytest.raises(ConnectionError):
+            scheduler.call("m", fail, max_retries=0)
+    with pytest.raises(CircuitOpenError):
+        scheduler.call("m", lambda: "never called")
+
+
+def test_half_open_probe_success_closes_the_breaker():
+    scheduler = GeminiScheduler({"m": {"rpm": 10**6, "tpm": 10**9}})
+    state = half_open(scheduler, "m")
+    assert scheduler.call("m", lambda: "ok") == "ok"
+    assert state.breaker_state(time.monotonic()) == "closed"
+    assert not state.probe_in_flight
+
+
+def test_probe_cancelled_while_queued_frees_the_probe():
+    async def scenario():
+        scheduler = GeminiScheduler({"m": {"rpm": 1, "tpm": 10**9}})
+        state = half_open(scheduler, "m")
+        drain(state)  # the probe has to wait for a permit
+        probe = asyncio.create_task(scheduler.call_async("m", ok))
+        await asyncio.sleep(0.1)
+        assert state.probe_in_flight
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return state
+
+    state = asyncio.run(scenario())
+    assert not state.probe_in_flight
+    assert state.breaker_state(time.monotonic()) == "half_open"
+
+
+def test_probe_cancelled_during_the_call_is_not_a_success():
+    async def scenario():
+        scheduler = GeminiScheduler({"m": {"rpm": 10**6, "tpm": 10**9}})
+        state = half_open(scheduler, "m")
+
+        async def slow():
+            await asyncio.sleep(10)
+
+        probe = asyncio.create_task(scheduler.call_async("m", slow))
+        await asyncio.sleep(0.1)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return state
+
+    state = asyncio.run(scenario())
+    assert not state.probe_in_flight
+    assert state.breaker_state(time.monotonic()) == "half_open"
+    assert state.consecutive_failures == gemini_scheduler.GEMINI_BREAKER_THRESHOLD
+
+
+def test_probe_rejected_by_a_full_queue_frees_the_probe():
+    scheduler = GeminiScheduler({"m": {"rpm": 1, "tpm": 10**9}}, queue_size=0)
+    state = half_open(scheduler, "m")
+    with pytest.raises(SchedulerBusyError):
+        scheduler.call("m", lambda: "ok")
+    assert not state.probe_in_flight
+    assert scheduler._check_breaker(state)  # the next call gets to probe
+
+
+def test_interactive_waiters_are_granted_before_batch():
+    scheduler = GeminiScheduler({"m": {"rpm": 600, "tpm": 10**9}})
+    drain(scheduler._state("m"))
+    order = []
+
+    def caller(name: str, priority: int):
+        scheduler.call("m", lambda: order.append(name), priority=priority)
+
+    batch = threading.Thread(target=caller, args=("batch", BATCH))
+    batch.start()
+    time.sleep(0.02)
+    interactive = threading.Thread(target=caller, args=("interactive", INTERACTIVE))
+    interactive.start()
+    batch.join(5)
+    interactive.join(5)
+    assert order == ["interactive", "batch"]
+
+
+def test_first_use_of_many_models_at_once_keeps_the_dispatcher_alive():
+    scheduler = GeminiScheduler({})
+    results = []
+
+    def caller(i: int):
+        results.append(scheduler.call(f"model-{i}", lambda: i))
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert sorted(results) == list(range(32))
+    assert scheduler._dispatcher.is_alive()
@@ -0,0 +1,26 @@
+from utils.group_by_file_id import group_by_file_id
+
+
+def chunk(file_id: str, pdf_id: str, score: float) -> dict:
+    return {"file_id": file_id, "pdf_id": pdf_id, "chunk": pdf_id, "score": score}
+
+
+def test_distances_rank_nearest_files_first():
+    results = [chunk("far", "f1", 1.8), chunk("near", "n1", 0.2), chunk("near", "n2", 0.4), chunk("near", "n3", 0.9)]
+    grouped = group_by_file_id(results)
+    assert [g["file_id"] for g in grouped] == ["near", "far"]
+    assert [c["pdf_id"] for c in grouped[0]["top_chunks"]] == ["n1", "n2"]
+
+
+def test_relevance_scores_rank_best_files_first():
+    # LLM rerank and BM25 scores: higher is better
+    results = [chunk("weak", "w1", 20), chunk("strong", "s1", 95), chunk("strong", "s2", 40), chunk("strong", "s3", 90)]
+    grouped = group_by_file_id(results, higher_is_better=True)
+    assert [g["file_id"] for g in grouped] == ["strong", "weak"]
+    assert [c["pdf_id"] for c in grouped[0]["top_chunks"]] == ["s1", "s3"]
+    assert grouped[0]["avg_score"] == 75
+
+
+def test_top_n_limits_files():
+    results = [chunk(f"file-{i}", f"p{i}", i) for i in range(8)]
+    assert len(group_by_file_id(results, top_n=3)) == 3
@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from vectorstore import lexical_index
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(lexical_index, "LEXICAL_INDEX_DB", str(tmp_path / "lexical.sqlite"))
+    monkeypatch.setattr(lexical_index, "_local", threading.local())
+
+
+def test_bm25_ranks_chunks_with_more_and_rarer_terms_first():
+    lexical_index.add(
+        ["a:0", "b:0", "c:0"],
+        ["a", "b", "c"],
+        ["Invoice number 4711 for the Berlin office",
+         "The Berlin office moved in spring",
+         "Quarterly report for the Munich office"],
+    )
+    hits = lexical_index.search("invoice 4711 Berlin", top_k=5)
+    assert [h["pdf_id"] for h in hits] == ["a:0", "b:0"]
+    assert hits[0]["score"] > hits[1]["score"] > 0
+    assert hits[0]["file_id"] == "a"
+
+
+def test_stemming_and_diacritics():
+    lexical_index.add(["a:0"], ["a"], ["Die Überweisungen wurden geprüft"])
+    assert lexical_index.search("uberweisungen gepruft")
+    lexical_index.add(["b:0"], ["b"], ["Running the migrations"])
+    assert [h["pdf_id"] for h in lexical_index.search("migration run")] == ["b:0"]
+
+
+def test_add_replaces_chunks_with_the_same_pdf_id():
+    lexical_index.add(["a:0"], ["a"], ["old wording"])
+    lexical_index.add(["a:0"], ["a"], ["new wording"])
+    assert lexical_index.count() == 1
+    assert lexical_index.search("old") == []
+    assert [h["chunk"] for h in lexical_index.search("wording")] == ["new wording"]
+
+
+def test_delete_stale_rows_keeps_the_current_version():
+    lexical_index.add(["a:old:0", "a:old:1", "a:new:0", "b:x:0"], ["a", "a", "a", "b"],
+                      ["shared text"] * 4)
+    assert lexical_index.delete_stale_rows("a", "a:new:") == 2
+    assert sorted(h["pdf_id"] for h in lexical_index.search("shared")) == ["a:new:0", "b:x:0"]
+
+
+def test_fts_operators_in_queries_are_literal():
+    lexical_index.add(["a:0"], ["a"], ["terms AND conditions apply NEAR the station"])
+    assert lexical_index.query_terms('terms AND "conditions" NEAR(') == ["terms", "and", "conditions", "near"]
+    assert lexical_index.search('AND NEAR "') and lexical_index.search("NOT*") == []
+    assert lexical_index.search("?!") == []
@@ -0,0 +1,71 @@
+import numpy as np
+
+from vectorstore.local_index import LocalVectorIndex, build_generation, compact
+
+DIM = 4
+
+
+def unit(*values) -> list[float]:
+    vector = np.asarray(values, dtype=np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def open_index(tmp_path) -> LocalVectorIndex:
+    return LocalVectorIndex(str(tmp_path / "index"), dim=DIM)
+
+
+def test_search_returns_nearest_rows_with_squared_l2(tmp_path):
+    index = open_index(tmp_path)
+    index.add(["a:0", "b:0", "c:0"], ["a", "b", "c"], ["alpha", "beta", "gamma"],
+              [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 3, 0]])
+    hits = index.search([0.9, 0.1, 0, 0], top_k=2)
+    assert [h["pdf_id"] for h in hits] == ["a:0", "b:0"]
+    assert abs(hits[0]["score"] - 0.02) < 1e-5
+    assert hits[0]["chunk"] == "alpha"
+
+
+def test_add_replaces_rows_with_the_same_pdf_id(tmp_path):
+    index = open_index(tmp_path)
+    index.add(["a:0"], ["a"], ["old"], [[1, 0, 0, 0]])
+    index.add(["a:0"], ["a"], ["new"], [[0, 1, 0, 0]])
+    hits = index.search([0, 1, 0, 0], top_k=5)
+    assert [(h["pdf_id"], h["chunk"]) for h in hits] == [("a:0", "new")]
+    assert index.stats()["deleted_rows"] == 1
+
+
+def test_delete_stale_rows_keeps_the_current_version(tmp_path):
+    index = open_index(tmp_path)
+    index.add(["a:old:0", "a:old:1", "a:new:0", "b:x:0"], ["a", "a", "a", "b"], ["1", "2", "3", "4"],
+              [[1, 0, 0, 0]] * 4)
+    assert index.delete_stale_rows("a", "a:new:") == 2
+    assert sorted(h["pdf_id"] for h in index.search([1, 0, 0, 0], top_k=10)) == ["a:new:0", "b:x:0"]
+    assert set(index.get_embeddings(["a:old:0", "a:new:0"])) == {"a:new:0"}
+
+
+def test_queries_follow_the_stored_normalisation(tmp_path):
+    index = open_index(tmp_path)
+    index.add(["a:0"], ["a"], ["x"], [unit(1, 1, 0, 0)], normalized=True)
+    assert index.normalized
+    assert np.allclose(np.linalg.norm(index.prepare_queries([[3, 4, 0, 0]]), axis=1), 1.0)
+
+    raw = open_index(tmp_path / "raw")
+    raw.add(["a:0"], ["a"], ["x"], [[3, 4, 0, 0]], normalized=False)
+    assert not raw.normalized
+    assert np.allclose(raw.prepare_queries([[3, 4, 0, 0]]), [[3, 4, 0, 0]])
+
+
+def test_generations_keep_rows_and_normalisation(tmp_path):
+    root = str(tmp_path / "index")
+    batches = [(["a:0", "b:0"], ["a", "b"], ["x", "y"], [unit(1, 0, 0, 0), unit(0, 1, 0, 0)]),
+               (["a:0", "c:0"], ["a", "c"], ["dup", "z"], [unit(1, 0, 0, 0), unit(0, 0, 1, 0)])]
+    build_generation(iter(batches), root, dim=DIM, normalized=True)
+    index = LocalVectorIndex(root, dim=DIM)
+    assert index.stats()["live_rows"] == 3  # the duplicate pdf_id is kept once
+    assert index.normalized
+
+    index.add(["d:0"], ["d"], ["w"], [unit(0, 0, 0, 1)], normalized=True)
+    compact(root, dim=DIM)
+    index.refresh(force=True)
+    assert index.stats()["live_rows"] == 4
+    assert index.normalized
+    assert index.search(unit(0, 0, 0, 1), top_k=1)[0]["pdf_id"] == "d:0"
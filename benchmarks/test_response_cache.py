@@ -0,0 +1,137 @@
+import asyncio
+import os
+import time
+
+from utils.response_cache import ResponseCache, normalize_query
+
+
+def make_cache(tmp_path, **kwargs) -> ResponseCache:
+    return ResponseCache(version_file=str(tmp_path / "collection.version"), **kwargs)
+
+
+def counting(response: dict, delay: float = 0.0):
+    calls = []
+
+    async def compute(embedding):
+        calls.append(embedding)
+        await asyncio.sleep(delay)
+        return dict(response)
+
+    return compute, calls
+
+
+def test_normalize_query():
+    assert normalize_query("What is  AI?") == normalize_query("  what is ai ") == "what is ai"
+    assert normalize_query("¿Qué es la IA?") == "qué es la ia"
+
+
+def test_exact_hit_after_miss(tmp_path):
+    cache = make_cache(tmp_path)
+    compute, calls = counting({"query": "q", "results": [1]})
+
+    async def scenario():
+        first = await cache.get_or_compute("What is AI?", "conceptual", compute)
+        second = await cache.get_or_compute("what is  ai", "conceptual", compute)
+        return first, second
+
+    (_, first), (answer, second) = asyncio.run(scenario())
+    assert (first, second) == ("miss", "hit")
+    assert answer["query"] == "what is  ai"
+    assert len(calls) == 1
+
+
+def test_singleflight_shares_one_computation(tmp_path):
+    cache = make_cache(tmp_path)
+    compute, calls = counting({"results": [1]}, delay=0.05)
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_compute("q", "keyword", compute) for _ in range(5)))
+
+    outcomes = sorted(outcome for _, outcome in asyncio.run(scenario()))
+    assert outcomes == ["miss"] + ["shared"] * 4
+    assert len(calls) == 1
+
+
+def test_failures_are_shared_but_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+    attempts = []
+
+    async def broken(embedding):
+        attempts.append(1)
+        await asyncio.sleep(0.02)
+        raise RuntimeError("search failed")
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_compute("q", "keyword", broken) for _ in range(3)),
+                                    return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(scenario()))
+    assert len(attempts) == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_empty_and_degraded_responses_are_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+    empty, empty_calls = counting({"results": []})
+    degraded, degraded_calls = counting({"results": [1]})
+
+    async def scenario():
+        for _ in range(2):
+            await cache.get_or_compute("nothing", "keyword", empty)
+            await cache.get_or_compute("thin", "keyword", degraded, cacheable=lambda response: False)
+
+    asyncio.run(scenario())
+    assert len(empty_calls) == len(degraded_calls) == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate_during_compute_discards_the_result(tmp_path):
+    cache = make_cache(tmp_path)
+
+    async def compute(embedding):
+        cache.invalidate()  # a write lands while the search runs
+        return {"results": [1]}
+
+    asyncio.run(cache.get_or_compute("q", "keyword", compute))
+    assert cache.stats()["entries"] == 0
+
+
+def test_version_file_invalidates_other_workers(tmp_path):
+    cache, other_worker = make_cache(tmp_path), make_cache(tmp_path)
+    compute, calls = counting({"results": [1]})
+
+    asyncio.run(cache.get_or_compute("q", "keyword", compute))
+    time.sleep(0.01)
+    other_worker.invalidate()
+    assert os.path.exists(tmp_path / "collection.version")
+    _, outcome = asyncio.run(cache.get_or_compute("q", "keyword", compute))
+    assert outcome == "miss"
+    assert len(calls) == 2
+
+
+def test_semantic_layer_reuses_near_duplicate_queries(tmp_path):
+    cache = make_cache(tmp_path, semantic=True, similarity=0.99)
+    compute, calls = counting({"results": [1]})
+    vectors = {"what is ai": [1.0, 0.0, 0.0], "define ai": [0.999, 0.01, 0.0], "cooking": [0.0, 1.0, 0.0]}
+
+    async def embed(query):
+        return vectors[normalize_query(query)]
+
+    async def scenario():
+        return [(await cache.get_or_compute(q, "conceptual", compute, embed))[1]
+                for q in ("what is ai", "define ai", "cooking")]
+
+    assert asyncio.run(scenario()) == ["miss", "semantic", "miss"]
+    assert calls[0] == vectors["what is ai"]
+
+
+def test_lru_eviction(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2)
+    compute, _ = counting({"results": [1]})
+
+    async def scenario():
+        for q in ("a", "b", "a", "c"):
+            await cache.get_or_compute(q, "keyword", compute)
+        return [(await cache.get_or_compute(q, "keyword", compute))[1] for q in ("a", "b")]
+
+    assert asyncio.run(scenario()) == ["hit", "miss"]
@@ -0,0 +1,266 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "1") == "1"
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "embedding_cache")
+EMBED_CACHE_DIM = int(os.getenv("EMBED_CACHE_DIM", "768"))
+EMBED_CACHE_MAX_MB = float(os.getenv("EMBED_CACHE_MAX_MB", "1024"))
+EMBED_CACHE_LRU_SIZE = int(os.getenv("EMBED_CACHE_LRU_SIZE", "4096"))
+
+# Evict this fraction of the entries at once so we don't evict on every insert
+_EVICT_FRACTION = 0.1
+_INITIAL_CAPACITY = 1024
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache.
+
+    Entries are keyed by (model, task_type, sha256(text)). The SQLite file holds
+    the key -> slot index; vectors live in a float32 memory-mapped matrix where
+    row `slot` is one embedding. A small in-process LRU sits in front of both.
+    """
+
+    def __init__(self, cache_dir=EMBED_CACHE_DIR, dim=EMBED_CACHE_DIM,
+                 max_mb=EMBED_CACHE_MAX_MB, lru_size=EMBED_CACHE_LRU_SIZE):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.dim = dim
+        self.max_entries = max(1, int(max_mb * 1024 * 1024) // (dim * 4))
+        self.lru_size = lru_size
+        self._vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self._lock = threading.RLock()
+        self._lru: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._mmap = None
+        self._capacity = 0
+
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False,
+                                   isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                model TEXT NOT NULL,
+                task_type TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                slot INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, task_type, text_hash)
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access);
+            CREATE TABLE IF NOT EXISTS free_slots (slot INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO meta (key, value) VALUES ('next_slot', 0);
+        """)
+
+        self.hits = 0
+        self.lru_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    # -- memory-mapped vector file -------------------------------------------------
+
+    def _ensure_capacity(self, min_rows: int):
+        """(Re)map the vector file so that at least `min_rows` rows are addressable."""
+        if self._mmap is not None and min_rows <= self._capacity:
+            return
+        row_bytes = self.dim * 4
+        on_disk = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        capacity = max(on_disk, _INITIAL_CAPACITY)
+        while capacity < min_rows:
+            capacity *= 2
+        capacity = min(capacity, max(self.max_entries, min_rows))
+        if capacity > on_disk:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        if self._mmap is not None:
+            self._mmap.flush()
+        self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    # -- public API ----------------------------------------------------------------
+
+    def get_many(self, texts: list[str], model: str, task_type: str) -> list[list[float] | None]:
+        results: list[list[float] | None] = [None] * len(texts)
+        pending: dict[str, list[int]] = {}
+
+        with self._lock:
+            for i, text in enumerate(texts):
+                key = (model, task_type, text_hash(text))
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    results[i] = vector.tolist()
+                    self.lru_hits += 1
+                    self.hits += 1
+                else:
+                    pending.setdefault(key[2], []).append(i)
+
+            if not pending:
+                return results
+
+            hashes = list(pending)
+            found = {}
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT text_hash, slot FROM entries WHERE model = ? AND task_type = ? "
+                    f"AND text_hash IN ({','.join('?' * len(part))})",
+                    [model, task_type, *part],
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                self._ensure_capacity(max(found.values()) + 1)
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE entries SET last_access = ? WHERE model = ? AND task_type = ? AND text_hash = ?",
+                    [(now, model, task_type, h) for h in found],
+                )
+
+            for h, indexes in pending.items():
+                slot = found.get(h)
+                if slot is None:
+                    self.misses += len(indexes)
+                    continue
+                vector = np.array(self._mmap[slot])
+                self._remember((model, task_type, h), vector)
+                for i in indexes:
+                    results[i] = vector.tolist()
+                self.hits += len(indexes)
+
+        return results
+
+    def get(self, text: str, model: str, task_type: str) -> list[float] | None:
+        return self.get_many([text], model, task_type)[0]
+
+    def put_many(self, texts: list[str], vectors: list[list[float] | None], model: str, task_type: str):
+        items = {}
+        for text, vector in zip(texts, vectors):
+            if vector is None or len(vector) != self.dim:
+                continue
+            items[text_hash(text)] = np.asarray(vector, dtype=np.float32)
+        if not items:
+            return
+
+        with self._lock:
+            now = time.time()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = []
+                for h, vector in items.items():
+                    existing = self._db.execute(
+                        "SELECT slot FROM entries WHERE model = ? AND task_type = ? AND text_hash = ?",
+                        (model, task_type, h),
+                    ).fetchone()
+                    slot = existing[0] if existing else self._allocate_slot()
+                    self._ensure_capacity(slot + 1)
+                    self._mmap[slot] = vector
+                    rows.append((model, task_type, h, slot, now))
+                    self._remember((model, task_type, h), vector)
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO entries (model, task_type, text_hash, slot, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._mmap.flush()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self.writes += len(items)
+            self._evict_if_needed()
+
+    def put(self, text: str, vector: list[float], model: str, task_type: str):
+        self.put_many([text], [vector], model, task_type)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "lru_hits": self.lru_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "api_calls_saved": self.hits,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.flush()
+                self._mmap = None
+            self._db.close()
+
+    # -- internals -----------------------------------------------------------------
+
+    def _remember(self, key: tuple, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _allocate_slot(self) -> int:
+        row = self._db.execute("SELECT slot FROM free_slots LIMIT 1").fetchone()
+        if row:
+            self._db.execute("DELETE FROM free_slots WHERE slot = ?", row)
+            return row[0]
+        slot = self._db.execute("SELECT value FROM meta WHERE key = 'next_slot'").fetchone()[0]
+        self._db.execute("UPDATE meta SET value = ? WHERE key = 'next_slot'", (slot + 1,))
+        return slot
+
+    def _evict_if_needed(self):
+        count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        n_evict = count - self.max_entries + max(1, int(self.max_entries * _EVICT_FRACTION))
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            victims = self._db.execute(
+                "SELECT model, task_type, text_hash, slot FROM entries ORDER BY last_access LIMIT ?",
+                (n_evict,),
+            ).fetchall()
+            self._db.executemany(
+                "DELETE FROM entries WHERE model = ? AND task_type = ? AND text_hash = ?",
+                [v[:3] for v in victims],
+            )
+            self._db.executemany("INSERT OR IGNORE INTO free_slots (slot) VALUES (?)", [(v[3],) for v in victims])
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        for v in victims:
+            self._lru.pop(tuple(v[:3]), None)
+        self.evictions += len(victims)
+
+
+_cache: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    """Process-wide cache shared by ingestion and query embedding; None when disabled."""
+    global _cache
+    if not EMBED_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
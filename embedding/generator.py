@@ -1,49 +1,253 @@
+import bisect
+import itertools
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
 from dotenv import load_dotenv
-import google.generativeai as genai
-from transformers import GPT2TokenizerFast  # or any tokenizer for chunking
-from transformers import AutoTokenizer
+from embedding.cache import get_embedding_cache
+from utils.gemini_scheduler import get_scheduler, BATCH, estimate_tokens, is_retryable, GeminiUnavailableError
+from utils.resources import get_genai, registry
 
-import sys
-print("Python Executable:", sys.executable)
+load_dotenv()
 
+EMBEDDING_MODEL = "models/embedding-001"
+
+# Gemini accepts up to 100 contents per embed request
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+
+TOKENIZER_NAME = os.getenv("CHUNK_TOKENIZER", "google-bert/bert-base-cased")
+
+
+def load_tokenizer():
+    # transformers takes most of a second to import, so only ingestion pays for it
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(TOKENIZER_NAME)
+
+
+def get_tokenizer():
+    """The chunking tokenizer, loaded once per process through the resource registry."""
+    return registry.get("tokenizer")
+
+
+# The `chunk` VARCHAR field in the Milvus schema; Milvus measures it in UTF-8 bytes
+MAX_CHUNK_CHARS = 8192
+TOKENIZE_BATCH_PAGES = 32
+
+
+class _PageText:
+    """
+    The concatenation of the pages seen so far, addressed by document offsets.
+    Pages that lie entirely before the oldest live window are released.
+    """
+
+    def __init__(self):
+        self.pages: list[str] = []
+        self.starts: list[int] = []
+        self.ends: list[int] = []
+        self._released = 0
+
+    def append(self, page: str) -> int:
+        base = self.ends[-1] if self.ends else 0
+        self.pages.append(page)
+        self.starts.append(base)
+        self.ends.append(base + len(page))
+        return base
+
+    def slice(self, start: int, end: int) -> str:
+        k = bisect.bisect_right(self.starts, start) - 1
+        parts = []
+        while k < len(self.pages) and self.starts[k] < end:
+            base = self.starts[k]
+            parts.append(self.pages[k][max(0, start - base):end - base])
+            k += 1
+        return "".join(parts)
+
+    def release_before(self, offset: int):
+        while self._released < len(self.pages) and self.ends[self._released] <= offset:
+            self.pages[self._released] = ""
+            self._released += 1
+
+
+def _fits(text: _PageText, start: int, end: int, limit: int) -> bool:
+    return len(text.slice(start, end).encode("utf-8")) <= limit
+
+
+def iter_chunk_pages(pages, chunk_size=512, overlap=100, tokenizer=None,
+                     max_chars=MAX_CHUNK_CHARS, batch_pages=TOKENIZE_BATCH_PAGES) -> Iterator[dict]:
+    """
+    Split a document into overlapping windows of `chunk_size` tokens.
+
+    Pages are tokenized in batches with the fast tokenizer's offset mapping and
+    each chunk is a slice of the original text, so nothing is decoded and no
+    special tokens or whitespace rewrites end up in the stored chunk. Windows
+    that would exceed `max_chars` are shortened to fit.
+
+    `pages` may be any iterable (e.g. a generator still parsing the PDF);
+    chunks are yielded as soon as their window is complete.
+
+    Yields dicts with `text`, `char_start`/`char_end` (offsets into the
+    concatenated pages) and 1-based `page_start`/`page_end`.
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    document = _PageText()
+    page_iter = iter(pages)
+    page_number = 0
+
+    starts: list[int] = []
+    ends: list[int] = []
+    pages_of_token: list[int] = []
+    step = max(1, chunk_size - overlap)
+    i = 0
+    exhausted = False
+
+    while not exhausted:
+        batch = list(itertools.islice(page_iter, batch_pages))
+        exhausted = not batch
+        if batch:
+            encoded = tokenizer(batch, add_special_tokens=False, return_offsets_mapping=True,
+                                return_attention_mask=False, return_token_type_ids=False, verbose=False)
+            for page, offsets in zip(batch, encoded["offset_mapping"]):
+                page_number += 1
+                base = document.append(page)
+                for start, end in offsets:
+                    starts.append(base + start)
+                    ends.append(base + end)
+                    pages_of_token.append(page_number)
+
+        n = len(starts)
+        # Only emit windows whose tokens are all known, unless the input is done
+        while i < n and (exhausted or i + chunk_size <= n):
+            j = min(i + chunk_size, n)
+            char_start = starts[i]
+            if not _fits(document, char_start, ends[j - 1], max_chars):
+                # Largest window starting at i that still fits
+                lo, hi = i + 1, j
+                while lo < hi:
+                    mid = (lo + hi + 1) // 2
+                    if _fits(document, char_start, ends[mid - 1], max_chars):
+                        lo = mid
+                    else:
+                        hi = mid - 1
+                j = lo
+            char_end = ends[j - 1]
+            if _fits(document, char_start, char_end, max_chars):
+                spans = [(char_start, char_end)]
+            else:
+                # A single token longer than the limit (e.g. one huge [UNK] run); cut it into pieces
+                spans = []
+                while char_start < char_end:
+                    piece = document.slice(char_start, char_end).encode("utf-8")[:max_chars]
+                    piece = piece.decode("utf-8", errors="ignore")
+                    spans.append((char_start, char_start + len(piece)))
+                    char_start += len(piece)
+            for span_start, span_end in spans:
+                yield {
+                    "text": document.slice(span_start, span_end),
+                    "char_start": span_start,
+                    "char_end": span_end,
+                    "page_start": pages_of_token[i],
+                    "page_end": pages_of_token[j - 1],
+                }
+            if exhausted and j >= n:
+                i = n
+                break
+            # Keep the configured overlap, but never skip tokens when a window was shortened
+            i = min(i + step, j) if j > i + 1 else j
+            if i < n:
+                document.release_before(starts[i])
+
+
+def chunk_pages(pages, chunk_size=512, overlap=100, tokenizer=None,
+                max_chars=MAX_CHUNK_CHARS, batch_pages=TOKENIZE_BATCH_PAGES) -> list[dict]:
+    return list(iter_chunk_pages(pages, chunk_size, overlap, tokenizer, max_chars, batch_pages))
+
+
+def chunk_text_by_tokens(text, chunk_size=512, overlap=100, tokenizer=None):
+    return [chunk["text"] for chunk in chunk_pages([text], chunk_size, overlap, tokenizer=tokenizer)]
 
-load_dotenv()
 
 class EmbeddingGenerator:
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not found in environment.")
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel(model_name="models/embedding-001")
-
-        self.tokenizer = AutoTokenizer.from_pretrained("google-bert/bert-base-cased")
+        self.genai = get_genai()
+        self.tokenizer = get_tokenizer()
 
     def chunk_text_by_tokens(self, text, chunk_size=512, overlap=100):
-        tokens = self.tokenizer.encode(text)
-        chunks = []
-
-        for i in range(0, len(tokens), chunk_size - overlap):
-            chunk_tokens = tokens[i:i + chunk_size]
-            chunk_text = self.tokenizer.decode(chunk_tokens)
-            chunks.append(chunk_text)
-
-        return chunks
-
-
-    def generate_embeddings(self, chunks):
-        embeddings = []
-        for chunk in chunks:
-            try:
-                response = genai.embed_content(
-                    model="models/embedding-001",
-                    content=chunk,
-                    task_type="retrieval_document"
-                )
-                embedding_vector = response['embedding']
-                print(len(embedding_vector))
-                embeddings.append(response['embedding'])
-            except Exception as e:
-                print(f"Embedding failed for a chunk: {e}")
+        return chunk_text_by_tokens(text, chunk_size, overlap, tokenizer=self.tokenizer)
+
+    def _embed_batch(self, batch: list[str], task_type: str) -> list[list[float] | None]:
+        """
+        Embed one batch through the shared Gemini scheduler (batch priority,
+        rate limited, retried on 429/5xx). A batch that fails with a
+        non-retryable error is split in half so a single bad chunk cannot take
+        its neighbours down with it.
+        """
+        try:
+            response = get_scheduler().call(
+                EMBEDDING_MODEL,
+                lambda: self.genai.embed_content(
+                    model=EMBEDDING_MODEL,
+                    content=batch,
+                    task_type=task_type
+                ),
+                priority=BATCH,
+                tokens=estimate_tokens(batch),
+            )
+            vectors = response['embedding']
+            if len(vectors) != len(batch):
+                raise ValueError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+            return vectors
+        except Exception as e:
+            if len(batch) > 1 and not is_retryable(e) and not isinstance(e, GeminiUnavailableError):
+                mid = len(batch) // 2
+                return self._embed_batch(batch[:mid], task_type) + self._embed_batch(batch[mid:], task_type)
+            print(f"Embedding failed for a batch of {len(batch)} chunk(s): {e}")
+            return [None] * len(batch)
+
+    def generate_embeddings(self, chunks, task_type="retrieval_document",
+                            batch_size=EMBED_BATCH_SIZE, max_in_flight=EMBED_MAX_IN_FLIGHT):
+        """
+        Embed chunks in batches with a bounded number of requests in flight.
+
+        Returns a list aligned with `chunks`: entry i is the vector for chunk i,
+        or None if that chunk could not be embedded.
+        """
+        chunks = list(chunks)
+        cache = get_embedding_cache()
+        embeddings: list[list[float] | None] = (
+            cache.get_many(chunks, EMBEDDING_MODEL, task_type) if cache else [None] * len(chunks)
+        )
+
+        # Only send each distinct uncached text once
+        missing: dict[str, list[int]] = {}
+        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+            if embedding is None:
+                missing.setdefault(chunk, []).append(i)
+        if not missing:
+            return embeddings
+
+        to_embed = list(missing)
+        vectors: list[list[float] | None] = [None] * len(to_embed)
+        starts = range(0, len(to_embed), batch_size)
+        with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+            futures = {
+                start: executor.submit(self._embed_batch, to_embed[start:start + batch_size], task_type)
+                for start in starts
+            }
+            for start, future in futures.items():
+                batch_vectors = future.result()
+                vectors[start:start + len(batch_vectors)] = batch_vectors
+
+        if cache:
+            cache.put_many(to_embed, vectors, EMBEDDING_MODEL, task_type)
+        for text, vector in zip(to_embed, vectors):
+            for i in missing[text]:
+                embeddings[i] = vector
+
+        failed = sum(1 for e in embeddings if e is None)
+        if failed:
+            print(f"⚠️ {failed}/{len(chunks)} chunks failed to embed")
         return embeddings
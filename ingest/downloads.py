@@ -0,0 +1,208 @@
+"""
+Drive downloads over one shared, pooled HTTP session.
+
+Bodies are streamed in DOWNLOAD_CHUNK_BYTES pieces to `<dest>/<file_id>.pdf.part`
+(renamed once complete) or into memory, never buffered whole through
+`response.content`. The first bytes are checked before anything is written:
+
+- an HTML response is either Drive's "can't scan this file for viruses"
+  page, whose confirm form is followed once, or an error/permission page,
+  which fails the download with NotPdfError;
+- any other body must start with the %PDF- header.
+
+A connection dropped mid-body is resumed with a `Range` request from the
+bytes already written (a server that ignores ranges restarts the file). 429
+and 5xx responses are retried with backoff, up to DOWNLOAD_RETRIES attempts
+in total. Parallelism stays with the caller (IngestionPipeline's download
+workers); the pool holds DOWNLOAD_POOL_SIZE connections so none of them waits
+for a socket.
+
+DRIVE_DOWNLOAD_URL points the downloads at a stand-in server
+(benchmarks/drive_standin.py).
+"""
+import io
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.instrumentation import DOWNLOAD_BYTES, DOWNLOADS
+
+DRIVE_DOWNLOAD_URL = os.getenv("DRIVE_DOWNLOAD_URL", "https://drive.google.com/uc")
+DOWNLOAD_POOL_SIZE = int(os.getenv("DOWNLOAD_POOL_SIZE", os.getenv("INGEST_DOWNLOAD_WORKERS", "8")))
+DOWNLOAD_CHUNK_BYTES = int(os.getenv("DOWNLOAD_CHUNK_BYTES", str(64 << 10)))  # also the most a dropped connection loses
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "4"))
+DOWNLOAD_BACKOFF = float(os.getenv("DOWNLOAD_BACKOFF", "0.5"))  # seconds, doubled per attempt
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "60"))  # seconds without a byte before giving up
+
+_CONNECT_TIMEOUT = 10
+_PDF_MAGIC = b"%PDF-"
+_SNIFF_BYTES = 1024  # the PDF header may follow a little junk
+_HTML_LIMIT = 1 << 20  # enough of an HTML page to find the confirm form
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+_RESUMABLE = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+class DownloadError(Exception):
+    pass
+
+
+class NotPdfError(DownloadError):
+    """The server answered with something other than a PDF (HTML page, error body, ...)."""
+
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Process-wide session; its connection pool is shared by every download thread."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # Byte ranges must count the bytes we store, not a compressed stream
+                session.headers["Accept-Encoding"] = "identity"
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, DOWNLOAD_POOL_SIZE))
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _confirm_request(html: bytes, url: str, params: dict) -> tuple[str, dict] | None:
+    """The follow-up request behind Drive's large-file warning page, if this is one."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    form = soup.find("form", id="download-form") or soup.find("form", action=lambda a: a and "download" in a)
+    if form is not None:
+        fields = {i["name"]: i.get("value", "") for i in form.find_all("input", attrs={"name": True})}
+        if "confirm" in fields:
+            return requests.compat.urljoin(url, form.get("action") or url), fields
+    # Older variant: a link carrying confirm=<token>
+    link = soup.find("a", href=lambda h: h and "confirm=" in h)
+    if link is not None:
+        return requests.compat.urljoin(url, link["href"]), {}
+    return None
+
+
+def _open(url: str, params: dict, offset: int) -> requests.Response:
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    response = get_session().get(url, params=params, headers=headers, stream=True,
+                                 timeout=(_CONNECT_TIMEOUT, DOWNLOAD_TIMEOUT))
+    if response.status_code in _RETRY_STATUSES:
+        response.close()
+        raise requests.ConnectionError(f"HTTP {response.status_code}")
+    if response.status_code not in (200, 206):
+        response.close()
+        raise DownloadError(f"HTTP {response.status_code}")
+    return response
+
+
+def _read_head(chunks, size: int) -> bytes:
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= size:
+            break
+    return head
+
+
+def fetch(url: str, out, params: dict | None = None, label: str = "") -> int:
+    """
+    Stream a PDF from `url` into the binary file object `out` (it must support
+    tell/seek/truncate). Returns the number of bytes written; raises
+    DownloadError (NotPdfError for a non-PDF body) once retries are exhausted.
+    """
+    params = dict(params or {})
+    start = time.perf_counter()
+    confirmed = False
+    attempt = 0
+    while True:
+        offset = out.tell()
+        try:
+            response = _open(url, params, offset)
+            with response:
+                if offset and response.status_code == 200:
+                    # Range ignored: the body starts over
+                    out.seek(0)
+                    out.truncate()
+                    offset = 0
+                elif offset and not response.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+                    raise DownloadError(f"server resumed at the wrong offset: {response.headers.get('Content-Range')}")
+                chunks = response.iter_content(DOWNLOAD_CHUNK_BYTES)
+                if offset == 0:
+                    head = _read_head(chunks, _SNIFF_BYTES)
+                    content_type = response.headers.get("Content-Type", "no content type")
+                    if "text/html" in content_type or _PDF_MAGIC not in head[:_SNIFF_BYTES]:
+                        follow = None
+                        if "text/html" in content_type and not confirmed:
+                            follow = _confirm_request(head + _read_head(chunks, _HTML_LIMIT), response.url, params)
+                        if follow is None:
+                            raise NotPdfError(f"not a PDF ({content_type})")
+                        url, params = follow
+                        confirmed = True
+                        continue
+                    out.write(head)
+                    DOWNLOAD_BYTES.inc(len(head))
+                for chunk in chunks:
+                    out.write(chunk)
+                    DOWNLOAD_BYTES.inc(len(chunk))
+                expected = response.headers.get("Content-Length")
+                if expected is not None and response.raw.tell() < int(expected):
+                    raise requests.exceptions.ChunkedEncodingError("connection closed before the end of the body")
+            break
+        except _RESUMABLE as e:
+            attempt += 1
+            if attempt >= DOWNLOAD_RETRIES:
+                DOWNLOADS.inc(outcome="error")
+                raise DownloadError(f"giving up after {attempt} attempts: {e}") from e
+            DOWNLOADS.inc(outcome="retry")
+            print(f"🔁 Download of {label or url} interrupted at {out.tell()} bytes ({e}); retrying")
+            time.sleep(DOWNLOAD_BACKOFF * 2 ** (attempt - 1))
+        except NotPdfError:
+            DOWNLOADS.inc(outcome="not_pdf")
+            raise
+        except DownloadError:
+            DOWNLOADS.inc(outcome="error")
+            raise
+
+    size = out.tell()
+    seconds = time.perf_counter() - start
+    DOWNLOADS.inc(outcome="ok")
+    print(f"⬇️ {label or url}: {size / 1e6:.2f} MB in {seconds:.2f}s ({size / 1e6 / max(seconds, 1e-6):.2f} MB/s)")
+    return size
+
+
+def download_drive_file(file_id: str, dest_folder: str, base_url: str | None = None) -> str | None:
+    """Download a public Drive file to `<dest_folder>/<file_id>.pdf`; None on failure."""
+    os.makedirs(dest_folder, exist_ok=True)
+    path = os.path.join(dest_folder, f"{file_id}.pdf")
+    partial = path + ".part"
+    try:
+        with open(partial, "wb") as f:
+            fetch(base_url or DRIVE_DOWNLOAD_URL, f, {"export": "download", "id": file_id}, label=file_id)
+        os.replace(partial, path)
+        return path
+    except Exception as e:
+        print(f"❌ Error downloading file ID {file_id}: {e}")
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        return None
+
+
+def download_drive_bytes(file_id: str, base_url: str | None = None) -> bytes | None:
+    """Download a public Drive file into memory; None on failure."""
+    buffer = io.BytesIO()
+    try:
+        fetch(base_url or DRIVE_DOWNLOAD_URL, buffer, {"export": "download", "id": file_id}, label=file_id)
+    except Exception as e:
+        print(f"❌ Error downloading file ID {file_id}: {e}")
+        return None
+    return buffer.getvalue()
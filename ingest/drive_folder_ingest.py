@@ -1,62 +1,27 @@
 import os
-import requests
-from bs4 import BeautifulSoup
-from utils.hash_utils import sha256_checksum, is_already_processed, mark_as_processed
-from utils.pdf_utils import extract_text_from_pdf
-from embedding.generator import EmbeddingGenerator
-from vectorstore.milvus_client import MilvusClient
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.options import Options
+from utils.hash_utils import (sha256_bytes, is_already_processed, mark_as_processed, chunk_pdf_ids,
+                              pdf_id_prefix, record_chunk_spans)
+from utils.pdf_utils import iter_pdf_pages_parallel
+from embedding.generator import EmbeddingGenerator, chunk_pages
+from utils.instrumentation import span, observe_stage, timed_iter
+from vectorstore.milvus_client import get_milvus_client
+from ingest.pipeline import IngestionPipeline
+from ingest.downloads import download_drive_file, download_drive_bytes
+from ingest.drive_listing import list_folder
 import time
-import uuid
 import re
-from selenium.webdriver.common.by import By
 
 TEMP_DIR = "temp_pdfs"
 os.makedirs(TEMP_DIR, exist_ok=True)
 
-def extract_file_ids_from_folder(folder_url):
-    from selenium.webdriver.common.by import By
-
-    chrome_options = Options()
-    chrome_options.add_argument("--headless=new")  # Required for newer headless Chrome
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
-    driver.get(folder_url)
-    time.sleep(5)  # Wait for JS-rendered content
 
-    file_ids = set()
-
-    # Files are rendered as elements with data-id attributes
-    try:
-        items = driver.find_elements(By.CSS_SELECTOR, 'div[data-id]')
-        for item in items:
-            file_id = item.get_attribute("data-id")
-            if file_id:
-                file_ids.add(file_id)
-    except Exception as e:
-        print("Error while extracting file ids:", e)
-
-    driver.quit()
-    return list(file_ids)
+def extract_file_ids_from_folder(folder_url):
+    # Cached for LISTING_CACHE_TTL, so a listing just shown by /list-drive-files/ is not fetched again
+    return [f["file_id"] for f in list_folder(folder_url)["files"]]
 
 def download_pdf_by_id(file_id, dest_folder="downloads"):
-    try:
-        url = f"https://drive.google.com/uc?export=download&id={file_id}"
-        print(f"Downloading file ID: {file_id} from {url}")
-        response = requests.get(url)
-        os.makedirs(dest_folder, exist_ok=True)
-        file_path = os.path.join(dest_folder, f"{file_id}.pdf")
-        with open(file_path, "wb") as f:
-            f.write(response.content)
-        return file_path
-    except Exception as e:
-        print(f"Error downloading file ID {file_id}: {e}")
-        return None
+    # Streamed to disk over the shared session; None for failures and non-PDF responses
+    return download_drive_file(file_id, dest_folder)
 
 def extract_drive_file_id(url: str) -> str | None:
     # Extract file ID using regex
@@ -67,56 +32,26 @@ def extract_drive_file_id(url: str) -> str | None:
 
 
 def download_pdf_from_url(url: str, save_dir: str) -> str | None:
-    try:
-        file_id = extract_drive_file_id(url)
-        if not file_id:
-            print("❌ Invalid Google Drive link format.")
-            return None
-
-        # Construct direct download link
-        download_url = f"https://drive.google.com/uc?export=download&id={file_id}"
-
-        response = requests.get(download_url)
-        if response.status_code != 200:
-            print(f"❌ Failed to fetch file from Google Drive: HTTP {response.status_code}")
-            return None
-
-        # Use file_id as safe filename
-        filename = os.path.join(save_dir, f"{file_id}.pdf")
+    file_id = extract_drive_file_id(url)
+    if not file_id:
+        print("❌ Invalid Google Drive link format.")
+        return None
+    # Use file_id as safe filename
+    return download_drive_file(file_id, save_dir)
 
-        with open(filename, "wb") as f:
-            f.write(response.content)
 
-        return filename
-    except Exception as e:
-        print(f"Download error: {e}")
+def download_pdf_bytes_from_url(url: str) -> tuple[str, bytes] | None:
+    """Fetch a public Drive PDF into memory so it can be parsed without a temp file."""
+    file_id = extract_drive_file_id(url)
+    if not file_id:
+        print("❌ Invalid Google Drive link format.")
         return None
+    data = download_drive_bytes(file_id)
+    return (file_id, data) if data is not None else None
 
 
 def extract_file_ids_and_names(folder_url: str):
-    chrome_options = Options()
-    chrome_options.add_argument("--headless=new")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
-    driver.get(folder_url)
-    time.sleep(5)  # Allow page to load
-
-    results = []
-
-    try:
-        items = driver.find_elements(By.CSS_SELECTOR, 'div[data-id]')
-        for item in items:
-            file_id = item.get_attribute("data-id")
-            file_name = item.get_attribute("aria-label") or item.text.strip()
-            if file_id and file_name:
-                results.append({"file_id": file_id, "file_name": file_name})
-    except Exception as e:
-        print("Error while extracting file details:", e)
-
-    driver.quit()
-    return results
+    return list_folder(folder_url)["files"]
 
 
 def ingest_from_drive_folder(folder_url: str):
@@ -125,102 +60,82 @@ def ingest_from_drive_folder(folder_url: str):
     print(f"Found {len(file_ids)} files in the folder.")
     for file_id in file_ids:
         print(f"Processing file ID: {file_id}")
-    embedder = EmbeddingGenerator()
-    milvus = MilvusClient()
 
-    # download_pdf_by_id
-    for file_id in file_ids:
-        path = download_pdf_by_id(file_id, TEMP_DIR)
-        if not path:
-            print(f"❌ Failed to download file ID: {file_id}")
-            continue
-        # checksum = sha256_checksum(path)
-        # if is_already_processed(checksum):
-        #     print(f"❌ Skipping duplicate: {file_id}")
-        #     continue
-        print(f"✅ Processing: {file_id}")
-        text = extract_text_from_pdf(path)
-        print(f"Extracted text from {file_id} with length {len(text)}")
-        chunks = embedder.chunk_text_by_tokens(text)
-        embeddings = embedder.generate_embeddings(chunks)
-
-        
-        pdf_ids = []
-        file_ids = []
-        chunks_list = []
-        embeddings_list = []
-
-        for chunk, embedding in zip(chunks, embeddings):
-            pdf_id = str(uuid.uuid4())  # Generate a unique PDF ID
-            pdf_ids.append(pdf_id)
-            file_ids.append(file_id)
-            chunks_list.append(chunk)
-            embeddings_list.append(embedding)
-
-        milvus.insert({"pdf_id": pdf_ids,"file_id": file_ids,"chunk": chunks_list,"embedding": embeddings_list})
-
-
-        # mark_as_processed(checksum)
-
-    # for file_id in file_ids:
-    #     path = download_pdf_from_drive(file_id)
-    #     if not path:
-    #         continue
-    #     checksum = sha256_checksum(path)
-    #     if is_already_processed(checksum):
-    #         print(f"❌ Skipping duplicate: {file_id}")
-    #         continue
-    #     print(f"✅ Processing: {file_id}")
-    #     text = extract_text_from_pdf(path)
-    #     chunks = embedder.chunk_text_by_tokens(text)
-    #     embeddings = embedder.generate_embeddings(chunks)
-
-    #     for chunk, embedding in zip(chunks, embeddings):
-    #         milvus.insert({
-    #             "pdf_id": file_id,
-    #             "chunk": chunk,
-    #             "embedding": embedding
-    #         })
-    #     mark_as_processed(checksum)
-
-
-
-def ingest_single_public_pdf(pdf_url: str):
+    # download -> parse/chunk -> embed -> write run concurrently on bounded queues
+    pipeline = IngestionPipeline(download_pdf_by_id, TEMP_DIR)
+    return pipeline.run(file_ids)
+
+
+def ingest_single_public_pdf(pdf_url: str) -> dict:
+    """Ingest one public Drive PDF. Returns its outcome: {"file_id", "status", "chunks", "error"}."""
     print(f"📥 Starting ingestion for PDF URL: {pdf_url}")
 
-    path = download_pdf_from_url(pdf_url, TEMP_DIR)
-    if not path:
+    def outcome(file_id, status, chunks=0, error=None):
+        return {"file_id": file_id, "status": status, "chunks": chunks, "error": error}
+
+    with span("download", pipeline="ingest"):
+        downloaded = download_pdf_bytes_from_url(pdf_url)
+    if not downloaded:
         print(f"❌ Failed to download PDF from URL: {pdf_url}")
-        return
+        return outcome(extract_drive_file_id(pdf_url), "failed", error="download failed")
+
+    drive_id, data = downloaded
+    print(f"✅ Downloaded {len(data)} bytes")
 
-    print(f"✅ Downloaded PDF to: {path}")
+    file_id = f"{drive_id}.pdf"  # same id the file-based path used (its filename)
+    checksum = sha256_bytes(data)
+    if is_already_processed(file_id, checksum):
+        print(f"⏭️ Skipping unchanged: {file_id}")
+        return outcome(file_id, "skipped")
 
     embedder = EmbeddingGenerator()
-    milvus = MilvusClient()
+    milvus = get_milvus_client()
 
-    text = extract_text_from_pdf(path)
-    if not text.strip():
+    # Pages are parsed across processes straight from memory while the chunker consumes them
+    timings = {}
+    start = time.perf_counter()
+    try:
+        # enforces the Milvus `chunk` length limit
+        chunks = chunk_pages(timed_iter(iter_pdf_pages_parallel(data), timings, "extract"))
+    except Exception as e:
+        print(f"Error extracting text from {file_id}: {e}")
+        chunks = []
+    timings["chunk"] = time.perf_counter() - start - timings.get("extract", 0.0)
+    for step, seconds in timings.items():
+        observe_stage("ingest", step, seconds, file_id=file_id)
+    if not chunks:
         print("⚠️ Empty or unreadable text. Skipping.")
-        return
+        return outcome(file_id, "failed", error="no extractable text")
 
-    print(f"📚 Extracted {len(text)} characters from PDF")
+    print(f"📚 Chunked {chunks[-1]['char_end']} characters from {chunks[-1]['page_end']} pages")
 
-    chunks = embedder.chunk_text_by_tokens(text)  # enforce limit
-    embeddings = embedder.generate_embeddings(chunks)
+    with span("embed", pipeline="ingest", file_id=file_id, chunks=len(chunks)):
+        embeddings = embedder.generate_embeddings([chunk["text"] for chunk in chunks])
 
     if len(chunks) != len(embeddings):
         print("❌ Mismatch between chunks and embeddings.")
-        return
-
-    pdf_id = str(uuid.uuid4())
-    file_id = os.path.basename(path)  # use filename as file_id
-
-    milvus.insert({
-        "pdf_id": [pdf_id] * len(chunks),
-        "file_id": [file_id] * len(chunks),  # ✅ THIS LINE FIXES THE ERROR
-        "chunk": chunks,
-        "embedding": embeddings,
-    })
-
-    print(f"✅ Ingested {len(chunks)} chunks for file: {file_id}")
-
+        return outcome(file_id, "failed", error="embedding count mismatch")
+
+    # Drop chunks that failed to embed; positions line up with `chunks`
+    pdf_ids = chunk_pdf_ids(file_id, checksum, len(chunks))
+    rows = [(pdf_id, c["text"], e) for pdf_id, c, e in zip(pdf_ids, chunks, embeddings) if e is not None]
+    if not rows:
+        print("❌ No chunks could be embedded.")
+        return outcome(file_id, "failed", error="no chunks could be embedded")
+
+    with milvus.bulk_writer() as writer:
+        writer.add({
+            "pdf_id": [pdf_id for pdf_id, _, _ in rows],
+            "file_id": [file_id] * len(rows),  # ✅ THIS LINE FIXES THE ERROR
+            "chunk": [c for _, c, _ in rows],
+            "embedding": [e for _, _, e in rows],
+        })
+
+    # The new version is flushed; replace the old one
+    milvus.delete_stale_rows(file_id, pdf_id_prefix(file_id, checksum))
+    record_chunk_spans(file_id, pdf_ids, chunks)
+    if len(rows) == len(chunks):
+        mark_as_processed(file_id, checksum, len(rows))
+
+    print(f"✅ Ingested {len(rows)} chunks for file: {file_id}")
+    return outcome(file_id, "done" if len(rows) == len(chunks) else "partial", len(rows))
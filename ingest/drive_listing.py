@@ -0,0 +1,309 @@
+"""
+Drive folder listing without a browser.
+
+A public folder's embedded view (DRIVE_FOLDER_VIEW_URL?id=<folder>) is plain
+server-rendered HTML. It is fetched over the shared download session and
+parsed with BeautifulSoup. The parser understands two layouts:
+
+- the embedded view: `div.flip-entry` with a link and a `.flip-entry-title`;
+- the regular folder page, as saved or as rendered by a browser:
+  `div[data-id]` with an aria-label.
+
+Subfolders are left out of the embedded view (the folder page does not mark
+them; non-PDFs are rejected at download). Next-page links (`a[rel=next]`, or a
+`data-next-page-token` attribute turned into `pageToken=`) are followed, up to
+LISTING_MAX_PAGES pages.
+
+The headless-Chrome scraper is now only a fallback, used when the HTTP page
+has neither layout and LISTING_BROWSER_FALLBACK=1. Its drivers are kept in a
+BrowserPool of LISTING_BROWSERS, started on first use. They wait for the rows
+to appear instead of sleeping.
+
+Listings are cached per folder for LISTING_CACHE_TTL seconds, so
+/list-drive-files/ and an ingestion job started right after it share one
+fetch. Concurrent callers for the same folder wait for a single fetch. Once
+an entry expires, it is revalidated with If-None-Match / If-Modified-Since
+when the server sent an ETag or Last-Modified; a 304 keeps the cached
+listing.
+
+    python -m ingest.drive_listing <folder_url>      # list a folder
+    python -m ingest.drive_listing --html page.html  # parse a saved page
+"""
+import argparse
+import json
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import parse_qs, urlencode, urljoin, urlparse
+
+DRIVE_FOLDER_VIEW_URL = os.getenv("DRIVE_FOLDER_VIEW_URL", "https://drive.google.com/embeddedfolderview")
+LISTING_CACHE_TTL = float(os.getenv("LISTING_CACHE_TTL", "300"))  # seconds; 0 disables the cache
+LISTING_MAX_PAGES = int(os.getenv("LISTING_MAX_PAGES", "50"))
+LISTING_BROWSER_FALLBACK = os.getenv("LISTING_BROWSER_FALLBACK", "1") == "1"
+LISTING_BROWSERS = int(os.getenv("LISTING_BROWSERS", "1"))
+LISTING_BROWSER_WAIT = float(os.getenv("LISTING_BROWSER_WAIT", "15"))  # seconds for rows to render
+
+_FILE_LINK = re.compile(r"/file/d/([\w-]+)")
+_FOLDER_LINK = re.compile(r"/folders/([\w-]+)")
+
+
+class ListingError(Exception):
+    pass
+
+
+def extract_folder_id(folder_url: str) -> str | None:
+    match = _FOLDER_LINK.search(folder_url)
+    if match:
+        return match.group(1)
+    ids = parse_qs(urlparse(folder_url).query).get("id")
+    return ids[0] if ids else None
+
+
+# -- parsing ---------------------------------------------------------------------------
+
+def parse_folder_page(html: str, base_url: str = DRIVE_FOLDER_VIEW_URL) -> tuple[list[dict], str | None] | None:
+    """
+    Files on one folder page and the URL of the next page (or None). Returns
+    None when the page has neither known layout (sign-in page, changed markup).
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    files = []
+    entries = soup.select("div.flip-entry")
+    if entries or soup.select_one(".flip-entries, .flip-list-view, .flip-grid-view"):
+        for entry in entries:
+            link = entry.find("a", href=True)
+            href = link["href"] if link else ""
+            if _FOLDER_LINK.search(href):
+                continue
+            match = _FILE_LINK.search(href)
+            file_id = match.group(1) if match else entry.get("id", "").removeprefix("entry-")
+            title = entry.select_one(".flip-entry-title")
+            if file_id:
+                files.append({"file_id": file_id, "file_name": title.get_text(strip=True) if title else ""})
+    else:
+        rows = soup.select("div[data-id]")
+        if not rows:
+            return None
+        for row in rows:
+            label = row.get("aria-label") or row.get_text(" ", strip=True)
+            files.append({"file_id": row["data-id"], "file_name": label})
+
+    next_page = None
+    link = soup.find("a", rel="next", href=True)
+    if link is not None:
+        next_page = urljoin(base_url, link["href"])
+    else:
+        marker = soup.find(attrs={"data-next-page-token": True})
+        if marker is not None and marker["data-next-page-token"]:
+            parts = urlparse(base_url)
+            query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+            query["pageToken"] = marker["data-next-page-token"]
+            next_page = parts._replace(query=urlencode(query)).geturl()
+    # Dedupe on file id, keeping page order (grid and list views can both be present)
+    seen = set()
+    files = [f for f in files if not (f["file_id"] in seen or seen.add(f["file_id"]))]
+    return files, next_page
+
+
+# -- HTTP ------------------------------------------------------------------------------
+
+def _fetch_pages(folder_id: str, validators: dict) -> tuple[list[dict] | None, dict]:
+    """
+    Fetch and parse every page of the embedded view. Returns (files, validators),
+    with files None when the first page came back 304 Not Modified.
+    """
+    from ingest.downloads import get_session
+
+    session = get_session()
+    first = f"{DRIVE_FOLDER_VIEW_URL}?id={folder_id}"
+    url, files, new_validators = first, [], {}
+    for page in range(LISTING_MAX_PAGES):
+        headers = {}
+        if page == 0:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        response = session.get(url, headers=headers, timeout=(10, 30))
+        if page == 0 and response.status_code == 304:
+            return None, validators
+        if response.status_code != 200:
+            raise ListingError(f"HTTP {response.status_code} for {url}")
+        if page == 0:
+            new_validators = {"etag": response.headers.get("ETag"),
+                              "last_modified": response.headers.get("Last-Modified")}
+        parsed = parse_folder_page(response.text, url)
+        if parsed is None:
+            raise ListingError("unrecognised folder page (not public, or the markup changed)")
+        page_files, url = parsed
+        files += page_files
+        if not url:
+            break
+    else:
+        print(f"⚠️ Folder {folder_id} has more than {LISTING_MAX_PAGES} pages; the listing is truncated")
+    return files, new_validators
+
+
+# -- browser fallback ------------------------------------------------------------------
+
+class BrowserPool:
+    """Up to `size` headless Chrome drivers, started on demand and reused across listings."""
+
+    def __init__(self, size: int = LISTING_BROWSERS):
+        self.size = max(1, size)
+        self._idle: queue.Queue = queue.Queue()
+        self._started = 0
+        self._lock = threading.Lock()
+        self._driver_path = None
+
+    def _start_driver(self):
+        # selenium and webdriver_manager are only imported when the fallback is actually needed
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.chrome.options import Options
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        if self._driver_path is None:
+            self._driver_path = ChromeDriverManager().install()  # once per process, not per listing
+        chrome_options = Options()
+        chrome_options.add_argument("--headless=new")  # Required for newer headless Chrome
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        return webdriver.Chrome(service=Service(self._driver_path), options=chrome_options)
+
+    @contextmanager
+    def driver(self):
+        try:
+            driver = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                start = self._started < self.size
+                self._started += start
+            if start:
+                try:
+                    driver = self._start_driver()
+                except Exception:
+                    with self._lock:
+                        self._started -= 1
+                    raise
+            else:
+                driver = self._idle.get(timeout=LISTING_BROWSER_WAIT * 4)
+        try:
+            yield driver
+        except Exception:
+            # A driver that failed mid-page may be wedged; replace it next time
+            with self._lock:
+                self._started -= 1
+            driver.quit()
+            raise
+        self._idle.put(driver)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().quit()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._started -= 1
+
+
+_browsers = BrowserPool()
+
+
+def _list_with_browser(folder_url: str) -> list[dict]:
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    with _browsers.driver() as driver:
+        driver.get(folder_url)
+        WebDriverWait(driver, LISTING_BROWSER_WAIT).until(
+            expected_conditions.presence_of_element_located((By.CSS_SELECTOR, "div[data-id]")))
+        parsed = parse_folder_page(driver.page_source, folder_url)
+    if parsed is None:
+        raise ListingError("no files found in the rendered folder page")
+    return parsed[0]
+
+
+def close_browsers():
+    _browsers.close()
+
+
+# -- cache -----------------------------------------------------------------------------
+
+_cache: dict[str, dict] = {}  # folder id -> {"files", "fetched", "validators", "source"}
+_cache_lock = threading.Lock()
+_folder_locks: dict[str, threading.Lock] = {}
+
+
+def _folder_lock(folder_id: str) -> threading.Lock:
+    with _cache_lock:
+        return _folder_locks.setdefault(folder_id, threading.Lock())
+
+
+def list_folder(folder_url: str, refresh: bool = False) -> dict:
+    """
+    {"folder_id", "files": [{"file_id", "file_name"}], "source", "cached",
+    "age_seconds"}; source is http or browser. Raises ListingError.
+    """
+    folder_id = extract_folder_id(folder_url)
+    if not folder_id:
+        raise ListingError(f"Not a Google Drive folder link: {folder_url}")
+
+    # One fetch per folder at a time; callers that waited on it get its result
+    with _folder_lock(folder_id):
+        entry = _cache.get(folder_id)
+        fresh = entry is not None and time.monotonic() - entry["fetched"] < LISTING_CACHE_TTL
+        if fresh and not refresh:
+            return {"folder_id": folder_id, "files": list(entry["files"]), "source": entry["source"],
+                    "cached": True, "age_seconds": round(time.monotonic() - entry["fetched"], 1)}
+
+        start = time.perf_counter()
+        validators = entry["validators"] if entry and entry["source"] == "http" else {}
+        try:
+            files, validators = _fetch_pages(folder_id, validators)
+            source = "http"
+            if files is None:
+                files = entry["files"]
+                print(f"📂 Folder {folder_id} not modified; keeping {len(files)} cached files")
+        except Exception as e:
+            if not LISTING_BROWSER_FALLBACK:
+                raise ListingError(f"Could not list folder {folder_id}: {e}") from e
+            print(f"⚠️ HTTP listing of {folder_id} failed ({e}); falling back to a browser")
+            try:
+                files, validators, source = _list_with_browser(folder_url), {}, "browser"
+            except Exception as browser_error:
+                raise ListingError(f"Could not list folder {folder_id}: {browser_error}") from browser_error
+        print(f"📂 Listed {len(files)} files in folder {folder_id} via {source} "
+              f"in {time.perf_counter() - start:.2f}s")
+        if LISTING_CACHE_TTL > 0:
+            _cache[folder_id] = {"files": files, "fetched": time.monotonic(),
+                                 "validators": validators, "source": source}
+        return {"folder_id": folder_id, "files": list(files), "source": source, "cached": False,
+                "age_seconds": 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List a public Google Drive folder without a browser.")
+    parser.add_argument("folder_url", nargs="?")
+    parser.add_argument("--html", help="Parse a saved folder page instead of fetching one")
+    args = parser.parse_args()
+    if args.html:
+        with open(args.html, encoding="utf-8") as f:
+            parsed = parse_folder_page(f.read())
+        result = {"files": parsed[0], "next_page": parsed[1]} if parsed else {"error": "unrecognised page"}
+    elif args.folder_url:
+        result = list_folder(args.folder_url)
+    else:
+        parser.error("give a folder URL or --html")
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
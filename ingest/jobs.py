@@ -0,0 +1,439 @@
+"""
+Background ingestion jobs, kept in a local SQLite store (no broker).
+
+POST /ingest-drive-folder and /ingest-single-public-pdf enqueue a job and
+return its id at once. INGEST_JOB_WORKERS threads in the API process claim
+queued jobs and run them one at a time each. With 0 workers the API only
+enqueues, and a separate `python -m ingest.jobs worker` process does the work.
+
+A folder job lists the folder once and stores one row per file. The files
+then go through IngestionPipeline in batches of INGEST_JOB_BATCH_FILES, and
+each batch ends with a Milvus flush. Every file outcome (done, partial,
+skipped, failed) is checkpointed as it is recorded. A job interrupted by a
+restart or a crash (its heartbeat goes stale) is claimed again and carries
+on with the files that are still pending.
+
+Cancelling a queued job is immediate. A running job stops starting new
+files, lets the ones in flight finish, and ends as cancelled.
+
+A job that records no file outcome for INGEST_JOB_STALL_SECONDS is treated
+as wedged: it stops heartbeating and is stopped like a cancel; files cut off
+in a blocked stage go back to pending. The job is then released for another
+attempt, or failed after INGEST_JOB_MAX_ATTEMPTS.
+
+    python -m ingest.jobs worker          # run jobs until Ctrl-C
+    python -m ingest.jobs list            # recent jobs with their progress
+    python -m ingest.jobs cancel <job_id>
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+INGEST_JOBS_DB = os.getenv("INGEST_JOBS_DB", "ingest_jobs.sqlite")
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "1"))
+INGEST_JOB_BATCH_FILES = int(os.getenv("INGEST_JOB_BATCH_FILES", "25"))
+# A running job whose heartbeat is older than this is considered orphaned and claimed again
+INGEST_JOB_STALE_SECONDS = float(os.getenv("INGEST_JOB_STALE_SECONDS", "120"))
+# A job that records no file outcome for this long is wedged: it stops heartbeating and is handed back
+INGEST_JOB_STALL_SECONDS = float(os.getenv("INGEST_JOB_STALL_SECONDS", str(5 * INGEST_JOB_STALE_SECONDS)))
+INGEST_JOB_MAX_ATTEMPTS = int(os.getenv("INGEST_JOB_MAX_ATTEMPTS", "3"))
+# How long shutdown waits for running jobs: the pipeline's stop grace (same variable as ingest.pipeline)
+# plus time to checkpoint and release, so a batch is not cut off before it is handed back
+INGEST_JOB_STOP_SECONDS = float(os.getenv(
+    "INGEST_JOB_STOP_SECONDS", str(float(os.getenv("INGEST_STOP_GRACE_SECONDS", "60")) + 15)))
+INGEST_JOBS_LISTED = 50
+
+_HEARTBEAT_SECONDS = 10
+_POLL_SECONDS = 2
+FINAL_STATUSES = ("finished", "failed", "cancelled")
+_FILE_DONE = ("done", "partial", "skipped", "failed")
+
+_local = threading.local()
+
+
+def _db() -> sqlite3.Connection:
+    # One connection per thread, as in utils.hash_utils
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(INGEST_JOBS_DB, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                source TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat_at REAL,
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                listed INTEGER NOT NULL DEFAULT 0,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                last_batch TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at);
+            CREATE TABLE IF NOT EXISTS job_files (
+                job_id TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                chunks INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (job_id, file_id)
+            );
+        """)
+        _local.conn = conn
+    return conn
+
+
+def _now() -> float:
+    return time.time()
+
+
+def _iso(ts: float | None) -> str | None:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(ts)) if ts else None
+
+
+# -- store -----------------------------------------------------------------------------
+
+def create_job(kind: str, source: str) -> dict:
+    """Enqueue a `folder` (source = folder URL) or `pdf` (source = file URL) job."""
+    if kind not in ("folder", "pdf"):
+        raise ValueError(f"Unknown ingestion job kind: {kind}")
+    job_id = uuid.uuid4().hex[:12]
+    _db().execute("INSERT INTO jobs (id, kind, source, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                  (job_id, kind, source, _now()))
+    _wake.set()
+    return get_job(job_id)
+
+
+def get_job(job_id: str) -> dict | None:
+    conn = _db()
+    row = conn.execute(
+        "SELECT id, kind, source, status, created_at, started_at, finished_at, attempts, listed, "
+        "cancel_requested, error, last_batch FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    (job_id, kind, source, status, created_at, started_at, finished_at, attempts, listed,
+     cancel_requested, error, last_batch) = row
+    counts = dict(conn.execute("SELECT status, COUNT(*) FROM job_files WHERE job_id = ? GROUP BY status",
+                               (job_id,)).fetchall())
+    chunks = conn.execute("SELECT COALESCE(SUM(chunks), 0) FROM job_files WHERE job_id = ?",
+                          (job_id,)).fetchone()[0]
+    files_done = sum(counts.get(status, 0) for status in _FILE_DONE)
+    elapsed = ((finished_at or _now()) - started_at) if started_at else 0.0
+    return {
+        "id": job_id,
+        "kind": kind,
+        "source": source,
+        "status": status,
+        "cancel_requested": bool(cancel_requested),
+        "created_at": _iso(created_at),
+        "started_at": _iso(started_at),
+        "finished_at": _iso(finished_at),
+        "attempts": attempts,
+        "progress": {
+            "files_total": sum(counts.values()) if listed else None,
+            "files_done": files_done,
+            "files_ingested": counts.get("done", 0) + counts.get("partial", 0),
+            "files_skipped": counts.get("skipped", 0),
+            "files_failed": counts.get("failed", 0),
+            "files_pending": counts.get("pending", 0),
+            "chunks_embedded": chunks,
+            "elapsed_seconds": round(elapsed, 1),
+            "files_per_minute": round(files_done / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            "chunks_per_second": round(chunks / elapsed, 2) if elapsed > 0 else 0.0,
+        },
+        "error": error,
+        "last_batch": json.loads(last_batch) if last_batch else None,
+    }
+
+
+def list_jobs(limit: int = INGEST_JOBS_LISTED) -> list[dict]:
+    rows = _db().execute("SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    return [get_job(job_id) for (job_id,) in rows]
+
+
+def get_job_files(job_id: str, status: str | None = None) -> list[dict]:
+    query = "SELECT file_id, status, chunks, error, updated_at FROM job_files WHERE job_id = ?"
+    params = [job_id]
+    if status:
+        query += " AND status = ?"
+        params.append(status)
+    rows = _db().execute(query + " ORDER BY updated_at, file_id", params).fetchall()
+    return [{"file_id": f, "status": s, "chunks": c, "error": e, "updated_at": _iso(u)} for f, s, c, e, u in rows]
+
+
+def cancel_job(job_id: str) -> dict | None:
+    """Cancel a queued job now; ask a running one to stop after the files in flight."""
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            conn.execute("ROLLBACK")
+            return None
+        if row[0] == "queued":
+            conn.execute("UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ? "
+                         "WHERE id = ?", (_now(), job_id))
+        elif row[0] == "running":
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    # Runs in this process stop right away; others notice on their next heartbeat
+    run = _active_runs.get(job_id)
+    if run is not None:
+        run.cancelled = True
+    return get_job(job_id)
+
+
+def _claim(worker: str) -> dict | None:
+    """Atomically take the oldest queued (or orphaned running) job."""
+    conn = _db()
+    now = _now()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT id, kind, source, listed, attempts FROM jobs WHERE status = 'queued' "
+            "OR (status = 'running' AND heartbeat_at < ?) ORDER BY created_at LIMIT 1",
+            (now - INGEST_JOB_STALE_SECONDS,)).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute("UPDATE jobs SET status = 'running', worker = ?, heartbeat_at = ?, "
+                     "started_at = COALESCE(started_at, ?), attempts = attempts + 1 WHERE id = ?",
+                     (worker, now, now, row[0]))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return {"id": row[0], "kind": row[1], "source": row[2], "listed": bool(row[3]), "attempts": row[4] + 1}
+
+
+def _heartbeat(job_id: str) -> bool:
+    """Refresh the job's heartbeat; returns True if cancellation was requested."""
+    conn = _db()
+    conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (_now(), job_id))
+    return bool(conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+
+
+def _set_files(job_id: str, file_ids: list[str]):
+    conn = _db()
+    now = _now()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany("INSERT OR IGNORE INTO job_files (job_id, file_id, status, updated_at) "
+                         "VALUES (?, ?, 'pending', ?)", [(job_id, file_id, now) for file_id in file_ids])
+        conn.execute("UPDATE jobs SET listed = 1 WHERE id = ?", (job_id,))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _record_file(job_id: str, file_id: str, status: str, chunks: int = 0, error: str | None = None):
+    _db().execute("INSERT OR REPLACE INTO job_files (job_id, file_id, status, chunks, error, updated_at) "
+                  "VALUES (?, ?, ?, ?, ?, ?)", (job_id, file_id, status, chunks, error, _now()))
+
+
+def _pending_files(job_id: str) -> list[str]:
+    rows = _db().execute("SELECT file_id FROM job_files WHERE job_id = ? AND status = 'pending' ORDER BY file_id",
+                         (job_id,)).fetchall()
+    return [file_id for (file_id,) in rows]
+
+
+def _finish(job_id: str, status: str, error: str | None = None):
+    _db().execute("UPDATE jobs SET status = ?, error = ?, finished_at = ?, heartbeat_at = NULL WHERE id = ?",
+                  (status, error, _now(), job_id))
+
+
+def _release(job_id: str):
+    # Shutting down mid-job: hand it back so the next worker resumes it
+    _db().execute("UPDATE jobs SET status = 'queued', worker = NULL, heartbeat_at = NULL WHERE id = ?", (job_id,))
+
+
+# -- execution -------------------------------------------------------------------------
+
+class _JobRun:
+    """One claimed job: heartbeats, cancellation and the per-file checkpoint."""
+
+    def __init__(self, job: dict, shutdown: threading.Event):
+        self.job = job
+        self.shutdown = shutdown
+        self.cancelled = False
+        self.stalled = False
+        self.last_progress = time.monotonic()
+        self._done = threading.Event()
+        self._beat = threading.Thread(target=self._heartbeat_loop, daemon=True)
+
+    def _heartbeat_loop(self):
+        while not self._done.wait(_HEARTBEAT_SECONDS):
+            if time.monotonic() - self.last_progress > INGEST_JOB_STALL_SECONDS:
+                # A wedged pipeline must not keep the job looking alive: stop it and let the
+                # heartbeat go stale, so the job is released here or reclaimed elsewhere
+                print(f"⚠️ Ingestion job {self.job['id']}: no file finished in {INGEST_JOB_STALL_SECONDS:.0f}s; "
+                      f"stopping it")
+                self.stalled = True
+                return
+            try:
+                self.cancelled = _heartbeat(self.job["id"]) or self.cancelled
+            except Exception as e:
+                print(f"⚠️ Ingestion job {self.job['id']} heartbeat failed: {e}")
+
+    def should_stop(self) -> bool:
+        return self.cancelled or self.stalled or self.shutdown.is_set()
+
+    def on_file(self, file_id: str, status: str, chunks: int = 0, error: str | None = None):
+        self.last_progress = time.monotonic()
+        # Interrupted files were cut off by a stop, not by their content; they run again on resume
+        _record_file(self.job["id"], file_id, "pending" if status == "interrupted" else status, chunks, error)
+
+    def run(self):
+        from ingest.drive_folder_ingest import (TEMP_DIR, download_pdf_by_id, extract_file_ids_from_folder,
+                                                ingest_single_public_pdf)
+        from ingest.pipeline import IngestionPipeline
+
+        job_id = self.job["id"]
+        self.cancelled = _heartbeat(job_id)
+        self._beat.start()
+        _active_runs[job_id] = self
+        try:
+            if self.job["kind"] == "pdf":
+                if not self.should_stop():
+                    result = ingest_single_public_pdf(self.job["source"])
+                    _set_files(job_id, [])
+                    self.on_file(result["file_id"] or self.job["source"], result["status"], result["chunks"],
+                                 result["error"])
+            else:
+                if not self.job["listed"]:
+                    file_ids = extract_file_ids_from_folder(self.job["source"])
+                    print(f"📂 Job {job_id}: {len(file_ids)} files in {self.job['source']}")
+                    _set_files(job_id, file_ids)
+                pending = _pending_files(job_id)
+                while pending and not self.should_stop():
+                    batch, pending = pending[:INGEST_JOB_BATCH_FILES], pending[INGEST_JOB_BATCH_FILES:]
+                    self.last_progress = time.monotonic()
+                    pipeline = IngestionPipeline(download_pdf_by_id, TEMP_DIR, on_file=self.on_file,
+                                                 should_stop=self.should_stop)
+                    report = pipeline.run(batch)
+                    _db().execute("UPDATE jobs SET last_batch = ? WHERE id = ?", (json.dumps(report), job_id))
+            self._done.set()
+            if self.stalled and not self.cancelled:
+                if self.job["attempts"] >= INGEST_JOB_MAX_ATTEMPTS:
+                    _finish(job_id, "failed", f"stalled: no progress for {INGEST_JOB_STALL_SECONDS:.0f}s "
+                                              f"on attempt {self.job['attempts']}")
+                    print(f"❌ Ingestion job {job_id} stalled {self.job['attempts']} times; giving up")
+                else:
+                    _release(job_id)
+                    print(f"⏸️ Ingestion job {job_id} stalled; released for another attempt")
+            elif self.shutdown.is_set() and not self.cancelled and _pending_files(job_id):
+                _release(job_id)
+                print(f"⏸️ Ingestion job {job_id} interrupted; it resumes on the next start")
+            else:
+                _finish(job_id, "cancelled" if self.cancelled else "finished")
+                print(f"🏁 Ingestion job {job_id} {'cancelled' if self.cancelled else 'finished'}")
+        except Exception as e:
+            self._done.set()
+            print(f"❌ Ingestion job {job_id} failed: {e}")
+            _finish(job_id, "failed", str(e))
+        finally:
+            _active_runs.pop(job_id, None)
+
+
+_wake = threading.Event()
+_active_runs: dict[str, _JobRun] = {}
+
+
+class JobWorkers:
+    """A fixed pool of threads that claim and run queued jobs."""
+
+    def __init__(self, size: int = INGEST_JOB_WORKERS):
+        self.size = size
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._shutdown = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self):
+        if self._threads or self.size <= 0:
+            return
+        self._threads = [threading.Thread(target=self._loop, args=(i,), name=f"ingest-job-{i}", daemon=True)
+                         for i in range(self.size)]
+        for thread in self._threads:
+            thread.start()
+        print(f"🧵 {self.size} ingestion job worker(s) started")
+
+    def _loop(self, i: int):
+        while not self._shutdown.is_set():
+            try:
+                job = _claim(f"{self.name}/{i}")
+            except Exception as e:
+                print(f"⚠️ Could not claim an ingestion job: {e}")
+                job = None
+            if job is None:
+                _wake.wait(_POLL_SECONDS)
+                _wake.clear()
+                continue
+            print(f"🚚 Ingestion job {job['id']} ({job['kind']}) started: {job['source']}")
+            _JobRun(job, self._shutdown).run()
+
+    def stop(self, timeout: float = INGEST_JOB_STOP_SECONDS):
+        """
+        Stop claiming; running jobs stop starting files, let the ones in flight
+        finish and are handed back for resumption. Waits up to `timeout` in all.
+        """
+        self._shutdown.set()
+        _wake.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        running = sum(thread.is_alive() for thread in self._threads)
+        if running:
+            print(f"⚠️ {running} ingestion job(s) still running after {timeout:.0f}s; "
+                  f"they resume from their last checkpoint once their heartbeat goes stale")
+        self._threads = []
+
+
+job_workers = JobWorkers()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run or inspect background ingestion jobs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker = sub.add_parser("worker", help="Run jobs until interrupted")
+    worker.add_argument("--workers", type=int, default=max(1, INGEST_JOB_WORKERS))
+    sub.add_parser("list", help="Recent jobs")
+    cancel = sub.add_parser("cancel", help="Cancel a job")
+    cancel.add_argument("job_id")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        workers = JobWorkers(args.workers)
+        workers.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("⏹️ Stopping; running jobs resume on the next start")
+            workers.stop(timeout=600)
+    elif args.command == "list":
+        for job in list_jobs():
+            p = job["progress"]
+            print(f"{job['id']}  {job['status']:<9} {job['kind']:<6} {p['files_done']}/{p['files_total']} files  "
+                  f"{p['chunks_embedded']} chunks  {job['source']}")
+    else:
+        job = cancel_job(args.job_id)
+        print(json.dumps(job, indent=2) if job else f"Unknown job {args.job_id}")
+
+
+if __name__ == "__main__":
+    main()
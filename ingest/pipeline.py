@@ -0,0 +1,478 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from embedding.generator import EmbeddingGenerator, chunk_pages
+from utils.instrumentation import observe_stage, timed_iter
+from utils.hash_utils import (sha256_checksum, is_already_processed, mark_as_processed, chunk_pdf_ids,
+                              pdf_id_prefix, record_chunk_spans)
+from utils.pdf_utils import iter_pdf_pages
+from vectorstore.milvus_client import get_milvus_client
+
+DOWNLOAD_WORKERS = int(os.getenv("INGEST_DOWNLOAD_WORKERS", "8"))
+PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", "4"))
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "16"))
+# After a stage fails or a stop is requested, how long the stages get to drain before run() abandons the batch
+STOP_GRACE_SECONDS = float(os.getenv("INGEST_STOP_GRACE_SECONDS", "60"))
+
+_SENTINEL = None
+_POLL_SECONDS = 1.0
+
+
+def _parse_and_chunk(path: str) -> tuple[list[dict], dict]:
+    """
+    Runs in a worker process: PDF text extraction and tokenization are CPU bound.
+    Pages stream from the parser into the chunker rather than being joined first.
+    Returns the chunks and the seconds spent extracting and chunking; the
+    metrics live in the parent process, which records them.
+
+    Pages are read sequentially: the stage already keeps PARSE_WORKERS files
+    in flight, so splitting one file into page ranges
+    (utils.pdf_utils.iter_pdf_pages_parallel) would only oversubscribe the
+    cores. That is left to ingest_single_public_pdf, which parses one file.
+    """
+    timings = {}
+    start = time.perf_counter()
+    chunks = chunk_pages(timed_iter(iter_pdf_pages(path), timings, "extract"))
+    timings["chunk"] = time.perf_counter() - start - timings.get("extract", 0.0)
+    return chunks, timings
+
+
+def _init_parse_worker():
+    # The Rust tokenizer spawns its own threads; one per process is plenty here
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+
+class StageStats:
+    """Throughput and queue-depth counters for one pipeline stage."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.units = 0  # stage-specific: bytes, chunks, rows, ...
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.queue_samples = 0
+        self.queue_depth_sum = 0
+        self.queue_depth_max = 0
+        self.started = time.perf_counter()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def sample_queue(self, q: queue.Queue):
+        depth = q.qsize()
+        with self._lock:
+            self.queue_samples += 1
+            self.queue_depth_sum += depth
+            self.queue_depth_max = max(self.queue_depth_max, depth)
+
+    def record(self, seconds: float, units: int = 0, ok: bool = True):
+        with self._lock:
+            self.items += 1
+            self.units += units
+            self.busy_seconds += seconds
+            if not ok:
+                self.errors += 1
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def as_dict(self) -> dict:
+        wall = (self.finished or time.perf_counter()) - self.started
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "units": self.units,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "wall_seconds": round(wall, 3),
+            "items_per_second": round(self.items / wall, 3) if wall > 0 else 0.0,
+            "units_per_second": round(self.units / wall, 1) if wall > 0 else 0.0,
+            # > 1 means the stage's workers overlapped; ~workers means it was saturated
+            "utilization": round(self.busy_seconds / wall, 3) if wall > 0 else 0.0,
+            "avg_queue_depth": round(self.queue_depth_sum / self.queue_samples, 2) if self.queue_samples else 0.0,
+            "max_queue_depth": self.queue_depth_max,
+        }
+
+
+class IngestionPipeline:
+    """
+    download -> parse/chunk -> embed -> write, connected by bounded queues.
+
+    Downloads run on threads, parsing and tokenizing on a process pool,
+    embedding as asyncio tasks, and a single writer feeds a Milvus BulkWriter.
+    Each stage works on the next file while the others are busy, so a folder
+    ingests at the pace of the slowest stage.
+
+    `on_file(file_id, status, chunks, error)` is called once per file that
+    reaches an outcome: done (flushed and recorded), partial, skipped
+    (unchanged), failed or interrupted. Once `should_stop()` returns True no
+    new downloads start and files already in flight get STOP_GRACE_SECONDS to
+    finish; any still blocked then are reported interrupted (not failed, so a
+    caller can retry them) and run() returns. Files never started get no call.
+
+    An error in one file fails that file only. If a whole stage breaks (no
+    Milvus client, the final flush), the pipeline is marked failed: every
+    stage drains its queue, reporting the files in it as failed, and run()
+    returns instead of waiting on the broken stage.
+    """
+
+    def __init__(self, download_fn, dest_folder: str,
+                 download_workers=DOWNLOAD_WORKERS, parse_workers=PARSE_WORKERS,
+                 embed_concurrency=EMBED_CONCURRENCY, queue_size=QUEUE_SIZE,
+                 on_file=None, should_stop=None):
+        self.download_fn = download_fn
+        self.dest_folder = dest_folder
+        self.on_file = on_file or (lambda file_id, status, chunks=0, error=None: None)
+        self.should_stop = should_stop or (lambda: False)
+        self.download_workers = max(1, download_workers)
+        self.parse_workers = max(1, parse_workers)
+        self.embed_concurrency = max(1, embed_concurrency)
+
+        self.download_q: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.parse_q: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.embed_q: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.write_q: queue.Queue = queue.Queue(maxsize=queue_size)
+
+        self.stats = {
+            "download": StageStats("download", self.download_workers),
+            "parse": StageStats("parse", self.parse_workers),
+            "embed": StageStats("embed", self.embed_concurrency),
+            "write": StageStats("write", 1),
+        }
+        self.skipped: list[str] = []
+        self.not_started: list[str] = []
+        self.failed = threading.Event()
+        self.failure: str | None = None
+        self._halted_at: float | None = None
+        self._outcomes: set[str] = set()
+        self._outcome_lock = threading.Lock()
+
+    # -- outcomes and failures -------------------------------------------------------
+
+    def _report(self, file_id: str, status: str, chunks: int = 0, error: str | None = None):
+        with self._outcome_lock:
+            self._outcomes.add(file_id)
+        try:
+            self.on_file(file_id, status, chunks, error)
+        except Exception as e:
+            print(f"⚠️ Could not record outcome {status} for {file_id}: {e}")
+
+    def _fail(self, stage: str, error: Exception):
+        """A whole stage broke: every file still in the pipeline fails instead of waiting on it."""
+        if not self.failed.is_set():
+            self.failure = f"{stage} stage failed: {error}"
+            self.failed.set()
+            print(f"❌ Ingestion {self.failure}")
+
+    def _halted_since(self) -> float | None:
+        """When the pipeline failed or should_stop() first returned True; None while it runs normally."""
+        if self._halted_at is None and (self.failed.is_set() or self.should_stop()):
+            self._halted_at = time.monotonic()
+        return self._halted_at
+
+    def _given_up(self) -> bool:
+        # A failure stops waiting at once; a stop request lets in-flight files finish within the grace period
+        if self.failed.is_set():
+            return True
+        since = self._halted_since()
+        return since is not None and time.monotonic() - since > STOP_GRACE_SECONDS
+
+    def _lost(self, file_id: str):
+        """Report a file dropped by a failed or stopped pipeline."""
+        if self.failed.is_set():
+            self._report(file_id, "failed", error=self.failure)
+        else:
+            self._report(file_id, "interrupted", error="stopped before it finished")
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """put() that gives up (returning False) once the pipeline has failed or was stopped and is stuck."""
+        while True:
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                if self._given_up():
+                    return False
+
+    def _run_stage(self, stage: str, q: queue.Queue, handle):
+        """
+        Feed each item of `q` to `handle` until the sentinel. An exception fails
+        only that file; once the pipeline has failed, items are drained and
+        reported failed without being handled.
+        """
+        stats = self.stats[stage]
+        while True:
+            stats.sample_queue(q)
+            item = q.get()
+            if item is _SENTINEL:
+                return
+            file_id = item if isinstance(item, str) else item[0]
+            if self.failed.is_set() or handle is None:
+                self._report(file_id, "failed", error=self.failure)
+                continue
+            try:
+                handle(item)
+            except Exception as e:
+                print(f"❌ {stage} of {file_id} failed: {e}")
+                stats.record(0.0, ok=False)
+                self._report(file_id, "failed", error=f"{stage} failed: {e}")
+
+    # -- stages --------------------------------------------------------------------
+
+    def _download_worker(self):
+        self._run_stage("download", self.download_q, self._download)
+
+    def _download(self, file_id: str):
+        stats = self.stats["download"]
+        if self.should_stop():
+            self.not_started.append(file_id)
+            return  # drain the queue without starting new files
+        start = time.perf_counter()
+        path = self.download_fn(file_id, self.dest_folder)
+        stats.record(time.perf_counter() - start, units=os.path.getsize(path) if path else 0, ok=path is not None)
+        observe_stage("ingest", "download", time.perf_counter() - start, file_id=file_id)
+        if not path:
+            print(f"❌ Failed to download file ID: {file_id}")
+            self._report(file_id, "failed", error="download failed")
+            return
+        checksum = sha256_checksum(path)
+        if is_already_processed(file_id, checksum):
+            print(f"⏭️ Skipping unchanged: {file_id}")
+            self.skipped.append(file_id)
+            self._report(file_id, "skipped")
+            return
+        if not self._put(self.parse_q, (file_id, path, checksum)):
+            self._lost(file_id)
+
+    def _parse_worker(self, pool: ProcessPoolExecutor):
+        self._run_stage("parse", self.parse_q, lambda item: self._parse(pool, *item))
+
+    def _parse(self, pool: ProcessPoolExecutor, file_id: str, path: str, checksum: str):
+        stats = self.stats["parse"]
+        start = time.perf_counter()
+        try:
+            chunks, timings = pool.submit(_parse_and_chunk, path).result()
+        except Exception as e:
+            print(f"❌ Failed to parse {file_id}: {e}")
+            stats.record(time.perf_counter() - start, ok=False)
+            self._report(file_id, "failed", error=f"parse failed: {e}")
+            return
+        stats.record(time.perf_counter() - start, units=len(chunks))
+        for step, seconds in timings.items():
+            observe_stage("ingest", step, seconds, file_id=file_id)
+        if not chunks:
+            print(f"⚠️ Empty or unreadable text in {file_id}. Skipping.")
+            self._report(file_id, "failed", error="no extractable text")
+            return
+        if not self._put(self.embed_q, (file_id, checksum, chunks)):
+            self._lost(file_id)
+
+    async def _embed_stage(self, embedder: EmbeddingGenerator):
+        stats = self.stats["embed"]
+
+        async def embed(file_id, checksum, chunks):
+            start = time.perf_counter()
+            try:
+                embeddings = await asyncio.to_thread(embedder.generate_embeddings,
+                                                     [chunk["text"] for chunk in chunks])
+            except Exception as e:
+                print(f"❌ Failed to embed {file_id}: {e}")
+                stats.record(time.perf_counter() - start, ok=False)
+                self._report(file_id, "failed", error=f"embedding failed: {e}")
+                return
+            stats.record(time.perf_counter() - start, units=len(chunks))
+            observe_stage("ingest", "embed", time.perf_counter() - start, file_id=file_id, chunks=len(chunks))
+            if not await asyncio.to_thread(self._put, self.write_q, (file_id, checksum, chunks, embeddings)):
+                self._lost(file_id)
+
+        async def worker():
+            while True:
+                stats.sample_queue(self.embed_q)
+                item = await asyncio.to_thread(self.embed_q.get)
+                if item is _SENTINEL:
+                    return
+                if self.failed.is_set():
+                    self._report(item[0], "failed", error=self.failure)
+                    continue
+                try:
+                    await embed(*item)
+                except Exception as e:
+                    print(f"❌ embed of {item[0]} failed: {e}")
+                    self._report(item[0], "failed", error=f"embed failed: {e}")
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.embed_concurrency)))
+        except BaseException as e:
+            # The stage itself broke; the writer and run() must not wait on it
+            self._fail("embed", e)
+            raise
+
+    def _write_worker(self):
+        written = []
+        drained = False
+        try:
+            milvus = get_milvus_client()
+            # One bulk writer per job: large inserts, a single flush when the job ends
+            with milvus.bulk_writer() as writer:
+                self._run_stage("write", self.write_q, lambda item: self._write(writer, written, *item))
+                drained = True
+        except Exception as e:
+            # Setup or the final flush failed, so nothing added to this writer is known to be durable
+            self._fail("write", e)
+            for file_id, *_ in written:
+                self._report(file_id, "failed", error=f"flush failed: {e}")
+            if not drained:
+                self._run_stage("write", self.write_q, None)
+            return
+
+        # New versions are flushed; now retire old versions and record what we ingested
+        for file_id, checksum, pdf_ids, chunks, rows_written in written:
+            try:
+                milvus.delete_stale_rows(file_id, pdf_id_prefix(file_id, checksum))
+            except Exception as e:
+                print(f"⚠️ Failed to delete old rows for {file_id}: {e}")
+                self._report(file_id, "failed", error=f"stale row cleanup failed: {e}")
+                continue
+            try:
+                record_chunk_spans(file_id, pdf_ids, chunks)
+                if rows_written == len(chunks):
+                    mark_as_processed(file_id, checksum, len(chunks))
+            except Exception as e:
+                print(f"❌ Failed to record {file_id}: {e}")
+                self._report(file_id, "failed", error=f"recording failed: {e}")
+                continue
+            if rows_written == len(chunks):
+                self._report(file_id, "done", len(chunks))
+            else:
+                # Leave it unmarked so the next run retries the chunks that failed
+                print(f"⚠️ {file_id} ingested partially; it will be retried on the next run")
+                self._report(file_id, "partial", rows_written)
+
+    def _write(self, writer, written: list, file_id: str, checksum: str, chunks: list[dict], embeddings: list):
+        stats = self.stats["write"]
+        pdf_ids = chunk_pdf_ids(file_id, checksum, len(chunks))
+        rows = {"pdf_id": [], "file_id": [], "chunk": [], "embedding": []}
+        for pdf_id, chunk, embedding in zip(pdf_ids, chunks, embeddings):
+            if embedding is None:
+                continue  # failed chunk; keep text/vector pairs aligned
+            rows["pdf_id"].append(pdf_id)
+            rows["file_id"].append(file_id)
+            rows["chunk"].append(chunk["text"])
+            rows["embedding"].append(embedding)
+        start = time.perf_counter()
+        try:
+            writer.add(rows)
+        except Exception as e:
+            print(f"❌ Milvus insert for {file_id} failed: {e}")
+            stats.record(time.perf_counter() - start, units=len(rows["pdf_id"]), ok=False)
+            self._report(file_id, "failed", error=f"insert failed: {e}")
+            return
+        stats.record(time.perf_counter() - start, units=len(rows["pdf_id"]))
+        print(f"✅ Queued {len(rows['pdf_id'])} chunks for file: {file_id}")
+        written.append((file_id, checksum, pdf_ids, chunks, len(rows["pdf_id"])))
+
+    # -- orchestration ---------------------------------------------------------------
+
+    @staticmethod
+    def _start(n: int, target, *args) -> list[threading.Thread]:
+        threads = [threading.Thread(target=target, args=args, daemon=True) for _ in range(n)]
+        for t in threads:
+            t.start()
+        return threads
+
+    def _past_grace(self) -> bool:
+        since = self._halted_since()
+        return since is not None and time.monotonic() - since > STOP_GRACE_SECONDS
+
+    def _put_sentinel(self, q: queue.Queue, threads: list[threading.Thread]):
+        while True:
+            try:
+                q.put(_SENTINEL, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                if not any(t.is_alive() for t in threads) or self._past_grace():
+                    return
+
+    def _join(self, threads: list[threading.Thread]) -> bool:
+        """
+        Wait for a stage. After a failure or a stop request it gets
+        STOP_GRACE_SECONDS to drain; a stage still busy then (a wedged call) is abandoned.
+        """
+        for t in threads:
+            while t.is_alive():
+                t.join(_POLL_SECONDS)
+                if self._past_grace():
+                    return False
+        return True
+
+    def run(self, file_ids: list[str]) -> dict:
+        started = time.perf_counter()
+        embedder = EmbeddingGenerator()
+
+        pool = ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_parse_worker)
+        abandoned = False
+        try:
+            downloaders = self._start(self.download_workers, self._download_worker)
+            parsers = self._start(self.parse_workers, self._parse_worker, pool)
+            embed_thread = threading.Thread(target=asyncio.run, args=(self._embed_stage(embedder),), daemon=True)
+            embed_thread.start()
+            writer = self._start(1, self._write_worker)
+
+            for file_id in file_ids:
+                if not self._put(self.download_q, file_id):
+                    break
+
+            # Shut down stage by stage: each stage drains before the next gets its sentinels
+            for stage, q, threads, n in (
+                ("download", self.download_q, downloaders, self.download_workers),
+                ("parse", self.parse_q, parsers, self.parse_workers),
+                ("embed", self.embed_q, [embed_thread], self.embed_concurrency),
+                ("write", self.write_q, writer, 1),
+            ):
+                for _ in range(n):
+                    self._put_sentinel(q, threads)
+                if not self._join(threads):
+                    print(f"⚠️ The {stage} stage did not stop in {STOP_GRACE_SECONDS:.0f}s; abandoning this batch")
+                    abandoned = True
+                    break
+                self.stats[stage].finish()
+        finally:
+            pool.shutdown(wait=not abandoned, cancel_futures=abandoned)
+
+        # Whatever is still unaccounted for was lost with a failed, stopped or abandoned stage
+        for file_id in file_ids:
+            if file_id not in self._outcomes and file_id not in self.not_started:
+                if self.failed.is_set() or self._halted_at is not None:
+                    self._lost(file_id)
+                else:
+                    self._report(file_id, "failed", error="lost by the pipeline")
+
+        report = {
+            "files": len(file_ids),
+            "skipped_unchanged": len(self.skipped),
+            "not_started": len(self.not_started),
+            "failure": self.failure,
+            "wall_seconds": round(time.perf_counter() - started, 3),
+            "stages": {name: s.as_dict() for name, s in self.stats.items()},
+        }
+        self._print_report(report)
+        return report
+
+    @staticmethod
+    def _print_report(report: dict):
+        print(f"📊 Ingested {report['files'] - report['not_started']} files ({report['skipped_unchanged']} unchanged, "
+              f"{report['not_started']} not started) in {report['wall_seconds']}s")
+        if report["failure"]:
+            print(f"   ❌ {report['failure']}")
+        for name, s in report["stages"].items():
+            print(f"   {name:<8} items={s['items']:<5} units={s['units']:<10} errors={s['errors']:<3} "
+                  f"{s['items_per_second']:>7}/s ({s['units_per_second']:>10} units/s) util={s['utilization']:<6} "
+                  f"queue avg={s['avg_queue_depth']} max={s['max_queue_depth']}")
@@ -1,21 +1,43 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from pydantic import BaseModel
-from ingest.drive_folder_ingest import ingest_from_drive_folder, extract_file_ids_and_names, ingest_single_public_pdf
-from utils.get_query_embedding import get_query_embedding
-from utils.serach_chunks import search_chunks
-from utils.group_by_file_id import group_by_file_id
-from utils.summarize_results_with_model import summarize_results_with_model
-from utils.summarize_keyword_results_with_model import summarize_keyword_results_with_model
+from embedding.cache import get_embedding_cache
+from utils.search_pipeline import (cached_semantic_search, retrieve, summarize_stream, search_many,
+                                   BATCH_SEARCH_MAX_QUERIES)
+from utils.response_cache import get_response_cache
+from utils.gemini_scheduler import get_scheduler, GeminiUnavailableError
+from utils.resources import registry
+from utils.instrumentation import MetricsMiddleware, render_prometheus, request_timings, span
+from utils.evaluation import evaluate, evaluation_jobs, write_results, EVAL_CONCURRENCY
+import asyncio
 import os
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Literal
-from utils.rerank_results_with_model import rerank_results_with_model_parallel
-import requests
-from sklearn.metrics import precision_score, recall_score, f1_score
 from typing import List, Dict
 import json
-app = FastAPI()
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager, aclosing
+from vectorstore.milvus_client import close_milvus
+from ingest import jobs as ingest_jobs
+from ingest.drive_listing import close_browsers
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the Gemini client, the Milvus connection and the search pool in the
+    # background; the worker accepts connections right away and /ready flips
+    # to 200 once everything is loaded
+    warmup = asyncio.create_task(asyncio.to_thread(registry.warmup))
+    # Ingestion jobs queued or interrupted before a restart are picked up again here
+    ingest_jobs.job_workers.start()
+    yield
+    await asyncio.to_thread(ingest_jobs.job_workers.stop)
+    close_browsers()
+    if not warmup.done():
+        await asyncio.wait([warmup], timeout=5)
+    close_milvus()
+
+
+app = FastAPI(lifespan=lifespan)
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pathlib import Path
 import uvicorn
 
@@ -25,7 +47,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "X-Cache"],
 )
+# Request ids, latency histograms and one structured log line per request
+app.add_middleware(MetricsMiddleware)
 
 
 class IngestRequest(BaseModel):
@@ -39,60 +64,169 @@ class QueryRequest(BaseModel):
     mode: Literal["conceptual", "keyword"] = "conceptual"
 
 
-@app.post("/ingest-drive-folder")
+@app.get("/health")
+def health():
+    # Liveness: the process is up and serving
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready():
+    """Readiness: 200 once the warmup resources are loaded, 503 (with details) until then."""
+    status = registry.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: stage latencies, Gemini calls/tokens, Milvus rows/bytes."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def _job_accepted(job: dict) -> dict:
+    return {"status": "accepted", "job_id": job["id"], "status_url": f"/ingest-jobs/{job['id']}", "job": job}
+
+
+@app.post("/ingest-drive-folder", status_code=202)
 def ingest_drive_folder(req: IngestRequest):
-    ingest_from_drive_folder(req.folder_url)
-    return {"status": "success", "message": "Folder ingested"}
+    # Ingestion runs as a background job; poll the status URL for progress
+    return _job_accepted(ingest_jobs.create_job("folder", req.folder_url))
 
-@app.post("/ingest-single-public-pdf")
+@app.post("/ingest-single-public-pdf", status_code=202)
 def ingest_single_pdf(req: IngestRequestSingle):
-    ingest_single_public_pdf(req.pdf_url)
-    return {"status": "success", "message": "Single public PDF ingested"}
+    return _job_accepted(ingest_jobs.create_job("pdf", req.pdf_url))
+
+
+@app.get("/ingest-jobs")
+def list_ingest_jobs(limit: int = 20):
+    return {"jobs": ingest_jobs.list_jobs(limit)}
+
+
+@app.get("/ingest-jobs/{job_id}")
+def get_ingest_job(job_id: str, files: bool = False):
+    """Status and progress (files done, chunks embedded, throughput); ?files=true adds per-file outcomes."""
+    job = ingest_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingestion job")
+    if files:
+        job["files"] = ingest_jobs.get_job_files(job_id)
+    return job
+
+
+@app.post("/ingest-jobs/{job_id}/cancel")
+def cancel_ingest_job(job_id: str):
+    job = ingest_jobs.cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingestion job")
+    if job["status"] in ("finished", "failed"):
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    return job
 
 
 
 @app.post("/semantic-search")
-def semantic_search(req: QueryRequest):
+async def semantic_search(req: QueryRequest, request: Request, response: Response, timings: bool = False):
+    # Runs entirely on the event loop: Gemini calls are awaited, Milvus searches
+    # go to a small dedicated executor, so no request holds a threadpool thread
     try:
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise HTTPException(status_code=500, detail="GEMINI_API_KEY not set in environment variables.")
 
-        # 🔍 Embed query (same for both modes now)
-        embedding = get_query_embedding(req.query)
-        if not embedding:
-            raise HTTPException(status_code=400, detail="Failed to generate embedding.")
+        # Repeated and near-duplicate queries are answered from the response cache
+        data, cache_outcome = await cached_semantic_search(req.query, req.mode, api_key)
+        response.headers["X-Cache"] = cache_outcome
+        # Opt-in per-stage breakdown: ?timings=true or an X-Debug-Timings: 1 header
+        if timings or request.headers.get("x-debug-timings") == "1":
+            data["timings_ms"] = {name: round(seconds * 1000, 2) for name, seconds in request_timings().items()}
+        return data
+
+    except HTTPException:
+        raise
+    except GeminiUnavailableError as e:
+        # Scheduler backpressure or an open circuit: tell the client to retry later
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 
-        # 🔍 Search in Milvus
-        raw_results = search_chunks(embedding)
-        if not raw_results:
-            raise HTTPException(status_code=404, detail="No results found.")
+@app.post("/semantic-search/stream")
+async def semantic_search_stream(req: QueryRequest, request: Request):
+    """
+    Server-Sent Events variant of /semantic-search:
+    `results` as soon as reranking is done, then `summary` events carrying
+    Markdown pieces as Gemini generates them, then `done` (or `error`).
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=500, detail="GEMINI_API_KEY not set in environment variables.")
 
-        #rerank_results_with_gemini
+    async def events():
         try:
-            reranked_results = rerank_results_with_model_parallel(req.query, raw_results, api_key, top_k=10)
+            raw_results, top_results = await retrieve(req.query, api_key, req.mode)
+            yield _sse("results", {"query": req.query, "results": top_results})
+
+            with span("summarize"):
+                async for text in summarize_stream(req.query, req.mode, raw_results, top_results, api_key):
+                    if await request.is_disconnected():
+                        # Client went away; stop pulling tokens so Gemini stops generating
+                        print(f"🔌 Client disconnected, abandoning summary for: {req.query}")
+                        return
+                    yield _sse("summary", {"text": text})
+            yield _sse("done", {})
+        except HTTPException as e:
+            yield _sse("error", {"status_code": e.status_code, "detail": e.detail})
+        except GeminiUnavailableError as e:
+            yield _sse("error", {"status_code": 503, "detail": str(e)})
         except Exception as e:
-            print(f"Error during reranking: {e}")
-            raise HTTPException(status_code=500, detail="Failed to rerank results with Gemini.")
-
-        # 📚 Group top results by file_id
-        top_results = group_by_file_id(reranked_results)
-        # 🧠 Summarize differently based on mode
-        if req.mode == "conceptual":
-            summary = summarize_results_with_model(req.query, top_results, api_key)
-        elif req.mode == "keyword":
-            summary = summarize_keyword_results_with_model(req.query, raw_results, api_key)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid search mode. Use 'conceptual' or 'keyword'.")
-
-        return {
-            "query": req.query,
-            "summary": summary,
-            "results": top_results
-        }
+            yield _sse("error", {"status_code": 500, "detail": str(e)})
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/embedding-cache/stats")
+def embedding_cache_stats():
+    cache = get_embedding_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.get("/response-cache/stats")
+def response_cache_stats():
+    cache = get_response_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.get("/local-index/stats")
+def local_index_stats():
+    from vectorstore.local_index import SEARCH_BACKEND, LOCAL_INDEX_SYNC, get_local_index
+    if SEARCH_BACKEND != "local" and not LOCAL_INDEX_SYNC:
+        return {"enabled": False}
+    return {"enabled": True, "search_backend": SEARCH_BACKEND, **get_local_index().stats()}
+
+
+@app.get("/lexical-index/stats")
+def lexical_index_stats():
+    from vectorstore import lexical_index
+    if not lexical_index.LEXICAL_INDEX_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **lexical_index.stats()}
+
+
+@app.get("/gemini-scheduler/stats")
+def gemini_scheduler_stats():
+    return get_scheduler().stats()
 
 
 @app.get("/evaluation-results")
@@ -104,84 +238,53 @@ async def get_evaluation_results():
         data = json.load(f)
     return data
 
-# Load ground truth at startup
-with open("ground_truth.json", "r", encoding="utf-8") as f:
-    GROUND_TRUTH = {item["query"]: item["relevant_file_ids"] for item in json.load(f)}
+class EvaluationRequest(BaseModel):
+    modes: List[Literal["conceptual", "keyword"]] = ["conceptual", "keyword"]
+    concurrency: int = EVAL_CONCURRENCY
+    include_summary: bool = False
 
-API_URL = "http://127.0.0.1:8000/semantic-search"  # Update if hosted remotely
 
 @app.get("/evaluate-ground-truth")
-def evaluate_ground_truth():
-    metrics = {
-        "conceptual": {"precision": [], "recall": [], "f1": []},
-        "keyword": {"precision": [], "recall": [], "f1": []}
-    }
-
-    detailed_results = []
-
-    for query, relevant_ids in GROUND_TRUTH.items():
-        result = {"query": query, "modes": {}}
-
-        for mode in ["conceptual", "keyword"]:
-            try:
-                response = requests.post(API_URL, json={"query": query, "mode": mode})
-                response.raise_for_status()
-                data = response.json()
-                predicted_ids = [r["file_id"] for r in data["results"]]
-
-                all_ids = list(set(relevant_ids + predicted_ids))
-                y_true = [1 if fid in relevant_ids else 0 for fid in all_ids]
-                y_pred = [1 if fid in predicted_ids else 0 for fid in all_ids]
-
-                precision = precision_score(y_true, y_pred, zero_division=0)
-                recall = recall_score(y_true, y_pred, zero_division=0)
-                f1 = f1_score(y_true, y_pred, zero_division=0)
-
-                metrics[mode]["precision"].append(precision)
-                metrics[mode]["recall"].append(recall)
-                metrics[mode]["f1"].append(f1)
-
-                result["modes"][mode] = {
-                    "precision": round(precision, 3),
-                    "recall": round(recall, 3),
-                    "f1_score": round(f1, 3),
-                    "predicted_file_ids": predicted_ids
-                }
-            except Exception as e:
-                result["modes"][mode] = {"error": str(e)}
-
-        detailed_results.append(result)
-
-    summary = {}
-    for mode in ["conceptual", "keyword"]:
-        try:
-            p_avg = sum(metrics[mode]["precision"]) / len(metrics[mode]["precision"])
-            r_avg = sum(metrics[mode]["recall"]) / len(metrics[mode]["recall"])
-            f_avg = sum(metrics[mode]["f1"]) / len(metrics[mode]["f1"])
-        except ZeroDivisionError:
-            p_avg = r_avg = f_avg = 0.0
+async def evaluate_ground_truth():
+    """
+    Run the ground-truth evaluation in-process and return the report (also
+    written to results.json). Long runs are better started with POST /evaluation-jobs.
+    """
+    try:
+        report = await evaluate()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    await asyncio.to_thread(write_results, report)
+    return report
+
+
+@app.post("/evaluation-jobs", status_code=202)
+async def start_evaluation_job(req: EvaluationRequest):
+    try:
+        return evaluation_jobs.start(tuple(req.modes), req.concurrency, req.include_summary)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
-        summary[mode] = {
-            "avg_precision": round(p_avg, 3),
-            "avg_recall": round(r_avg, 3),
-            "avg_f1_score": round(f_avg, 3),
-        }
 
-    return {
-        "summary": summary,
-        "details": detailed_results
-    }
+@app.get("/evaluation-jobs/{job_id}")
+async def get_evaluation_job(job_id: str):
+    job = evaluation_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown evaluation job")
+    return job
 
 
 
 @app.get("/list-drive-files/")
-def list_drive_files(folder_url: str):
+def list_drive_files(folder_url: str, refresh: bool = False):
     """
     Extract and return list of files (file_id + file_name) from a Google Drive folder.
+    Listings are cached (LISTING_CACHE_TTL) and shared with ingestion; ?refresh=true refetches.
     """
     try:
-        files = extract_file_ids_and_names(folder_url)
-        return JSONResponse(content={"count": len(files), "files": files})
+        from ingest.drive_listing import list_folder
+        listing = list_folder(folder_url, refresh=refresh)
+        return JSONResponse(content={"count": len(listing["files"]), **listing})
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
@@ -192,5 +295,49 @@ class EvalItem(BaseModel):
 
 class EvalBatchRequest(BaseModel):
     queries: List[EvalItem]
+    mode: Literal["conceptual", "keyword"] = "conceptual"
+    include_summary: bool = True
+
+
+@app.post("/semantic-search/batch")
+async def semantic_search_batch(req: EvalBatchRequest, request: Request):
+    """
+    Many queries in one call, streamed as Server-Sent Events: one `result`
+    event per query ({"index", "query", "summary", "results"} or {"index",
+    "query", "error"}) in completion order, then `done`. Queries are embedded
+    and searched together and share one rerank concurrency budget; set
+    include_summary=false to skip the per-query summaries.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=500, detail="GEMINI_API_KEY not set in environment variables.")
+    queries = [item.query for item in req.queries]
+    if not queries:
+        raise HTTPException(status_code=400, detail="No queries given.")
+    if len(queries) > BATCH_SEARCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_SEARCH_MAX_QUERIES} queries per batch.")
+
+    async def events():
+        errors = 0
+        try:
+            # aclosing cancels the outstanding queries as soon as we stop reading
+            async with aclosing(search_many(queries, req.mode, api_key, req.include_summary)) as responses:
+                async for index, response in responses:
+                    if await request.is_disconnected():
+                        print(f"🔌 Client disconnected, abandoning batch of {len(queries)} queries")
+                        return
+                    errors += "error" in response
+                    yield _sse("result", {"index": index, **response})
+            yield _sse("done", {"queries": len(queries), "errors": errors})
+        except GeminiUnavailableError as e:
+            yield _sse("error", {"status_code": 503, "detail": str(e)})
+        except Exception as e:
+            yield _sse("error", {"status_code": 500, "detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
@@ -0,0 +1,229 @@
+"""
+Ground-truth evaluation of the search pipeline, run in-process.
+
+Every (query, mode) pair goes through run_semantic_search directly, with at
+most EVAL_CONCURRENCY pairs in flight. Precision, recall and F1 are computed
+on the predicted and relevant file-id sets. Each pipeline stage gets p50,
+p95 and p99 latency. The report is written to results.json atomically.
+
+    python -m utils.evaluation [--concurrency 8] [--modes conceptual,keyword] [--with-summary]
+
+The API runs the same engine as a background job (POST /evaluation-jobs).
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from fastapi import HTTPException
+
+from utils.search_pipeline import run_semantic_search
+
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "4"))
+EVAL_GROUND_TRUTH = os.getenv("EVAL_GROUND_TRUTH", "ground_truth.json")
+EVAL_RESULTS_PATH = os.getenv("EVAL_RESULTS_PATH", "results.json")
+EVAL_MODES = ("conceptual", "keyword")
+# Finished jobs kept in memory for GET /evaluation-jobs/{id}
+EVAL_JOBS_KEPT = 20
+
+
+def load_ground_truth(path: str = EVAL_GROUND_TRUTH) -> dict[str, list[str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return {item["query"]: item["relevant_file_ids"] for item in json.load(f)}
+
+
+def _file(file_id: str) -> str:
+    # Single-PDF ingestion stores "<drive id>.pdf"; ground truth uses bare Drive ids
+    return file_id[:-4] if file_id.endswith(".pdf") else file_id
+
+
+def set_metrics(relevant, predicted) -> tuple[float, float, float]:
+    """Precision, recall and F1 of a predicted id set against the relevant set (0 when undefined)."""
+    relevant, predicted = set(relevant), set(predicted)
+    hits = len(relevant & predicted)
+    precision = hits / len(predicted) if predicted else 0.0
+    recall = hits / len(relevant) if relevant else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000, 1)
+
+    return {"count": len(ordered), "p50_ms": pick(50), "p95_ms": pick(95), "p99_ms": pick(99),
+            "max_ms": round(ordered[-1] * 1000, 1)}
+
+
+def write_results(report: dict, path: str = EVAL_RESULTS_PATH):
+    """Write via a temp file and rename so readers never see a partial results.json."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    os.replace(tmp, path)
+
+
+async def _evaluate_one(query: str, mode: str, relevant: list[str], api_key: str,
+                        include_summary: bool, semaphore: asyncio.Semaphore) -> dict:
+    timings = {}
+    async with semaphore:
+        try:
+            data = await run_semantic_search(query, mode, api_key, timings=timings,
+                                             include_summary=include_summary)
+        except HTTPException as e:
+            return {"error": f"{e.status_code}: {e.detail}", "timings": timings}
+        except Exception as e:
+            return {"error": str(e), "timings": timings}
+
+    predicted_ids = [r["file_id"] for r in data["results"]]
+    precision, recall, f1 = set_metrics({_file(f) for f in relevant}, {_file(f) for f in predicted_ids})
+    return {
+        "precision": round(precision, 3),
+        "recall": round(recall, 3),
+        "f1_score": round(f1, 3),
+        "predicted_file_ids": predicted_ids,
+        "timings": timings,
+    }
+
+
+async def evaluate(ground_truth: dict[str, list[str]] | None = None, modes=EVAL_MODES,
+                   concurrency: int = EVAL_CONCURRENCY, include_summary: bool = False,
+                   progress=None) -> dict:
+    """
+    Run every query in every mode and return the results.json report.
+    `progress(done, total)` is called as pairs finish.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not set in environment variables.")
+    ground_truth = load_ground_truth() if ground_truth is None else ground_truth
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    pairs = [(query, mode) for query in ground_truth for mode in modes]
+    total = len(pairs)
+    done = 0
+    start = time.perf_counter()
+
+    async def run(query, mode):
+        nonlocal done
+        outcome = await _evaluate_one(query, mode, ground_truth[query], api_key, include_summary, semaphore)
+        done += 1
+        if progress:
+            progress(done, total)
+        return outcome
+
+    outcomes = await asyncio.gather(*(run(query, mode) for query, mode in pairs))
+
+    details = {query: {"query": query, "modes": {}} for query in ground_truth}
+    stage_times = {mode: {} for mode in modes}
+    for (query, mode), outcome in zip(pairs, outcomes):
+        for name, seconds in outcome.pop("timings").items():
+            stage_times[mode].setdefault(name, []).append(seconds)
+        details[query]["modes"][mode] = outcome
+
+    summary = {}
+    for mode in modes:
+        scored = [details[q]["modes"][mode] for q in ground_truth if "error" not in details[q]["modes"][mode]]
+        n = len(scored)
+        summary[mode] = {
+            "avg_precision": round(sum(r["precision"] for r in scored) / n, 3) if n else 0.0,
+            "avg_recall": round(sum(r["recall"] for r in scored) / n, 3) if n else 0.0,
+            "avg_f1_score": round(sum(r["f1_score"] for r in scored) / n, 3) if n else 0.0,
+            "errors": len(ground_truth) - n,
+        }
+
+    return {
+        "summary": summary,
+        "latency": {mode: {name: percentiles(values) for name, values in stages.items()}
+                    for mode, stages in stage_times.items()},
+        "run": {
+            "queries": len(ground_truth),
+            "modes": list(modes),
+            "concurrency": concurrency,
+            "include_summary": include_summary,
+            "wall_seconds": round(time.perf_counter() - start, 2),
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "details": list(details.values()),
+    }
+
+
+class EvaluationJobs:
+    """Evaluation runs started from the API, tracked in memory on the event loop."""
+
+    def __init__(self):
+        self._jobs: dict[str, dict] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def start(self, modes=EVAL_MODES, concurrency: int = EVAL_CONCURRENCY, include_summary: bool = False,
+              results_path: str = EVAL_RESULTS_PATH) -> dict:
+        if any(job["status"] == "running" for job in self._jobs.values()):
+            raise RuntimeError("An evaluation is already running")
+        job_id = uuid.uuid4().hex[:12]
+        job = {"id": job_id, "status": "running", "done": 0, "total": None,
+               "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "summary": None, "error": None}
+        self._jobs[job_id] = job
+
+        def progress(done, total):
+            job["done"], job["total"] = done, total
+
+        async def run():
+            try:
+                report = await evaluate(modes=modes, concurrency=concurrency,
+                                        include_summary=include_summary, progress=progress)
+                write_results(report, results_path)
+                job.update(status="finished", summary=report["summary"], latency=report["latency"],
+                           wall_seconds=report["run"]["wall_seconds"])
+            except Exception as e:
+                job.update(status="failed", error=str(e))
+            finally:
+                self._tasks.pop(job_id, None)
+                self._prune()
+
+        self._tasks[job_id] = asyncio.create_task(run())
+        return job
+
+    def get(self, job_id: str) -> dict | None:
+        return self._jobs.get(job_id)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] != "running"]
+        for job_id in finished[:-EVAL_JOBS_KEPT]:
+            del self._jobs[job_id]
+
+
+evaluation_jobs = EvaluationJobs()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate search quality and latency against ground truth.")
+    parser.add_argument("--ground-truth", default=EVAL_GROUND_TRUTH)
+    parser.add_argument("--modes", default=",".join(EVAL_MODES))
+    parser.add_argument("--concurrency", type=int, default=EVAL_CONCURRENCY)
+    parser.add_argument("--with-summary", action="store_true", help="also run (and time) the summary call")
+    parser.add_argument("--out", default=EVAL_RESULTS_PATH)
+    args = parser.parse_args()
+
+    def progress(done, total):
+        print(f"\r⏳ {done}/{total}", end="", flush=True)
+
+    report = asyncio.run(evaluate(load_ground_truth(args.ground_truth), tuple(args.modes.split(",")),
+                                  args.concurrency, args.with_summary, progress))
+    print()
+    write_results(report, args.out)
+    for mode, scores in report["summary"].items():
+        print(f"📈 {mode}: P={scores['avg_precision']} R={scores['avg_recall']} "
+              f"F1={scores['avg_f1_score']} errors={scores['errors']}")
+        for name, stats in report["latency"][mode].items():
+            if stats["count"]:
+                print(f"   {name:<10} p50 {stats['p50_ms']}ms  p95 {stats['p95_ms']}ms  p99 {stats['p99_ms']}ms")
+    print(f"💾 Wrote {args.out} in {report['run']['wall_seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
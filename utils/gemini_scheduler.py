@@ -0,0 +1,443 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from utils.instrumentation import GEMINI_CALLS, GEMINI_CALL_SECONDS, GEMINI_TOKENS
+
+# Priority classes; lower value is served first
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# Conservative defaults; override per model with GEMINI_RATE_LIMITS='{"gemini-1.5-pro": {"rpm": 360, "tpm": 4000000}}'
+DEFAULT_RATE_LIMITS = {
+    "models/embedding-001": {"rpm": 1500, "tpm": 5_000_000},
+    "gemini-1.5-pro": {"rpm": 360, "tpm": 4_000_000},
+}
+FALLBACK_RATE_LIMIT = {"rpm": 60, "tpm": 1_000_000}
+
+GEMINI_QUEUE_SIZE = int(os.getenv("GEMINI_QUEUE_SIZE", "256"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "1.0"))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "30"))
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "8"))
+GEMINI_BREAKER_COOLDOWN = float(os.getenv("GEMINI_BREAKER_COOLDOWN", "30"))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+_WAIT_SAMPLES = 1000
+
+
+class GeminiUnavailableError(Exception):
+    """The scheduler refused the call; surfaced to clients as 503."""
+
+
+class SchedulerBusyError(GeminiUnavailableError):
+    pass
+
+
+class CircuitOpenError(GeminiUnavailableError):
+    pass
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Rate limits and server-side errors are worth retrying; bad requests are not."""
+    code = getattr(exc, "code", None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            code = None
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, (TimeoutError, ConnectionError))
+
+
+def estimate_tokens(content) -> int:
+    # ~4 characters per token is close enough for budgeting
+    if isinstance(content, str):
+        return max(1, len(content) // 4)
+    if isinstance(content, (list, tuple)):
+        return max(1, sum(len(c) for c in content if isinstance(c, str)) // 4)
+    return 1
+
+
+def _record_call(model: str, priority: int, outcome: str, seconds: float | None = None,
+                 tokens: int = 0, result=None):
+    GEMINI_CALLS.inc(model=model, priority=PRIORITY_NAMES.get(priority, priority), outcome=outcome)
+    if seconds is not None:
+        GEMINI_CALL_SECONDS.observe(seconds, model=model)
+    if outcome != "ok":
+        return
+    # Generation responses report usage; embeddings and streams (until consumed) do not
+    usage = getattr(result, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    if prompt_tokens:
+        GEMINI_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+        GEMINI_TOKENS.inc(getattr(usage, "candidates_token_count", 0) or 0, model=model, kind="completion")
+    else:
+        GEMINI_TOKENS.inc(tokens, model=model, kind="prompt_estimated")
+
+
+def _load_rate_limits() -> dict:
+    limits = {model: dict(limit) for model, limit in DEFAULT_RATE_LIMITS.items()}
+    raw = os.getenv("GEMINI_RATE_LIMITS")
+    if raw:
+        for model, limit in json.loads(raw).items():
+            limits.setdefault(model, dict(FALLBACK_RATE_LIMIT)).update(limit)
+    return limits
+
+
+class _TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)  # an oversized request must not wait forever
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "enqueued", "event", "loop", "future", "cancelled")
+
+    def __init__(self, priority: int, tokens: int, loop=None):
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.cancelled = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def grant(self):
+        if self.future is not None:
+            self.loop.call_soon_threadsafe(self._resolve)
+        else:
+            self.event.set()
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class _ModelState:
+    def __init__(self, model: str, rpm: float, tpm: float):
+        self.model = model
+        self.requests = _TokenBucket(rpm)
+        self.tokens = _TokenBucket(tpm)
+        self.queues = {INTERACTIVE: deque(), BATCH: deque()}
+
+        # circuit breaker
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+
+        # stats
+        self.granted = {p: 0 for p in self.queues}
+        self.rejected = {p: 0 for p in self.queues}
+        self.waits = {p: deque(maxlen=_WAIT_SAMPLES) for p in self.queues}
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.tokens_used = 0
+
+    def queue_full(self, priority: int, limit: int) -> bool:
+        return len(self.queues[priority]) >= limit
+
+    def dispatch(self, now: float) -> float | None:
+        """Grant waiters in priority order while the buckets allow; return seconds until the next grant."""
+        while True:
+            waiter = None
+            for priority in (INTERACTIVE, BATCH):
+                queue = self.queues[priority]
+                while queue and queue[0].cancelled:
+                    queue.popleft()
+                if queue:
+                    waiter = queue[0]
+                    break
+            if waiter is None:
+                return None
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(waiter.tokens, now))
+            if wait > 0:
+                return wait
+            self.queues[waiter.priority].popleft()
+            self.requests.take(1)
+            self.tokens.take(waiter.tokens)
+            self.tokens_used += waiter.tokens
+            self.granted[waiter.priority] += 1
+            self.waits[waiter.priority].append(now - waiter.enqueued)
+            waiter.grant()
+
+    def breaker_state(self, now: float) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if now - self.opened_at >= GEMINI_BREAKER_COOLDOWN:
+            return "half_open"
+        return "open"
+
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class GeminiScheduler:
+    """
+    Single gate for every Gemini call in the process.
+
+    Callers wait in a bounded per-model queue until both the requests-per-minute
+    and tokens-per-minute buckets allow the call. Interactive work is always
+    granted before batch work. Full queues push back: interactive callers get
+    SchedulerBusyError right away, batch callers block until there is room.
+    Retryable failures are retried with full-jitter backoff, and a run of them
+    opens a per-model circuit breaker that fails fast until a cooldown passes.
+    """
+
+    def __init__(self, rate_limits: dict | None = None, queue_size: int = GEMINI_QUEUE_SIZE):
+        self.rate_limits = rate_limits or _load_rate_limits()
+        self.queue_size = queue_size
+        self._models: dict[str, _ModelState] = {}
+        self._cond = threading.Condition()
+        self._dispatcher = None
+
+    def _state(self, model: str) -> _ModelState:
+        # Under the lock: the dispatcher iterates the models while a new one may be added
+        with self._cond:
+            state = self._models.get(model)
+            if state is None:
+                limit = self.rate_limits.get(model, FALLBACK_RATE_LIMIT)
+                state = self._models[model] = _ModelState(model, limit["rpm"], limit["tpm"])
+            return state
+
+    def _ensure_dispatcher(self):
+        # Waiters block without a timeout, so a dispatcher that died must be replaced
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="gemini-scheduler", daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch_loop(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                waits = [w for w in (s.dispatch(now) for s in list(self._models.values())) if w is not None]
+                # Granting frees queue slots for blocked batch callers
+                self._cond.notify_all()
+                self._cond.wait(timeout=min(waits) if waits else None)
+
+    # -- circuit breaker -------------------------------------------------------------
+
+    def _check_breaker(self, state: _ModelState) -> bool:
+        """Raise CircuitOpenError unless the call may go ahead; True when it is the half-open probe."""
+        with self._cond:
+            status = state.breaker_state(time.monotonic())
+            if status == "open":
+                raise CircuitOpenError(f"Gemini circuit open for {state.model}")
+            if status == "half_open":
+                if state.probe_in_flight:
+                    raise CircuitOpenError(f"Gemini circuit half-open for {state.model}; probe in flight")
+                state.probe_in_flight = True
+                return True
+            return False
+
+    def _release_probe(self, state: _ModelState):
+        # The probe never reached the model (queue full, cancelled): let the next call probe instead
+        with self._cond:
+            state.probe_in_flight = False
+
+    def _record_result(self, state: _ModelState, ok: bool, retryable: bool = False):
+        with self._cond:
+            state.calls += 1
+            state.probe_in_flight = False
+            if ok:
+                state.consecutive_failures = 0
+                state.opened_at = None
+                return
+            state.failures += 1
+            if retryable:
+                state.consecutive_failures += 1
+                if state.consecutive_failures >= GEMINI_BREAKER_THRESHOLD or state.opened_at is not None:
+                    state.opened_at = time.monotonic()
+
+    # -- permits ---------------------------------------------------------------------
+
+    def acquire(self, model: str, priority: int = INTERACTIVE, tokens: int = 1):
+        state = self._state(model)
+        waiter = _Waiter(priority, tokens)
+        with self._cond:
+            self._ensure_dispatcher()
+            while state.queue_full(priority, self.queue_size):
+                if priority == INTERACTIVE:
+                    state.rejected[priority] += 1
+                    raise SchedulerBusyError(f"Gemini queue for {model} is full")
+                self._cond.wait()
+            waiter.enqueued = time.monotonic()
+            state.queues[priority].append(waiter)
+            self._cond.notify_all()
+        waiter.event.wait()
+
+    async def acquire_async(self, model: str, priority: int = INTERACTIVE, tokens: int = 1):
+        state = self._state(model)
+        waiter = _Waiter(priority, tokens, loop=asyncio.get_running_loop())
+        while True:
+            with self._cond:
+                self._ensure_dispatcher()
+                if not state.queue_full(priority, self.queue_size):
+                    waiter.enqueued = time.monotonic()
+                    state.queues[priority].append(waiter)
+                    self._cond.notify_all()
+                    break
+                if priority == INTERACTIVE:
+                    state.rejected[priority] += 1
+                    raise SchedulerBusyError(f"Gemini queue for {model} is full")
+            await asyncio.sleep(0.05)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            waiter.cancelled = True
+            raise
+
+    # -- calls -----------------------------------------------------------------------
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps retries from many callers from lining up
+        return random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * (2 ** attempt)))
+
+    def _admit(self, state: _ModelState, model: str, priority: int) -> bool:
+        try:
+            return self._check_breaker(state)
+        except GeminiUnavailableError:
+            _record_call(model, priority, "rejected")
+            raise
+
+    def _not_sent(self, state: _ModelState, model: str, priority: int, probe: bool, error: BaseException):
+        """Bookkeeping for a call that failed or was cancelled while waiting for its permit."""
+        if probe:
+            self._release_probe(state)
+        if isinstance(error, GeminiUnavailableError):
+            _record_call(model, priority, "rejected")
+
+    def call(self, model: str, fn, priority: int = INTERACTIVE, tokens: int = 1,
+             max_retries: int = GEMINI_MAX_RETRIES):
+        """Run fn() under the model's rate limits, retrying 429/5xx with jittered backoff."""
+        state = self._state(model)
+        for attempt in range(max_retries + 1):
+            probe = self._admit(state, model, priority)
+            try:
+                self.acquire(model, priority, tokens)
+            except BaseException as e:
+                self._not_sent(state, model, priority, probe, e)
+                raise
+            start = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                retryable = is_retryable(e)
+                self._record_result(state, ok=False, retryable=retryable)
+                if not retryable or attempt == max_retries:
+                    _record_call(model, priority, "error", time.perf_counter() - start)
+                    raise
+                _record_call(model, priority, "retry", time.perf_counter() - start)
+                delay = self._backoff(attempt)
+                state.retries += 1
+                print(f"⏳ Gemini {model} call failed ({e}); retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            except BaseException:
+                if probe:
+                    self._release_probe(state)
+                raise
+            self._record_result(state, ok=True)
+            _record_call(model, priority, "ok", time.perf_counter() - start, tokens, result)
+            return result
+
+    async def call_async(self, model: str, coro_fn, priority: int = INTERACTIVE, tokens: int = 1,
+                         max_retries: int = GEMINI_MAX_RETRIES):
+        """asyncio counterpart of call(); coro_fn() must return a fresh awaitable each attempt."""
+        state = self._state(model)
+        for attempt in range(max_retries + 1):
+            probe = self._admit(state, model, priority)
+            try:
+                await self.acquire_async(model, priority, tokens)
+            except BaseException as e:
+                self._not_sent(state, model, priority, probe, e)
+                raise
+            start = time.perf_counter()
+            try:
+                result = await coro_fn()
+            except asyncio.CancelledError:
+                # Not the model's fault, and not a success either: only free the probe slot
+                if probe:
+                    self._release_probe(state)
+                raise
+            except Exception as e:
+                retryable = is_retryable(e)
+                self._record_result(state, ok=False, retryable=retryable)
+                if not retryable or attempt == max_retries:
+                    _record_call(model, priority, "error", time.perf_counter() - start)
+                    raise
+                _record_call(model, priority, "retry", time.perf_counter() - start)
+                delay = self._backoff(attempt)
+                state.retries += 1
+                print(f"⏳ Gemini {model} call failed ({e}); retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            self._record_result(state, ok=True)
+            _record_call(model, priority, "ok", time.perf_counter() - start, tokens, result)
+            return result
+
+    # -- reporting -------------------------------------------------------------------
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            report = {}
+            for model, state in self._models.items():
+                report[model] = {
+                    "breaker": state.breaker_state(now),
+                    "calls": state.calls,
+                    "failures": state.failures,
+                    "retries": state.retries,
+                    "tokens_granted": state.tokens_used,
+                    "rate_limit": self.rate_limits.get(model, FALLBACK_RATE_LIMIT),
+                    "priorities": {
+                        PRIORITY_NAMES[p]: {
+                            "queued": sum(1 for w in state.queues[p] if not w.cancelled),
+                            "granted": state.granted[p],
+                            "rejected": state.rejected[p],
+                            "wait_p50_ms": round(_percentile(state.waits[p], 0.50) * 1000, 2),
+                            "wait_p95_ms": round(_percentile(state.waits[p], 0.95) * 1000, 2),
+                            "wait_max_ms": round(max(state.waits[p], default=0.0) * 1000, 2),
+                        }
+                        for p in state.queues
+                    },
+                }
+            return report
+
+
+_scheduler: GeminiScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> GeminiScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = GeminiScheduler()
+    return _scheduler
@@ -1,29 +1,114 @@
-import google.generativeai as genai
-import os
+import asyncio
 from dotenv import load_dotenv
+from embedding.cache import get_embedding_cache
+from utils.gemini_scheduler import get_scheduler, INTERACTIVE, estimate_tokens
+from utils.resources import get_genai
 load_dotenv()
 
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("GEMINI_API_KEY not found in environment.")
+EMBEDDING_MODEL = "models/embedding-001"
+TASK_TYPE = "retrieval_query"
 
 def get_query_embedding(query: str) -> list:
 
     """
     Generate an embedding for a given query using Google Gemini API.
+    Repeated queries are served from the shared embedding cache; new ones go
+    through the Gemini scheduler at interactive priority.
     Args:
         query (str): The query string to be embedded.
     Returns:
         list: The embedding vector for the query.
     """
-    
-    genai.configure(api_key=api_key)
 
+    cache = get_embedding_cache()
+    if cache:
+        cached = cache.get(query, EMBEDDING_MODEL, TASK_TYPE)
+        if cached is not None:
+            return cached
 
+    genai = get_genai()
+    response = get_scheduler().call(
+        EMBEDDING_MODEL,
+        lambda: genai.embed_content(
+            model=EMBEDDING_MODEL,
+            content=query,
+            task_type=TASK_TYPE
+        ),
+        priority=INTERACTIVE,
+        tokens=estimate_tokens(query),
+    )
+    embedding = response['embedding']
+    if cache:
+        cache.put(query, embedding, EMBEDDING_MODEL, TASK_TYPE)
+    return embedding
+
+
+async def get_query_embedding_async(query: str) -> list:
+    """Non-blocking variant of get_query_embedding for the async request path."""
+    # The cache is SQLite on disk; its reads and writes run off the event loop
+    cache = get_embedding_cache()
+    if cache:
+        cached = await asyncio.to_thread(cache.get, query, EMBEDDING_MODEL, TASK_TYPE)
+        if cached is not None:
+            return cached
 
-    response = genai.embed_content(
-        model="models/embedding-001",
-        content=query,
-        task_type="retrieval_query"
+    genai = get_genai()
+    response = await get_scheduler().call_async(
+        EMBEDDING_MODEL,
+        lambda: genai.embed_content_async(
+            model=EMBEDDING_MODEL,
+            content=query,
+            task_type=TASK_TYPE
+        ),
+        priority=INTERACTIVE,
+        tokens=estimate_tokens(query),
     )
-    return response['embedding']
+    embedding = response['embedding']
+    if cache:
+        await asyncio.to_thread(cache.put, query, embedding, EMBEDDING_MODEL, TASK_TYPE)
+    return embedding
+
+
+# Gemini accepts up to 100 texts per batch embed request
+QUERY_BATCH_SIZE = 100
+
+
+async def get_query_embeddings_async(queries: list[str]) -> list[list | None]:
+    """
+    Embed many queries with one Gemini request per QUERY_BATCH_SIZE uncached
+    queries. Entries are None for queries whose batch failed; callers can fall
+    back to get_query_embedding_async for those.
+    """
+    cache = get_embedding_cache()
+    embeddings = (await asyncio.to_thread(cache.get_many, queries, EMBEDDING_MODEL, TASK_TYPE) if cache
+                  else [None] * len(queries))
+    missing = list(dict.fromkeys(q for q, e in zip(queries, embeddings) if e is None))
+    if not missing:
+        return embeddings
+
+    genai = get_genai()
+
+    async def embed_batch(batch: list[str]) -> list:
+        try:
+            response = await get_scheduler().call_async(
+                EMBEDDING_MODEL,
+                lambda: genai.embed_content_async(
+                    model=EMBEDDING_MODEL,
+                    content=batch,
+                    task_type=TASK_TYPE
+                ),
+                priority=INTERACTIVE,
+                tokens=estimate_tokens(batch),
+            )
+            return response['embedding']
+        except Exception as e:
+            print(f"⚠️ Batch query embedding of {len(batch)} queries failed: {e}")
+            return [None] * len(batch)
+
+    batches = [missing[i:i + QUERY_BATCH_SIZE] for i in range(0, len(missing), QUERY_BATCH_SIZE)]
+    vectors = [v for batch_vectors in await asyncio.gather(*(embed_batch(b) for b in batches))
+               for v in batch_vectors]
+    found = {query: vector for query, vector in zip(missing, vectors) if vector is not None}
+    if cache and found:
+        await asyncio.to_thread(cache.put_many, list(found), list(found.values()), EMBEDDING_MODEL, TASK_TYPE)
+    return [e if e is not None else found.get(q) for q, e in zip(queries, embeddings)]
@@ -1,6 +1,7 @@
 from collections import defaultdict
 
-def group_by_file_id(results: list, top_n=5):
+def group_by_file_id(results: list, top_n=5, higher_is_better=False):
+    # Vector search scores are distances (lower is better); BM25 scores are the opposite
     grouped = defaultdict(list)
     
     for result in results:
@@ -8,13 +9,14 @@ def group_by_file_id(results: list, top_n=5):
     
     ranked = sorted(
         grouped.items(),
-        key=lambda x: sum(r['score'] for r in x[1]) / len(x[1])  # avg distance
+        key=lambda x: sum(r['score'] for r in x[1]) / len(x[1]),  # avg distance
+        reverse=higher_is_better
     )
 
     return [
         {
             "file_id": file_id,
-            "top_chunks": sorted(chunks, key=lambda x: x['score'])[:2],
+            "top_chunks": sorted(chunks, key=lambda x: x['score'], reverse=higher_is_better)[:2],
             "avg_score": sum(c['score'] for c in chunks) / len(chunks)
         }
         for file_id, chunks in ranked[:top_n]
@@ -1,25 +1,110 @@
 import hashlib
 import os
-import json
+import sqlite3
+import threading
+import time
 
-HASH_DB = "processed_pdfs.json"
+HASH_DB = os.getenv("PROCESSED_DB", "processed_files.sqlite")
+HASH_BLOCK_SIZE = 1024 * 1024
 
-def sha256_checksum(file_path):
+_local = threading.local()
+
+
+def _db() -> sqlite3.Connection:
+    # One connection per thread; SQLite connections must not be shared across threads
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(HASH_DB, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS processed_files (
+                file_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL,
+                ingested_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_spans (
+                pdf_id TEXT PRIMARY KEY,
+                file_id TEXT NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                char_start INTEGER NOT NULL,
+                char_end INTEGER NOT NULL,
+                page_start INTEGER NOT NULL,
+                page_end INTEGER NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS chunk_spans_file_id ON chunk_spans(file_id)")
+        _local.conn = conn
+    return conn
+
+
+def sha256_checksum(file_path, block_size=HASH_BLOCK_SIZE):
+    # Stream the file so large PDFs are never held in memory
+    digest = hashlib.sha256()
     with open(file_path, "rb") as f:
-        return hashlib.sha256(f.read()).hexdigest()
-
-def is_already_processed(checksum):
-    if not os.path.exists(HASH_DB):
-        return False
-    with open(HASH_DB, "r") as f:
-        return checksum in json.load()
-
-def mark_as_processed(checksum):
-    if os.path.exists(HASH_DB):
-        with open(HASH_DB, "r") as f:
-            data = json.load(f)
-    else:
-        data = []
-    data.append(checksum)
-    with open(HASH_DB, "w") as f:
-        json.dump(data, f)
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def chunk_pdf_ids(file_id: str, checksum: str, count: int) -> list[str]:
+    """
+    Deterministic primary keys for a file version. The hash prefix lets the
+    rows of an older version be told apart from (and deleted after) the new ones.
+    """
+    return [f"{pdf_id_prefix(file_id, checksum)}{i:05d}" for i in range(count)]
+
+
+def pdf_id_prefix(file_id: str, checksum: str) -> str:
+    return f"{file_id}:{checksum[:12]}:"
+
+
+def get_processed(file_id: str) -> dict | None:
+    row = _db().execute(
+        "SELECT content_hash, chunk_count, ingested_at FROM processed_files WHERE file_id = ?",
+        (file_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    return {"file_id": file_id, "content_hash": row[0], "chunk_count": row[1], "ingested_at": row[2]}
+
+
+def is_already_processed(file_id: str, checksum: str) -> bool:
+    record = get_processed(file_id)
+    return record is not None and record["content_hash"] == checksum
+
+
+def mark_as_processed(file_id: str, checksum: str, chunk_count: int):
+    _db().execute(
+        "INSERT OR REPLACE INTO processed_files (file_id, content_hash, chunk_count, ingested_at) "
+        "VALUES (?, ?, ?, ?)",
+        (file_id, checksum, chunk_count, time.time()),
+    )
+
+
+def record_chunk_spans(file_id: str, pdf_ids: list[str], chunks: list[dict]):
+    """Replace the stored character/page spans of `file_id` with those of its current chunks."""
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM chunk_spans WHERE file_id = ?", (file_id,))
+        conn.executemany(
+            "INSERT INTO chunk_spans (pdf_id, file_id, chunk_index, char_start, char_end, page_start, page_end) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (pdf_id, file_id, int(pdf_id.rsplit(":", 1)[-1]),
+                 c["char_start"], c["char_end"], c["page_start"], c["page_end"])
+                for pdf_id, c in zip(pdf_ids, chunks)
+            ],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
@@ -0,0 +1,245 @@
+"""
+Timing spans, Prometheus metrics and structured logs for the hot paths.
+
+Search stages (embed, search, lexical, rerank, group, summarize, total) and
+ingestion steps (download, extract, chunk, embed, insert) are timed with
+`span()` into the `stage_seconds` histogram. The Gemini scheduler counts calls
+and tokens and Milvus counts rows and bytes. GET /metrics serves all of it in
+the Prometheus text format (written here, no client library needed).
+
+Each HTTP request gets an X-Request-ID and one JSON log line with its stage
+breakdown. Set LOG_SPANS=1 to also log every span.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+STRUCTURED_LOGS = os.getenv("STRUCTURED_LOGS", "1") == "1"
+LOG_SPANS = os.getenv("LOG_SPANS", "0") == "1"
+
+# Seconds; spans range from sub-millisecond local scoring to minute-long ingestion embeds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        METRICS.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            for key, value in items:
+                lines += self._render_value(key, value)
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_value(self, key, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def _render_value(self, key, state) -> list[str]:
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets, state["counts"]):
+            cumulative += n
+            bucket = _format_labels(self.labels, key, 'le="%s"' % bound)
+            lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+        bucket = _format_labels(self.labels, key, 'le="+Inf"')
+        lines.append(f"{self.name}_bucket{bucket} {state['count']}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {round(state['sum'], 6)}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {state['count']}")
+        return lines
+
+
+METRICS: list[_Metric] = []
+
+STAGE_SECONDS = Histogram("stage_seconds", "Wall time of a search stage or ingestion step",
+                          ("pipeline", "stage"))
+HTTP_REQUEST_SECONDS = Histogram("http_request_seconds", "HTTP request latency, until the body is sent",
+                                 ("method", "path", "status"))
+GEMINI_CALLS = Counter("gemini_calls_total", "Gemini API calls by outcome (ok, error, retry, rejected)",
+                       ("model", "priority", "outcome"))
+GEMINI_CALL_SECONDS = Histogram("gemini_call_seconds", "Latency of a single Gemini API attempt", ("model",))
+GEMINI_TOKENS = Counter("gemini_tokens_total",
+                        "Gemini tokens (usage metadata when returned, else the scheduler's estimate)",
+                        ("model", "kind"))
+MILVUS_ROWS = Counter("milvus_rows_total", "Rows inserted, deleted or returned by search", ("op",))
+RESPONSE_CACHE_LOOKUPS = Counter("response_cache_lookups_total",
+                                 "Search response cache lookups by outcome (hit, semantic, shared, miss)",
+                                 ("mode", "outcome"))
+MILVUS_BYTES = Counter("milvus_bytes_total", "Approximate payload bytes inserted or returned by search", ("op",))
+DOWNLOAD_BYTES = Counter("download_bytes_total", "Bytes of file bodies downloaded (rate() gives bytes/sec)")
+DOWNLOADS = Counter("downloads_total", "File downloads by outcome (ok, retry, not_pdf, error)", ("outcome",))
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# -- logging ---------------------------------------------------------------------------
+
+def log_event(event: str, **fields):
+    """One JSON line on stdout, tagged with the current request id."""
+    if not STRUCTURED_LOGS:
+        return
+    record = {"ts": round(time.time(), 3), "event": event}
+    request_id = _request_id.get()
+    if request_id:
+        record["request_id"] = request_id
+    record.update(fields)
+    print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+
+
+# -- spans -----------------------------------------------------------------------------
+
+def request_timings() -> dict | None:
+    """Stage seconds collected so far for the current HTTP request."""
+    return _request_timings.get()
+
+
+def observe_stage(pipeline: str, stage: str, seconds: float, timings: dict | None = None, **fields):
+    STAGE_SECONDS.observe(seconds, pipeline=pipeline, stage=stage)
+    if timings is None:
+        timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+    if LOG_SPANS:
+        log_event("span", pipeline=pipeline, stage=stage, ms=round(seconds * 1000, 2), **fields)
+
+
+@contextmanager
+def span(stage: str, timings: dict | None = None, pipeline: str = "search", **fields):
+    """
+    Time the block as `stage`. Seconds go to the stage_seconds histogram and
+    are added to `timings[stage]`, or to the current request's breakdown when
+    no dict is given.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(pipeline, stage, time.perf_counter() - start, timings, **fields)
+
+
+def timed_iter(iterable, timings: dict, name: str):
+    """Yield from `iterable`, adding the time spent producing items to timings[name]."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+            return
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+        yield item
+
+
+# -- HTTP ------------------------------------------------------------------------------
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: assigns the request id (or keeps the client's X-Request-ID),
+    collects the stage breakdown, records http_request_seconds and logs the request.
+    Timing ends with the last body chunk, so streamed responses count in full.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or os.urandom(8).hex()
+        id_token = _request_id.set(request_id)
+        timings = {}
+        timings_token = _request_timings.set(timings)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            seconds = time.perf_counter() - start
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(seconds, method=scope["method"], path=path, status=status)
+            if path != "/metrics":
+                log_event("http_request", method=scope["method"], path=path, status=status,
+                          ms=round(seconds * 1000, 2),
+                          stages={name: round(s * 1000, 2) for name, s in timings.items()})
+            _request_timings.reset(timings_token)
+            _request_id.reset(id_token)
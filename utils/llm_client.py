@@ -1,11 +1,49 @@
 # llm_client.py
-import google.generativeai as genai
+import os
+from utils.gemini_scheduler import get_scheduler, INTERACTIVE, estimate_tokens
+from utils.resources import get_genai, get_generative_model
 
 class TextGenerator:
-    def __init__(self, api_key: str, model: str = "gemini-1.5-pro"):
-        genai.configure(api_key=api_key)
-        self._model = genai.GenerativeModel(model)
+    # Every call goes through the shared Gemini scheduler for rate limits,
+    # priorities, retries and the circuit breaker
+    def __init__(self, api_key: str, model: str = "gemini-1.5-pro", priority: int = INTERACTIVE):
+        # The configured SDK and the model handle are process-wide singletons,
+        # so building a TextGenerator per request costs nothing
+        genai = get_genai()
+        if api_key and api_key != os.getenv("GEMINI_API_KEY"):
+            genai.configure(api_key=api_key)
+        self._model_name = model
+        self._model = get_generative_model(model)
+        self._priority = priority
 
-    def run(self, prompt: str) -> str:
-        result = self._model.generate_content(prompt)
+    def run(self, prompt: str, **kwargs) -> str:
+        # kwargs are passed through to generate_content (e.g. generation_config)
+        result = get_scheduler().call(
+            self._model_name,
+            lambda: self._model.generate_content(prompt, **kwargs),
+            priority=self._priority,
+            tokens=estimate_tokens(prompt),
+        )
         return result
+
+    async def run_async(self, prompt: str, **kwargs):
+        # Non-blocking variant for the asyncio request path
+        return await get_scheduler().call_async(
+            self._model_name,
+            lambda: self._model.generate_content_async(prompt, **kwargs),
+            priority=self._priority,
+            tokens=estimate_tokens(prompt),
+        )
+
+    async def stream_async(self, prompt: str, **kwargs):
+        """Yield text pieces as Gemini generates them."""
+        # Only opening the stream is scheduled and retried; a stream that breaks midway is not restarted
+        response = await self.run_async(prompt, stream=True, **kwargs)
+        async for chunk in response:
+            # Safety-blocked or empty candidates have no text part
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if text:
+                yield text
@@ -0,0 +1,120 @@
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+# Local cascade in front of the LLM reranker: lexical + cosine scoring, near-duplicate
+# suppression, then only the best CASCADE_TOP_N candidates are sent to Gemini
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "1") == "1"
+CASCADE_TOP_N = int(os.getenv("CASCADE_TOP_N", "10"))
+CASCADE_LEXICAL_WEIGHT = float(os.getenv("CASCADE_LEXICAL_WEIGHT", "0.3"))  # cosine gets 1 - this
+# Two candidates are near-duplicates if their embeddings or their word sets are this similar
+CASCADE_DUP_COSINE = float(os.getenv("CASCADE_DUP_COSINE", "0.98"))
+CASCADE_DUP_JACCARD = float(os.getenv("CASCADE_DUP_JACCARD", "0.8"))
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+
+def _tokens(text: str) -> list[str]:
+    return [token.lower() for token in _TOKEN.findall(text)]
+
+
+def lexical_scores(query: str, texts: list[str]) -> np.ndarray:
+    """
+    BM25 of each text for the query terms, with document frequencies taken
+    over the candidate set itself, scaled to 0..1.
+    """
+    terms = list(dict.fromkeys(_tokens(query)))
+    if not terms or not texts:
+        return np.zeros(len(texts), dtype=np.float32)
+    column = {term: j for j, term in enumerate(terms)}
+    tf = np.zeros((len(texts), len(terms)), dtype=np.float32)
+    lengths = np.empty(len(texts), dtype=np.float32)
+    for i, text in enumerate(texts):
+        tokens = _tokens(text)
+        lengths[i] = len(tokens)
+        for token, n in Counter(tokens).items():
+            j = column.get(token)
+            if j is not None:
+                tf[i, j] = n
+
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((len(texts) - df + 0.5) / (df + 0.5))
+    norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * lengths / max(lengths.mean(), 1.0))
+    scores = (idf * tf * (_BM25_K1 + 1) / (tf + norm[:, None])).sum(axis=1)
+    top = scores.max()
+    return scores / top if top > 0 else scores
+
+
+def cosine_scores(query_embedding, embeddings: np.ndarray) -> np.ndarray:
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1) * (np.linalg.norm(query) or 1.0)
+    return embeddings @ query / np.where(norms > 0, norms, 1.0)
+
+
+def _unit_rows(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms > 0, norms, 1.0)
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def cascade(query: str, query_embedding, results: list[dict], top_n: int = CASCADE_TOP_N,
+            lexical_weight: float = CASCADE_LEXICAL_WEIGHT, trace: dict | None = None) -> list[dict]:
+    """
+    Order vector-search candidates by a blend of BM25 (over the candidate set)
+    and exact cosine similarity on their stored embeddings, drop near-duplicates,
+    and return the best `top_n` for the LLM reranker.
+
+    Candidates carry their embedding under "embedding" (see search_chunks with
+    with_embeddings=True); it is removed from the returned dicts. Candidates
+    without one get the median cosine so lexical-only hits are not sunk.
+    If `trace` is given, the pdf_id order after each stage is recorded in it.
+    """
+    if not results:
+        return []
+    texts = [r.get("chunk", "") for r in results]
+    lexical = lexical_scores(query, texts)
+
+    have = [i for i, r in enumerate(results) if r.get("embedding") is not None]
+    embeddings = np.zeros((len(results), len(query_embedding)), dtype=np.float32)
+    if have:
+        embeddings[have] = np.asarray([results[i]["embedding"] for i in have], dtype=np.float32)
+    cosine = cosine_scores(query_embedding, embeddings)
+    if len(have) < len(results):
+        missing = np.setdiff1d(np.arange(len(results)), have)
+        cosine[missing] = np.median(cosine[have]) if have else 0.0
+
+    combined = (1 - lexical_weight) * cosine + lexical_weight * lexical
+    order = np.argsort(-combined, kind="stable")
+
+    unit = _unit_rows(embeddings)
+    has_embedding = set(have)
+    words = [set(_tokens(text)) for text in texts]
+    kept: list[int] = []
+    for i in order:
+        duplicate = any(
+            (i in has_embedding and j in has_embedding and float(unit[i] @ unit[j]) >= CASCADE_DUP_COSINE)
+            or _jaccard(words[i], words[j]) >= CASCADE_DUP_JACCARD
+            for j in kept
+        )
+        if not duplicate:
+            kept.append(int(i))
+
+    if trace is not None:
+        trace["retrieved"] = [r["pdf_id"] for r in results]
+        trace["scored"] = [results[i]["pdf_id"] for i in order]
+        trace["deduplicated"] = [results[i]["pdf_id"] for i in kept]
+        trace["selected"] = trace["deduplicated"][:top_n]
+
+    selected = []
+    for i in kept[:top_n]:
+        candidate = {k: v for k, v in results[i].items() if k != "embedding"}
+        candidate["cascade_score"] = round(float(combined[i]), 4)
+        selected.append(candidate)
+    return selected
@@ -1,13 +1,141 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Iterator
+
 import pymupdf
 
-def extract_text_from_pdf(path):
-    try:
-        doc = pymupdf.open(path)
-        text = ""
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Documents shorter than this are parsed in-process; the pool only pays off for long ones
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_PAGES_PER_RANGE = int(os.getenv("PDF_PAGES_PER_RANGE", "32"))
+
+
+def open_pdf(source) -> pymupdf.Document:
+    """Open a PDF from a path or straight from in-memory bytes (no temp file)."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return pymupdf.open(stream=bytes(source), filetype="pdf")
+    return pymupdf.open(source)
+
+
+def iter_pdf_pages(source) -> Iterator[str]:
+    """Yield the text of each page in order."""
+    with open_pdf(source) as doc:
         for page in doc:
-            text += page.get_text()
-        doc.close()
-        return text
+            yield page.get_text()
+
+
+# One pool per process, started on first use: spawning interpreters per document cost more than it saved
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+# Worker side: the document this process opened last, reused by the next range of the same document
+_worker_doc: tuple | None = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def close_pdf_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _open_shared(key: tuple) -> pymupdf.Document:
+    # key is ("path", path, mtime_ns) or ("shm", name, size)
+    if key[0] == "path":
+        return pymupdf.open(key[1])
+    shm = shared_memory.SharedMemory(name=key[1])
+    try:
+        return pymupdf.open(stream=bytes(shm.buf[:key[2]]), filetype="pdf")
+    finally:
+        shm.close()
+
+
+def _extract_page_range(key: tuple, start: int, stop: int) -> list[str]:
+    # Runs in a worker process; tasks carry a path or a shared-memory name, never the PDF bytes
+    global _worker_doc
+    if _worker_doc is None or _worker_doc[0] != key:
+        if _worker_doc is not None:
+            _worker_doc[1].close()
+            _worker_doc = None
+        _worker_doc = (key, _open_shared(key))
+    doc = _worker_doc[1]
+    return [doc[i].get_text() for i in range(start, stop)]
+
+
+def iter_pdf_pages_parallel(source, workers: int = PDF_WORKERS,
+                            pages_per_range: int = PDF_PAGES_PER_RANGE) -> Iterator[str]:
+    """
+    Yield page texts in order while page ranges are parsed across a process pool.
+
+    The pool (PDF_WORKERS processes) is shared by every call; `workers` only
+    bounds how many ranges one call keeps in flight, and 1 parses in-process. A path is handed to the workers as is;
+    bytes are copied once into shared memory. Ranges are submitted a few at a
+    time so memory stays bounded, and pages are yielded as soon as the next
+    range in order is done, so a consumer (the chunker) works on early pages
+    while later ones are still being parsed.
+    """
+    with open_pdf(source) as doc:
+        page_count = doc.page_count
+    if workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        yield from iter_pdf_pages(source)
+        return
+
+    shm = None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        data = memoryview(source).cast("B")
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        shm.buf[:len(data)] = data
+        key = ("shm", shm.name, len(data))
+    else:
+        key = ("path", os.fspath(source), os.stat(source).st_mtime_ns)
+
+    ranges = [(start, min(start + pages_per_range, page_count)) for start in range(0, page_count, pages_per_range)]
+    max_in_flight = min(workers, PDF_WORKERS) * 2
+    pool = _get_pool()
+    pending = []
+    try:
+        next_range = 0
+        while next_range < len(ranges) or pending:
+            while next_range < len(ranges) and len(pending) < max_in_flight:
+                start, stop = ranges[next_range]
+                pending.append(pool.submit(_extract_page_range, key, start, stop))
+                next_range += 1
+            yield from pending.pop(0).result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if shm is not None:
+            # Workers copy the bytes when they open the document, so it can go once no range is queued
+            for future in pending:
+                if not future.cancelled():
+                    try:
+                        future.result()
+                    except Exception:
+                        pass
+            shm.close()
+            shm.unlink()
+
+
+def extract_pages_from_pdf(path) -> list[str]:
+    """Text of each page, in order; an empty list if the PDF can't be read."""
+    try:
+        return list(iter_pdf_pages(path))
     except Exception as e:
-        print(f"Error extracting text from {path}: {e}")
-        return ""
+        print(f"Error extracting text from {path if isinstance(path, str) else '<bytes>'}: {e}")
+        return []
+
+
+def extract_text_from_pdf(path):
+    return "".join(extract_pages_from_pdf(path))
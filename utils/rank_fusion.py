@@ -0,0 +1,21 @@
+import os
+
+# k dampens the weight of top ranks; 60 is the value from the original RRF paper
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+
+def reciprocal_rank_fusion(result_lists: list[list[dict]], k: int = RRF_K, key: str = "pdf_id") -> list[dict]:
+    """
+    Merge ranked result lists (each best-first) by reciprocal rank fusion:
+    score(d) = sum over lists of 1 / (k + rank of d). Only ranks are used, so
+    lists with incomparable scores (L2 distance, BM25) can be fused directly.
+    Returns copies of the first-seen dict per key with `rrf_score` set, best first.
+    """
+    fused: dict[str, dict] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            entry = fused.get(result[key])
+            if entry is None:
+                entry = fused[result[key]] = dict(result, rrf_score=0.0)
+            entry["rrf_score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda r: r["rrf_score"], reverse=True)
@@ -1,10 +1,154 @@
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import json
 import os
-import google.generativeai as genai
-import traceback
-from utils.llm_client import TextGenerator 
+import re
+import threading
+from utils.gemini_scheduler import GeminiUnavailableError
+from utils.llm_client import TextGenerator
+from utils.local_scoring import cascade, CASCADE_ENABLED, CASCADE_TOP_N
 
-import traceback
+# "listwise" scores a whole batch of chunks per prompt; "pointwise" sends one prompt per chunk
+RERANK_MODE = os.getenv("RERANK_MODE", "listwise")
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "10"))
+# Per-request cap on concurrent LLM calls in the async path
+RERANK_MAX_CONCURRENCY = int(os.getenv("RERANK_MAX_CONCURRENCY", "8"))
+# Threads in the pool the threaded path shares across requests
+RERANK_MAX_WORKERS = int(os.getenv("RERANK_MAX_WORKERS", "20"))
+
+_SCORING_GUIDE = (
+    "If the content contains exact keywords, phrases, or concepts from the query, treat it as more relevant. "
+    "Reward content that directly matches or closely reflects the user's question. Penalize vague or unrelated text.\n\n"
+    "Scoring Guide:\n"
+    "- 100: Exact and complete answer. Highly relevant with key query terms clearly addressed.\n"
+    "- 70-99: Mostly relevant. Key terms are present but may lack full context.\n"
+    "- 40-69: Partially relevant. Mentions some related ideas but lacks clarity or depth.\n"
+    "- 10-39: Slightly relevant. Vague overlap with the query.\n"
+    "- 0-9: Completely irrelevant.\n\n"
+)
+_LISTWISE_CONFIG = {"response_mime_type": "application/json"}
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Reranking pool of RERANK_MAX_WORKERS threads, shared by all requests instead of a fresh pool per query."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, RERANK_MAX_WORKERS), thread_name_prefix="rerank")
+    return _executor
+
+
+def _apply_lexical_boost(query: str, content: str, score: int) -> int:
+    # Optional: Apply minor lexical boost if key query terms are present in content
+    query_terms = set(query.lower().split())
+    content_terms = set(content.lower().split())
+    overlap = query_terms.intersection(content_terms)
+
+    if len(overlap) >= 3:  # tweak threshold as needed
+        return min(score + 10, 100)  # soft boost
+    elif len(overlap) >= 1:
+        return min(score + 5, 100)
+    return score
+
+
+# -- prompts and parsing ---------------------------------------------------------------
+
+def _pointwise_prompt(query: str, content: str) -> str:
+    return (
+        "You are a domain expert ranking how well a content chunk answers a given user query. "
+        "Give a score between 0 and 100 based on relevance, clarity, completeness, and accuracy.\n\n"
+        + _SCORING_GUIDE +
+        "Only return a single integer score between 0 and 100 with no explanation or extra text.\n\n"
+        f"Query:\n{query}\n\n"
+        f"Content:\n{content}\n\n"
+        "Score (0-100):"
+    )
+
+
+def _apply_pointwise_response(query: str, chunk: dict, response) -> dict | None:
+    if hasattr(response, "text") and response.text:
+        response_text = response.text.strip()
+        digits = "".join(filter(str.isdigit, response_text))
+        if digits:
+            score = int(digits)
+            score = max(0, min(score, 100))
+            chunk["score"] = _apply_lexical_boost(query, chunk["chunk"], score)
+            return chunk
+        else:
+            chunk["score"] = 0
+            return chunk
+    else:
+        return None
+
+
+def _listwise_prompt(query: str, chunks: list[dict]) -> str:
+    candidates = "\n\n".join(
+        f"### pdf_id: {chunk['pdf_id']}\n{chunk.get('chunk', '')}" for chunk in chunks
+    )
+    return (
+        "You are a domain expert ranking how well each content chunk answers a given user query. "
+        "Give every chunk a score between 0 and 100 based on relevance, clarity, completeness, and accuracy.\n\n"
+        + _SCORING_GUIDE +
+        "Return only a JSON object mapping each pdf_id to its integer score, "
+        'e.g. {"<pdf_id>": 85, "<pdf_id>": 12}. Score every chunk and add no other text.\n\n'
+        f"Query:\n{query}\n\n"
+        f"Chunks:\n{candidates}\n\n"
+        "JSON scores:"
+    )
+
+
+def _parse_listwise_scores(text: str) -> dict[str, int]:
+    """Pull the {pdf_id: score} object out of the model reply, tolerating code fences."""
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if not match:
+        raise ValueError("No JSON object in listwise rerank response")
+    raw = json.loads(match.group(0))
+    if not isinstance(raw, dict):
+        raise ValueError("Listwise rerank response is not an object")
+    scores = {}
+    for pdf_id, value in raw.items():
+        try:
+            scores[str(pdf_id)] = max(0, min(int(float(value)), 100))
+        except (TypeError, ValueError):
+            continue
+    return scores
+
+
+def _listwise_scores_from_response(response) -> dict[str, int]:
+    if not (hasattr(response, "text") and response.text):
+        raise ValueError("Empty listwise rerank response")
+    return _parse_listwise_scores(response.text)
+
+
+def _listwise_candidates(results: list[dict], batch_size: int) -> tuple[list[list[dict]], list[dict]]:
+    """
+    (batches, unkeyed): listwise batches of chunks with text, and the chunks
+    with text but no pdf_id, which a listwise reply cannot name and so go
+    straight to the per-chunk fallback.
+    """
+    candidates = [chunk for chunk in results if chunk.get("chunk") and chunk.get("pdf_id")]
+    unkeyed = [chunk for chunk in results if chunk.get("chunk") and not chunk.get("pdf_id")]
+    return [candidates[i:i + batch_size] for i in range(0, len(candidates), batch_size)], unkeyed
+
+
+def _split_scored(query: str, batch: list[dict], scores: dict[str, int]) -> tuple[list[dict], list[dict]]:
+    """Apply listwise scores; return (scored, missing) so missing chunks can fall back."""
+    scored, missing = [], []
+    for chunk in batch:
+        score = scores.get(str(chunk["pdf_id"]))
+        if score is None:
+            missing.append(chunk)
+        else:
+            chunk["score"] = _apply_lexical_boost(query, chunk["chunk"], score)
+            scored.append(chunk)
+    return scored, missing
+
+
+# -- threaded path ---------------------------------------------------------------------
 
 def rerank_chunk(query: str, chunk: dict, model) -> dict | None:
     try:
@@ -12,64 +156,80 @@ def rerank_chunk(query: str, chunk: dict, model) -> dict | None:
         if not content:
             return None
 
-        prompt = (
-            "You are a domain expert ranking how well a content chunk answers a given user query. "
-            "Give a score between 0 and 100 based on relevance, clarity, completeness, and accuracy.\n\n"
-            "If the content contains exact keywords, phrases, or concepts from the query, treat it as more relevant. "
-            "Reward content that directly matches or closely reflects the user's question. Penalize vague or unrelated text.\n\n"
-            "Scoring Guide:\n"
-            "- 100: Exact and complete answer. Highly relevant with key query terms clearly addressed.\n"
-            "- 70-99: Mostly relevant. Key terms are present but may lack full context.\n"
-            "- 40-69: Partially relevant. Mentions some related ideas but lacks clarity or depth.\n"
-            "- 10-39: Slightly relevant. Vague overlap with the query.\n"
-            "- 0-9: Completely irrelevant.\n\n"
-            "Only return a single integer score between 0 and 100 with no explanation or extra text.\n\n"
-            f"Query:\n{query}\n\n"
-            f"Content:\n{content}\n\n"
-            "Score (0-100):"
-        )
-
-        response = model.run(prompt)
-
-        if hasattr(response, "text") and response.text:
-            response_text = response.text.strip()
-            digits = "".join(filter(str.isdigit, response_text))
-            if digits:
-                score = int(digits)
-                score = max(0, min(score, 100))
-
-                # Optional: Apply minor lexical boost if key query terms are present in content
-                query_terms = set(query.lower().split())
-                content_terms = set(content.lower().split())
-                overlap = query_terms.intersection(content_terms)
-
-                if len(overlap) >= 3:  # tweak threshold as needed
-                    score = min(score + 10, 100)  # soft boost
-                elif len(overlap) >= 1:
-                    score = min(score + 5, 100)
-
-                chunk["score"] = score
-                return chunk
-            else:
-                chunk["score"] = 0
-                return chunk
-        else:
-            return None
+        response = model.run(_pointwise_prompt(query, content))
+        return _apply_pointwise_response(query, chunk, response)
     except Exception as e:
         print(f"Error reranking chunk {chunk.get('file_id', 'N/A')}: {e}")
         import traceback
         traceback.print_exc()
         return None
 
-def rerank_results_with_model_parallel(query: str, results: list[dict], api_key: str, top_k=10, max_workers=20) -> list[dict]:
-    print(f"🔍 Parallel reranking {len(results)} chunks...")
+
+def rerank_batch_listwise(query: str, chunks: list[dict], model) -> dict[str, int]:
+    """
+    Score a batch of chunks in a single prompt.
+    Returns {pdf_id: score} for every chunk the model scored; missing ids are
+    left for the caller to fall back on.
+    """
+    response = model.run(_listwise_prompt(query, chunks), generation_config=_LISTWISE_CONFIG)
+    return _listwise_scores_from_response(response)
+
+
+def _rerank_listwise(query: str, results: list[dict], model, executor, batch_size: int) -> list[dict]:
+    batches, unkeyed = _listwise_candidates(results, batch_size)
+    future_to_batch = {executor.submit(rerank_batch_listwise, query, batch, model): batch for batch in batches}
+
+    reranked = []
+    fallback = list(unkeyed)
+    for future in as_completed(future_to_batch):
+        batch = future_to_batch[future]
+        try:
+            scores = future.result()
+        except Exception as e:
+            print(f"⚠️ Listwise rerank failed for a batch of {len(batch)}, falling back to per-chunk: {e}")
+            scores = {}
+        scored, missing = _split_scored(query, batch, scores)
+        reranked.extend(scored)
+        fallback.extend(missing)
+
+    if fallback:
+        futures = [executor.submit(rerank_chunk, query, chunk, model) for chunk in fallback]
+        for future in as_completed(futures):
+            result = future.result()
+            if result is not None:
+                reranked.append(result)
+    return reranked
+
+
+def _prefilter(query: str, results: list[dict], query_embedding, cascade_top_n: int) -> list[dict]:
+    """Run the local scoring cascade when the caller has the query embedding."""
+    if query_embedding is None or not CASCADE_ENABLED:
+        return [{k: v for k, v in r.items() if k != "embedding"} for r in results]
+    selected = cascade(query, query_embedding, results, top_n=cascade_top_n)
+    print(f"🪜 Cascade kept {len(selected)}/{len(results)} chunks for the LLM")
+    return selected
+
+
+def rerank_results_with_model_parallel(query: str, results: list[dict], api_key: str, top_k=10,
+                                       max_workers: int = RERANK_MAX_WORKERS,
+                                       mode: str = RERANK_MODE, batch_size: int = RERANK_BATCH_SIZE,
+                                       query_embedding=None, cascade_top_n: int = CASCADE_TOP_N) -> list[dict]:
+    results = _prefilter(query, results, query_embedding, cascade_top_n)
+    print(f"🔍 Parallel reranking {len(results)} chunks ({mode})...")
 
     model = TextGenerator(
         api_key=api_key
     )
+    if max_workers != RERANK_MAX_WORKERS:
+        # The pool is shared by every request; one caller cannot resize it
+        raise ValueError(f"max_workers={max_workers} conflicts with the shared rerank pool "
+                         f"(RERANK_MAX_WORKERS={RERANK_MAX_WORKERS})")
+    executor = _get_executor()
 
-    reranked = []
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    if mode == "listwise":
+        reranked = _rerank_listwise(query, results, model, executor, batch_size)
+    else:
+        reranked = []
         future_to_chunk = {executor.submit(rerank_chunk, query, chunk, model): chunk for chunk in results}
 
         for future in as_completed(future_to_chunk):
@@ -78,3 +238,79 @@ def rerank_results_with_model_parallel(query: str, results: list[dict], api_key:
                 reranked.append(result)
 
     return sorted(reranked, key=lambda x: x["score"], reverse=True)[:top_k]
+
+
+# -- asyncio path ----------------------------------------------------------------------
+
+async def rerank_chunk_async(query: str, chunk: dict, model, semaphore: asyncio.Semaphore) -> dict | None:
+    try:
+        content = chunk.get("chunk", "")
+        if not content:
+            return None
+        async with semaphore:
+            response = await model.run_async(_pointwise_prompt(query, content))
+        return _apply_pointwise_response(query, chunk, response)
+    except GeminiUnavailableError:
+        # Backpressure or an open circuit fails the request (503) instead of thinning the ranking
+        raise
+    except Exception as e:
+        print(f"Error reranking chunk {chunk.get('file_id', 'N/A')}: {e}")
+        return None
+
+
+async def _rerank_batch_listwise_async(query: str, batch: list[dict], model,
+                                       semaphore: asyncio.Semaphore) -> tuple[list[dict], list[dict]]:
+    try:
+        async with semaphore:
+            response = await model.run_async(_listwise_prompt(query, batch), generation_config=_LISTWISE_CONFIG)
+        scores = _listwise_scores_from_response(response)
+    except GeminiUnavailableError:
+        raise
+    except Exception as e:
+        print(f"⚠️ Listwise rerank failed for a batch of {len(batch)}, falling back to per-chunk: {e}")
+        scores = {}
+    return _split_scored(query, batch, scores)
+
+
+async def rerank_results_async(query: str, results: list[dict], api_key: str, top_k=10,
+                               mode: str = RERANK_MODE, batch_size: int = RERANK_BATCH_SIZE,
+                               max_concurrency: int = RERANK_MAX_CONCURRENCY,
+                               semaphore: asyncio.Semaphore | None = None,
+                               query_embedding=None, cascade_top_n: int = CASCADE_TOP_N,
+                               report: dict | None = None) -> list[dict]:
+    """
+    asyncio counterpart of rerank_results_with_model_parallel. LLM calls are
+    gathered on the event loop and capped by `semaphore` (one per request
+    unless the caller shares one), so no thread pool is involved.
+    With `query_embedding`, the local cascade first narrows the candidates.
+    `report`, if given, receives "fallback" (chunks the listwise pass left to
+    per-chunk prompts) and "dropped" (chunks that got no score at all).
+    GeminiUnavailableError is raised, not swallowed.
+    """
+    results = _prefilter(query, results, query_embedding, cascade_top_n)
+    print(f"🔍 Async reranking {len(results)} chunks ({mode})...")
+    model = TextGenerator(api_key=api_key)
+    semaphore = semaphore or asyncio.Semaphore(max_concurrency)
+
+    if mode == "listwise":
+        batches, unkeyed = _listwise_candidates(results, batch_size)
+        outcomes = await asyncio.gather(
+            *(_rerank_batch_listwise_async(query, batch, model, semaphore) for batch in batches)
+        )
+        reranked = [chunk for scored, _ in outcomes for chunk in scored]
+        fallback = unkeyed + [chunk for _, missing in outcomes for chunk in missing]
+    else:
+        reranked = []
+        fallback = results
+        unkeyed = []
+
+    # Chunks without a pdf_id are scored per chunk by design, not because the listwise pass failed
+    fallback_count = len(fallback) - len(unkeyed) if mode == "listwise" else 0
+    if fallback:
+        rescored = await asyncio.gather(*(rerank_chunk_async(query, chunk, model, semaphore) for chunk in fallback))
+        reranked.extend(chunk for chunk in rescored if chunk is not None)
+
+    if report is not None:
+        report["fallback"] = fallback_count
+        report["dropped"] = sum(1 for chunk in results if chunk.get("chunk")) - len(reranked)
+    return sorted(reranked, key=lambda x: x["score"], reverse=True)[:top_k]
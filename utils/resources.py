@@ -0,0 +1,156 @@
+import importlib
+import os
+import threading
+import time
+
+# Resources loaded by the FastAPI warmup before /ready reports ready.
+# The tokenizer is only needed for ingestion, so search workers skip it by default.
+_DEFAULT_WARMUP = "genai,gemini_model,milvus,search_pool" + (
+    ",local_index" if os.getenv("SEARCH_BACKEND", "milvus") == "local" else ""
+)
+WARMUP_RESOURCES = [
+    name.strip() for name in os.getenv("WARMUP_RESOURCES", _DEFAULT_WARMUP).split(",") if name.strip()
+]
+DEFAULT_GEMINI_MODEL = "gemini-1.5-pro"
+
+
+class ResourceRegistry:
+    """
+    Process-wide singletons built on first use. Each resource has a loader;
+    `get` runs it once (other callers wait for it) and remembers the result,
+    the load time and any error so /ready can report them.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._values = {}
+        self._errors = {}
+        self._seconds = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._warmup_started = None
+        self._warmup_finished = None
+
+    def register(self, name: str, loader):
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str):
+        if name in self._values:
+            return self._values[name]
+        if name not in self._loaders:
+            raise KeyError(f"Unknown resource: {name}")
+        with self._locks[name]:
+            if name not in self._values:
+                start = time.perf_counter()
+                try:
+                    self._values[name] = self._loaders[name]()
+                    self._errors.pop(name, None)
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    raise
+                finally:
+                    self._seconds[name] = round(time.perf_counter() - start, 3)
+        return self._values[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._values
+
+    def warmup(self, names: list[str] = None) -> bool:
+        """Load the given resources (default WARMUP_RESOURCES); failures are reported, not raised."""
+        names = WARMUP_RESOURCES if names is None else names
+        self._warmup_started = time.time()
+        self._warmup_finished = None
+        for name in names:
+            try:
+                self.get(name)
+                print(f"🔥 Warmed up {name} in {self._seconds[name]}s")
+            except Exception as e:
+                print(f"⚠️ Warmup of {name} failed, will retry on first use: {e}")
+        self._warmup_finished = time.time()
+        return self.ready(names)
+
+    def ready(self, names: list[str] = None) -> bool:
+        names = WARMUP_RESOURCES if names is None else names
+        return all(name in self._values for name in names)
+
+    def status(self) -> dict:
+        resources = {}
+        for name in sorted(self._loaders):
+            if name in self._values:
+                state = "ready"
+            elif name in self._errors:
+                state = "failed"
+            else:
+                state = "not_loaded"
+            resources[name] = {"state": state, "load_seconds": self._seconds.get(name)}
+            if name in self._errors:
+                resources[name]["error"] = self._errors[name]
+        warmup_seconds = None
+        if self._warmup_started and self._warmup_finished:
+            warmup_seconds = round(self._warmup_finished - self._warmup_started, 3)
+        return {
+            "ready": self.ready(),
+            "required": WARMUP_RESOURCES,
+            "warmup_running": bool(self._warmup_started and not self._warmup_finished),
+            "warmup_seconds": warmup_seconds,
+            "resources": resources,
+        }
+
+
+registry = ResourceRegistry()
+
+
+def _load_genai():
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment.")
+    genai = importlib.import_module("google.generativeai")
+    genai.configure(api_key=api_key)
+    return genai
+
+
+def _load_tokenizer():
+    from embedding.generator import load_tokenizer
+    return load_tokenizer()
+
+
+def _load_milvus():
+    from vectorstore.milvus_client import get_milvus_client
+    return get_milvus_client()
+
+
+def _load_search_pool():
+    from vectorstore.milvus_client import get_search_pool
+    return get_search_pool()
+
+
+def _load_local_index():
+    from vectorstore.local_index import get_local_index
+    return get_local_index()
+
+
+registry.register("genai", _load_genai)
+registry.register("tokenizer", _load_tokenizer)
+registry.register("milvus", _load_milvus)
+registry.register("search_pool", _load_search_pool)
+registry.register("local_index", _load_local_index)
+registry.register("gemini_model", lambda: get_generative_model(DEFAULT_GEMINI_MODEL))
+
+
+def get_genai():
+    """google.generativeai, imported and configured with GEMINI_API_KEY once per process."""
+    return registry.get("genai")
+
+
+def get_generative_model(model: str = DEFAULT_GEMINI_MODEL):
+    """One GenerativeModel per model name, shared by every TextGenerator."""
+    name = f"gemini_model:{model}"
+    if name not in registry._loaders:
+        registry.register(name, lambda: get_genai().GenerativeModel(model))
+    return registry.get(name)
+
+
+def get_tokenizer():
+    return registry.get("tokenizer")
@@ -0,0 +1,271 @@
+"""
+Cache of complete /semantic-search responses.
+
+Exact layer: key = (mode, normalised query). Normalisation applies NFKC and
+casefold, collapses whitespace and strips surrounding punctuation, so
+"What is AI?" and "what is  ai" share an entry. An exact hit makes no Gemini
+call.
+
+Semantic layer (RESPONSE_CACHE_SEMANTIC=1, conceptual mode only): on an exact
+miss the query is embedded and a cached answer is reused when its query
+embedding has cosine similarity >= RESPONSE_CACHE_SIMILARITY. The embedding
+is then passed to the search, so a miss costs no extra Gemini call.
+
+Concurrent requests for the same key share one computation (singleflight).
+Entries expire after RESPONSE_CACHE_TTL seconds and the least recently used
+are evicted beyond RESPONSE_CACHE_SIZE. Every Milvus insert or delete calls
+invalidate(). It clears this process's entries and rewrites
+RESPONSE_CACHE_VERSION_FILE, so other workers drop theirs on their next lookup.
+"""
+import asyncio
+import copy
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.instrumentation import RESPONSE_CACHE_LOOKUPS
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "0") == "1"
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.97"))
+RESPONSE_CACHE_VERSION_FILE = os.getenv("RESPONSE_CACHE_VERSION_FILE", "collection.version")
+
+_SPACES = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " \t\n.,;:!?¿¡؟،؛\"'`()[]{}«»“”‘’"
+
+
+def _write_version_file(path: str):
+    try:
+        with open(path, "w") as f:
+            f.write(f"{time.time_ns()} {os.getpid()}\n")
+    except OSError as e:
+        print(f"⚠️ Could not update {path}: {e}")
+
+
+def normalize_query(query: str) -> str:
+    text = unicodedata.normalize("NFKC", query).casefold()
+    return _SPACES.sub(" ", text).strip(_EDGE_PUNCTUATION)
+
+
+class ResponseCache:
+    """In-process TTL/LRU cache of search responses with singleflight and semantic reuse."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL,
+                 semantic: bool = RESPONSE_CACHE_SEMANTIC, similarity: float = RESPONSE_CACHE_SIMILARITY,
+                 version_file: str = RESPONSE_CACHE_VERSION_FILE):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.semantic = semantic
+        self.similarity = similarity
+        self.version_file = version_file
+        # key -> {"response", "expires", "embedding" (unit float32 vector or None)}
+        self._entries: OrderedDict[tuple, dict] = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._version = self._read_version()
+
+        self.hits = 0
+        self.semantic_hits = 0
+        self.shared = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # -- invalidation ----------------------------------------------------------------
+
+    def _read_version(self):
+        try:
+            return os.stat(self.version_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def invalidate(self):
+        """Drop every entry here and, through the version file, in the other workers."""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self.invalidations += 1
+            _write_version_file(self.version_file)
+            self._version = self._read_version()
+
+    def _check_version(self):
+        version = self._read_version()
+        if version != self._version:
+            with self._lock:
+                self._entries.clear()
+                self._generation += 1
+                self._version = version
+
+    # -- entries ---------------------------------------------------------------------
+
+    def _get(self, key: tuple) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires"] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry["response"]
+
+    def _nearest(self, mode: str, embedding: np.ndarray) -> dict | None:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [(key, entry) for key, entry in self._entries.items()
+                          if key[0] == mode and entry["embedding"] is not None and entry["expires"] >= now]
+            if not candidates:
+                return None
+            similarities = np.stack([entry["embedding"] for _, entry in candidates]) @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity:
+                return None
+            key, entry = candidates[best]
+            self._entries.move_to_end(key)
+            return entry["response"]
+
+    def _put(self, key: tuple, response: dict, embedding: np.ndarray | None, generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return  # the collection changed while this response was computed
+            self._entries[key] = {"response": copy.deepcopy(response), "embedding": embedding,
+                                  "expires": time.monotonic() + self.ttl}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray | None:
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    @staticmethod
+    def _answer(response: dict, query: str) -> dict:
+        answer = copy.deepcopy(response)
+        answer["query"] = query
+        return answer
+
+    # -- lookup ----------------------------------------------------------------------
+
+    async def get_or_compute(self, query: str, mode: str, compute, embed=None, cacheable=None) -> tuple[dict, str]:
+        """
+        Cached response for (mode, query), else `await compute(query_embedding)`.
+        `embed(query)` enables the semantic layer for this call; `compute` then
+        receives its embedding (None otherwise). A computed response is stored
+        unless it has no results or `cacheable(response)` is False; waiters
+        already sharing the computation still get it. Returns (response,
+        outcome) with outcome one of hit, semantic, shared, miss.
+        """
+        self._check_version()
+        key = (mode, normalize_query(query))
+
+        cached = self._get(key)
+        if cached is not None:
+            self.hits += 1
+            RESPONSE_CACHE_LOOKUPS.inc(mode=mode, outcome="hit")
+            return self._answer(cached, query), "hit"
+
+        loop = asyncio.get_running_loop()
+        pending = self._inflight.get(key)
+        while pending is not None and pending.get_loop() is loop:
+            try:
+                response = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                # The leading request was cancelled; compute (or join the next leader) instead
+                pending = self._inflight.get(key)
+                continue
+            self.shared += 1
+            RESPONSE_CACHE_LOOKUPS.inc(mode=mode, outcome="shared")
+            return self._answer(response, query), "shared"
+
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            embedding = None
+            if self.semantic and embed is not None:
+                embedding = await embed(query)
+                unit = self._unit(embedding)
+                similar = self._nearest(mode, unit) if unit is not None else None
+                if similar is not None:
+                    self.semantic_hits += 1
+                    RESPONSE_CACHE_LOOKUPS.inc(mode=mode, outcome="semantic")
+                    future.set_result(similar)
+                    return self._answer(similar, query), "semantic"
+
+            self.misses += 1
+            RESPONSE_CACHE_LOOKUPS.inc(mode=mode, outcome="miss")
+            generation = self._generation
+            response = await compute(embedding)
+            if response.get("results") and (cacheable is None or cacheable(response)):
+                self._put(key, response, self._unit(embedding), generation)
+            future.set_result(copy.deepcopy(response))
+            return response, "miss"
+        except BaseException as e:
+            # Failures are shared with the waiters but never cached
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # retrieved here, so an unawaited future logs nothing
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.shared + self.misses
+            return {
+                "semantic": self.semantic,
+                "similarity": self.similarity,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "shared": self.shared,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.semantic_hits + self.shared) / lookups, 4) if lookups else 0.0,
+                "in_flight": len(self._inflight),
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+_cache: ResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache | None:
+    """Process-wide response cache; None when disabled."""
+    global _cache
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+
+def invalidate():
+    """Called after every write to the collection, also by processes that serve no searches."""
+    cache = get_response_cache()
+    if cache is not None:
+        cache.invalidate()
+    else:
+        _write_version_file(RESPONSE_CACHE_VERSION_FILE)
@@ -0,0 +1,238 @@
+import asyncio
+import os
+
+from fastapi import HTTPException
+
+from utils.get_query_embedding import get_query_embedding_async, get_query_embeddings_async
+from utils.gemini_scheduler import GeminiUnavailableError
+from utils.group_by_file_id import group_by_file_id
+from utils.instrumentation import span
+from utils.rank_fusion import reciprocal_rank_fusion
+from utils.rerank_results_with_model import rerank_results_async
+from utils.response_cache import get_response_cache
+from utils.local_scoring import CASCADE_ENABLED
+from utils.serach_chunks import search_chunks_async, search_chunks_batch_async, fetch_embeddings_async
+from utils.llm_client import TextGenerator
+from utils.summarize_keyword_results_with_model import (summarize_keyword_results_with_model_async,
+                                                        build_keyword_summary_prompt)
+from utils.summarize_results_with_model import summarize_results_with_model_async, build_summary_prompt
+from vectorstore import lexical_index
+
+# Conceptual mode: fuse dense and BM25 candidates (reciprocal rank fusion) before the LLM rerank
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "0") == "1"
+SEARCH_TOP_K = 20
+BATCH_SEARCH_MAX_QUERIES = int(os.getenv("BATCH_SEARCH_MAX_QUERIES", "100"))
+# Rerank LLM calls in flight across all queries of one batch
+BATCH_SEARCH_CONCURRENCY = int(os.getenv("BATCH_SEARCH_CONCURRENCY", "32"))
+
+
+async def _lexical_search(query: str, timings: dict | None = None) -> list:
+    if not lexical_index.LEXICAL_INDEX_ENABLED:
+        return []
+    try:
+        with span("lexical", timings):
+            return await asyncio.to_thread(lexical_index.search, query, SEARCH_TOP_K)
+    except Exception as e:
+        print(f"⚠️ Lexical search failed, using dense results only: {e}")
+        return []
+
+
+async def _embed(query: str, timings: dict | None = None) -> list:
+    with span("embed", timings):
+        return await get_query_embedding_async(query)
+
+
+async def _dense_search(query: str, with_embeddings: bool = False, timings: dict | None = None,
+                        query_embedding: list | None = None) -> tuple[list, list]:
+    """Returns (query_embedding, hits)."""
+    # 🔍 Embed query (unless the response cache already did)
+    embedding = query_embedding or await _embed(query, timings)
+    if not embedding:
+        raise HTTPException(status_code=400, detail="Failed to generate embedding.")
+    # 🔍 Search in Milvus (or the local index)
+    with span("search", timings):
+        return embedding, await search_chunks_async(embedding, SEARCH_TOP_K, with_embeddings)
+
+
+async def _attach_embeddings(results: list):
+    """Fill in stored embeddings for candidates that came from the lexical index."""
+    missing = [r["pdf_id"] for r in results if r.get("embedding") is None]
+    if missing:
+        found = await fetch_embeddings_async(missing)
+        for r in results:
+            if r.get("embedding") is None:
+                r["embedding"] = found.get(r["pdf_id"])
+
+
+async def _precomputed(value):
+    return value
+
+
+async def retrieve(query: str, api_key: str, mode: str = "conceptual", timings: dict | None = None,
+                   dense: tuple | None = None, semaphore: asyncio.Semaphore | None = None,
+                   query_embedding: list | None = None, quality: dict | None = None) -> tuple[list, list]:
+    """
+    Retrieve and rank chunks, all on the event loop. Returns (raw_results, top_results).
+
+    keyword:    BM25 over the lexical index, grouped without any LLM calls; only
+                when no indexed term matches does it fall back to the dense
+                neighbours (still without reranking).
+    conceptual: dense search (fused with BM25 when HYBRID_SEARCH is on) -> LLM rerank.
+
+    Seconds per stage (embed, search, lexical, rerank, group) go to `timings`
+    if given, else to the current request's breakdown (see utils.instrumentation).
+    search_many passes `dense` = (query_embedding, hits) from its batched
+    search, and one rerank `semaphore` shared by all of its queries.
+    The response cache passes the `query_embedding` it computed, and a
+    `quality` dict that the rerank fills with its fallback/dropped counts.
+    """
+    if mode == "keyword":
+        raw_results = await _lexical_search(query, timings)
+        if raw_results:
+            with span("group", timings):
+                return raw_results, group_by_file_id(raw_results, higher_is_better=True)
+        _, raw_results = await _dense_search(query, timings=timings, query_embedding=query_embedding)
+        if not raw_results:
+            raise HTTPException(status_code=404, detail="No results found.")
+        with span("group", timings):
+            return raw_results, group_by_file_id(raw_results)
+
+    # Stored embeddings come back with the hits so the cascade can re-score them exactly
+    with_embeddings = CASCADE_ENABLED
+    dense_search = (_dense_search(query, with_embeddings, timings, query_embedding) if dense is None
+                    else _precomputed(dense))
+    if HYBRID_SEARCH:
+        (embedding, hits), lexical = await asyncio.gather(dense_search, _lexical_search(query, timings))
+        raw_results = reciprocal_rank_fusion([hits, lexical])[:SEARCH_TOP_K] if lexical else hits
+        if with_embeddings:
+            with span("search", timings):
+                await _attach_embeddings(raw_results)
+    else:
+        embedding, raw_results = await dense_search
+    if not raw_results:
+        raise HTTPException(status_code=404, detail="No results found.")
+
+    try:
+        # The cascade picks the candidates; the reranker works on copies without embeddings,
+        # so raw_results keep their retrieval order and scores
+        with span("rerank", timings):
+            reranked_results = await rerank_results_async(query, raw_results, api_key, top_k=10,
+                                                          semaphore=semaphore, query_embedding=embedding,
+                                                          report=quality)
+    except GeminiUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error during reranking: {e}")
+        raise HTTPException(status_code=500, detail="Failed to rerank results with Gemini.")
+
+    for r in raw_results:
+        r.pop("embedding", None)
+    # 📚 Group top results by file_id; rerank scores are 0-100 relevance, higher is better
+    with span("group", timings):
+        return raw_results, group_by_file_id(reranked_results, higher_is_better=True)
+
+
+async def summarize(query: str, mode: str, raw_results: list, top_results: list, api_key: str) -> dict:
+    # 🧠 Summarize differently based on mode
+    if mode == "conceptual":
+        return await summarize_results_with_model_async(query, top_results, api_key)
+    elif mode == "keyword":
+        return await summarize_keyword_results_with_model_async(query, raw_results, api_key)
+    raise HTTPException(status_code=400, detail="Invalid search mode. Use 'conceptual' or 'keyword'.")
+
+
+async def summarize_stream(query: str, mode: str, raw_results: list, top_results: list, api_key: str):
+    """Same prompts as summarize(), but yields Markdown pieces as they are generated."""
+    if mode == "conceptual":
+        prompt = build_summary_prompt(query, top_results)
+    elif mode == "keyword":
+        prompt = build_keyword_summary_prompt(query, raw_results)
+    else:
+        raise HTTPException(status_code=400, detail="Invalid search mode. Use 'conceptual' or 'keyword'.")
+    model = TextGenerator(api_key=api_key)
+    async for text in model.stream_async(prompt):
+        yield text
+
+
+async def run_semantic_search(query: str, mode: str, api_key: str, timings: dict | None = None,
+                              include_summary: bool = True, dense: tuple | None = None,
+                              semaphore: asyncio.Semaphore | None = None,
+                              query_embedding: list | None = None, quality: dict | None = None) -> dict:
+    with span("total", timings):
+        raw_results, top_results = await retrieve(query, api_key, mode, timings, dense, semaphore,
+                                                  query_embedding, quality)
+        summary = None
+        if include_summary:
+            with span("summarize", timings):
+                summary = await summarize(query, mode, raw_results, top_results, api_key)
+    return {
+        "query": query,
+        "summary": summary,
+        "results": top_results
+    }
+
+
+async def cached_semantic_search(query: str, mode: str, api_key: str) -> tuple[dict, str]:
+    """
+    run_semantic_search behind the response cache. Returns (response, outcome),
+    outcome being hit, semantic, shared, miss, or off when the cache is disabled.
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return await run_semantic_search(query, mode, api_key), "off"
+    # Near-duplicate reuse compares query embeddings, which keyword mode never computes
+    embed = _embed if mode == "conceptual" else None
+    # A rerank that fell back to per-chunk prompts or lost candidates answers this request,
+    # but is not kept: the next one may get the full ranking
+    quality = {}
+    return await cache.get_or_compute(
+        query, mode,
+        lambda embedding: run_semantic_search(query, mode, api_key, query_embedding=embedding, quality=quality),
+        embed, cacheable=lambda response: not quality.get("fallback") and not quality.get("dropped"))
+
+
+async def search_many(queries: list[str], mode: str, api_key: str, include_summary: bool = True,
+                      max_concurrency: int = BATCH_SEARCH_CONCURRENCY):
+    """
+    Answer many queries at once. Yields (index, response) as each query finishes;
+    `response` is the run_semantic_search result or {"error": {...}}.
+
+    In conceptual mode all queries are embedded in one Gemini request and
+    searched with one multi-vector search. Reranking for every query then runs
+    under a single semaphore of `max_concurrency` LLM calls. Keyword mode
+    needs no embeddings, so its queries go straight to the lexical index.
+    """
+    dense = [None] * len(queries)
+    if mode == "conceptual":
+        with span("embed"):
+            embeddings = await get_query_embeddings_async(queries)
+        embedded = [i for i, embedding in enumerate(embeddings) if embedding]
+        if embedded:
+            with span("search"):
+                hits = await search_chunks_batch_async([embeddings[i] for i in embedded], SEARCH_TOP_K,
+                                                       CASCADE_ENABLED)
+            for i, query_hits in zip(embedded, hits):
+                dense[i] = (embeddings[i], query_hits)
+        # Queries whose batch embedding failed retry on their own inside retrieve()
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def one(i: int):
+        try:
+            return i, await run_semantic_search(queries[i], mode, api_key, timings={},
+                                                include_summary=include_summary, dense=dense[i],
+                                                semaphore=semaphore)
+        except HTTPException as e:
+            return i, {"query": queries[i], "error": {"status_code": e.status_code, "detail": e.detail}}
+        except GeminiUnavailableError as e:
+            return i, {"query": queries[i], "error": {"status_code": 503, "detail": str(e)}}
+        except Exception as e:
+            return i, {"query": queries[i], "error": {"status_code": 500, "detail": str(e)}}
+
+    tasks = [asyncio.create_task(one(i)) for i in range(len(queries))]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
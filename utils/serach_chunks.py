@@ -1,26 +1,88 @@
-from pymilvus import Collection
-from vectorstore.milvus_client import MilvusClient
-
-def search_chunks(query_embedding: list, top_k=20):
-    milvus = MilvusClient()
-    collection = Collection("pdf_chunks")
-    collection.load()
-    
-    results = collection.search(
-        data=[query_embedding],
-        anns_field="embedding",
-        param={"metric_type": "L2", "params": {"nprobe": 10}},
-        limit=top_k,
-        output_fields=["pdf_id", "file_id", "chunk"]
-    )
-    
-    hits = results[0]  # Only one query
-    return [
-        {
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from utils.instrumentation import MILVUS_ROWS, MILVUS_BYTES
+from vectorstore.milvus_client import get_search_pool, MILVUS_POOL_SIZE
+from vectorstore.local_index import SEARCH_BACKEND, get_local_index
+
+# pymilvus' ORM is blocking; searches run here, sized to the connection pool,
+# so waiting on Milvus never ties up the event loop or Starlette's threadpool
+_search_executor = ThreadPoolExecutor(max_workers=MILVUS_POOL_SIZE, thread_name_prefix="milvus-search")
+
+def _hits_to_chunks(hits, with_embeddings: bool, spec) -> list[dict]:
+    chunks = []
+    payload = 0
+    for hit in hits:
+        chunk = {
             "file_id": hit.entity.get("file_id"),
             "pdf_id": hit.entity.get("pdf_id"),
             "chunk": hit.entity.get("chunk"),
-            "score": hit.distance
+            "score": spec.distance(hit.distance)
         }
-        for hit in hits
-    ]
+        if with_embeddings:
+            chunk["embedding"] = spec.decode(hit.entity.get("embedding"))
+            payload += 4 * len(chunk["embedding"] or ())
+        payload += len(chunk["pdf_id"] or "") + len(chunk["file_id"] or "") + len((chunk["chunk"] or "").encode("utf-8"))
+        chunks.append(chunk)
+    MILVUS_ROWS.inc(len(chunks), op="search")
+    MILVUS_BYTES.inc(payload, op="search")
+    return chunks
+
+
+def search_chunks_batch(query_embeddings: list, top_k=20, with_embeddings: bool = False) -> list[list[dict]]:
+    """Top-k chunks for each query embedding; Milvus answers all of them in one search request."""
+    if not query_embeddings:
+        return []
+    if SEARCH_BACKEND == "local":
+        # In-process mmap index; Milvus only answers until the first rows are synced
+        index = get_local_index()
+        if index.count:
+            return [index.search(embedding, top_k, with_embeddings=with_embeddings)
+                    for embedding in index.prepare_queries(query_embeddings)]
+
+    pool = get_search_pool()
+    # The pool keeps connections open and the collection loaded,
+    # so the only per-query cost is the search RPC itself
+    output_fields = ["pdf_id", "file_id", "chunk"] + (["embedding"] if with_embeddings else [])
+    results = pool.search(
+        data=pool.spec.prepare(query_embeddings),
+        anns_field="embedding",
+        param=pool.spec.search_param(),
+        limit=top_k,
+        output_fields=output_fields
+    )
+    return [_hits_to_chunks(hits, with_embeddings, pool.spec) for hits in results]
+
+
+def search_chunks(query_embedding: list, top_k=20, with_embeddings: bool = False):
+    return search_chunks_batch([query_embedding], top_k, with_embeddings)[0]
+
+
+def fetch_embeddings(pdf_ids: list) -> dict:
+    """Stored embeddings for the given chunks, as {pdf_id: embedding}."""
+    if not pdf_ids:
+        return {}
+    if SEARCH_BACKEND == "local":
+        index = get_local_index()
+        if index.count:
+            return index.get_embeddings(pdf_ids)
+    with get_search_pool().acquire() as client:
+        rows = client.collection.query(expr=f"pdf_id in {json.dumps(list(pdf_ids))}",
+                                       output_fields=["pdf_id", "embedding"])
+    return {row["pdf_id"]: client.spec.decode(row["embedding"]) for row in rows}
+
+
+async def search_chunks_async(query_embedding: list, top_k=20, with_embeddings: bool = False):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_search_executor, search_chunks, query_embedding, top_k, with_embeddings)
+
+
+async def fetch_embeddings_async(pdf_ids: list) -> dict:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_search_executor, fetch_embeddings, pdf_ids)
+
+
+async def search_chunks_batch_async(query_embeddings: list, top_k=20, with_embeddings: bool = False):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_search_executor, search_chunks_batch, query_embeddings, top_k,
+                                      with_embeddings)
@@ -1,7 +1,6 @@
 from utils.llm_client import TextGenerator
 
-def summarize_keyword_results_with_model(query: str, matched_chunks: list, api_key: str) -> dict:
-
+def build_keyword_summary_prompt(query: str, matched_chunks: list) -> str:
     # Combine top 20 matched chunks
     context_text = "\n\n".join(chunk.get("chunk", "") for chunk in matched_chunks[:20])
 
@@ -41,6 +40,11 @@ You are a helpful assistant. Based on the following text chunks, extract the **m
 
 ## Keyword-Based Highlights
 """
+    return prompt
+
+
+def summarize_keyword_results_with_model(query: str, matched_chunks: list, api_key: str) -> dict:
+    prompt = build_keyword_summary_prompt(query, matched_chunks)
 
     model = TextGenerator(
         api_key=api_key
@@ -50,3 +54,12 @@ You are a helpful assistant. Based on the following text chunks, extract the **m
     return {
         "markdown": response.text
     }
+
+
+async def summarize_keyword_results_with_model_async(query: str, matched_chunks: list, api_key: str) -> dict:
+    prompt = build_keyword_summary_prompt(query, matched_chunks)
+    model = TextGenerator(api_key=api_key)
+    response = await model.run_async(prompt)
+    return {
+        "markdown": response.text
+    }
@@ -1,11 +1,7 @@
 
 from utils.llm_client import TextGenerator
 
-def summarize_results_with_model(query: str, grouped_results: list, api_key: str) -> dict:
-    import google.generativeai as genai
-    print("Summarizing results with Model...")
-    genai.configure(api_key=api_key)
-    
+def build_summary_prompt(query: str, grouped_results: list) -> str:
     # Combine top chunks into a single context string
     context_chunks = []
     for result in grouped_results:
@@ -57,6 +53,12 @@ Please follow these strict formatting and response guidelines:
 
 ## Markdown Answer
 """
+    return prompt
+
+
+def summarize_results_with_model(query: str, grouped_results: list, api_key: str) -> dict:
+    print("Summarizing results with Model...")
+    prompt = build_summary_prompt(query, grouped_results)
 
     model = TextGenerator(
         api_key=api_key
@@ -66,3 +68,12 @@ Please follow these strict formatting and response guidelines:
     return {
         "markdown": response.text
     }
+
+
+async def summarize_results_with_model_async(query: str, grouped_results: list, api_key: str) -> dict:
+    prompt = build_summary_prompt(query, grouped_results)
+    model = TextGenerator(api_key=api_key)
+    response = await model.run_async(prompt)
+    return {
+        "markdown": response.text
+    }
@@ -0,0 +1,173 @@
+"""
+Vector index and storage settings for the Milvus collection.
+
+    MILVUS_INDEX_TYPE     FLAT | IVF_FLAT (default) | IVF_SQ8 | IVF_PQ | HNSW
+    MILVUS_METRIC         L2 (default) | COSINE | IP
+    MILVUS_VECTOR_TYPE    FLOAT (default) | FLOAT16
+    MILVUS_INDEX_PARAMS   JSON build params, merged over the defaults below
+    MILVUS_SEARCH_PARAMS  JSON search params, merged over the defaults below
+
+The settings apply when a collection is created. An existing collection
+keeps its own schema and index: IndexSpec.from_collection reads them back,
+so searches always match what was built. Use `python -m vectorstore.migrate_index`
+to move the data into a collection with a different spec.
+
+With COSINE or IP, embeddings are L2-normalised before they are written and
+before they are searched. Hit scores are always reported as the squared L2
+distance between the normalised vectors (2 - 2 * cosine). Lower is better and
+the scale matches L2, so grouping and fusion downstream need no changes.
+
+Rough index bytes per 768-dim vector (IndexSpec.bytes_per_vector): FLOAT 3072,
+FLOAT16 1536, IVF_SQ8 768, IVF_PQ (m=48, nbits=8) 48, plus about 2 * M * 4
+bytes of graph links for HNSW.
+"""
+import json
+import os
+
+import numpy as np
+from pymilvus import DataType
+
+DIM = 768
+
+INDEX_TYPES = ("FLAT", "IVF_FLAT", "IVF_SQ8", "IVF_PQ", "HNSW")
+METRICS = ("L2", "COSINE", "IP")
+VECTOR_TYPES = {"FLOAT": DataType.FLOAT_VECTOR, "FLOAT16": DataType.FLOAT16_VECTOR}
+
+DEFAULT_BUILD_PARAMS = {
+    "FLAT": {},
+    "IVF_FLAT": {"nlist": 128},
+    "IVF_SQ8": {"nlist": 1024},
+    "IVF_PQ": {"nlist": 1024, "m": 48, "nbits": 8},  # 768 / 48 = 16 dims per sub-quantizer
+    "HNSW": {"M": 16, "efConstruction": 200},
+}
+DEFAULT_SEARCH_PARAMS = {
+    "FLAT": {},
+    "IVF_FLAT": {"nprobe": 10},
+    "IVF_SQ8": {"nprobe": 16},
+    "IVF_PQ": {"nprobe": 32},
+    "HNSW": {"ef": 128},
+}
+
+MILVUS_INDEX_TYPE = os.getenv("MILVUS_INDEX_TYPE", "IVF_FLAT").upper()
+MILVUS_METRIC = os.getenv("MILVUS_METRIC", "L2").upper()
+MILVUS_VECTOR_TYPE = os.getenv("MILVUS_VECTOR_TYPE", "FLOAT").upper()
+MILVUS_INDEX_PARAMS = json.loads(os.getenv("MILVUS_INDEX_PARAMS", "{}"))
+MILVUS_SEARCH_PARAMS = json.loads(os.getenv("MILVUS_SEARCH_PARAMS", "{}"))
+
+
+class IndexSpec:
+    """How vectors are stored, indexed and searched in one collection."""
+
+    def __init__(self, index_type: str = MILVUS_INDEX_TYPE, metric: str = MILVUS_METRIC,
+                 vector_type: str = MILVUS_VECTOR_TYPE, build_params: dict | None = None,
+                 search_params: dict | None = None):
+        index_type, metric, vector_type = index_type.upper(), metric.upper(), vector_type.upper()
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type}; choose from {', '.join(INDEX_TYPES)}")
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric}; choose from {', '.join(METRICS)}")
+        if vector_type not in VECTOR_TYPES:
+            raise ValueError(f"Unknown vector type {vector_type}; choose from {', '.join(VECTOR_TYPES)}")
+        self.index_type = index_type
+        self.metric = metric
+        self.vector_type = vector_type
+        self.build_params = {**DEFAULT_BUILD_PARAMS[index_type], **(build_params or {})}
+        self.search_params = {**DEFAULT_SEARCH_PARAMS[index_type], **(search_params or {})}
+
+    @classmethod
+    def from_env(cls) -> "IndexSpec":
+        return cls(build_params=MILVUS_INDEX_PARAMS, search_params=MILVUS_SEARCH_PARAMS)
+
+    @classmethod
+    def from_collection(cls, collection) -> "IndexSpec":
+        """
+        The spec an existing collection was built with. Search params come from
+        the environment only when MILVUS_INDEX_TYPE names the same index type.
+        """
+        field = next(f for f in collection.schema.fields if f.dtype in VECTOR_TYPES.values())
+        vector_type = next(name for name, dtype in VECTOR_TYPES.items() if dtype == field.dtype)
+        index = next((i for i in collection.indexes if i.field_name == field.name), None)
+        params = dict(index.params) if index is not None else {}
+        index_type = str(params.get("index_type", "FLAT")).upper()
+        if index_type not in INDEX_TYPES:
+            print(f"⚠️ Collection {collection.name} uses index {index_type}; searching it as FLAT")
+            index_type = "FLAT"
+        build = params.get("params") or {}
+        if isinstance(build, str):
+            build = json.loads(build)
+        build = {k: int(v) if str(v).isdigit() else v for k, v in build.items()}
+        search = MILVUS_SEARCH_PARAMS if index_type == MILVUS_INDEX_TYPE else None
+        return cls(index_type, str(params.get("metric_type", "L2")), vector_type, build, search)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, IndexSpec) and self.as_dict() == other.as_dict()
+
+    def __repr__(self) -> str:
+        return f"IndexSpec({self.as_dict()})"
+
+    def as_dict(self) -> dict:
+        return {"index_type": self.index_type, "metric": self.metric, "vector_type": self.vector_type,
+                "build_params": self.build_params, "search_params": self.search_params}
+
+    # -- collection setup ------------------------------------------------------------
+
+    @property
+    def dtype(self):
+        return VECTOR_TYPES[self.vector_type]
+
+    def index_params(self) -> dict:
+        return {"index_type": self.index_type, "metric_type": self.metric, "params": self.build_params}
+
+    def search_param(self) -> dict:
+        return {"metric_type": self.metric, "params": self.search_params}
+
+    # -- vectors ---------------------------------------------------------------------
+
+    @property
+    def normalized(self) -> bool:
+        return self.metric in ("COSINE", "IP")
+
+    def normalize(self, vectors) -> np.ndarray:
+        """float32 matrix of the vectors, unit length under COSINE and IP."""
+        if len(vectors) == 0:
+            return np.zeros((0, DIM), dtype=np.float32)
+        array = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        if self.normalized:
+            norms = np.linalg.norm(array, axis=1, keepdims=True)
+            array = array / np.where(norms > 0, norms, 1.0)
+        return array
+
+    def prepare(self, vectors) -> list:
+        """Vectors in the form this collection stores and searches."""
+        array = self.normalize(vectors)
+        if self.vector_type == "FLOAT16":
+            return list(array.astype(np.float16))
+        return array.tolist()
+
+    def decode(self, vector) -> list[float] | None:
+        """A stored vector (float list, float16 bytes or array) as a float list."""
+        if vector is None:
+            return None
+        if isinstance(vector, (list, tuple)) and len(vector) == 1 and isinstance(vector[0], (bytes, bytearray)):
+            vector = vector[0]
+        if isinstance(vector, (bytes, bytearray)):
+            return np.frombuffer(vector, dtype=np.float16).astype(np.float32).tolist()
+        return np.asarray(vector, dtype=np.float32).tolist()
+
+    def bytes_per_vector(self) -> int:
+        """Approximate index memory per vector, excluding the scalar fields."""
+        if self.index_type == "IVF_SQ8":
+            size = DIM
+        elif self.index_type == "IVF_PQ":
+            size = self.build_params["m"] * self.build_params["nbits"] // 8
+        else:
+            size = DIM * (2 if self.vector_type == "FLOAT16" else 4)
+        if self.index_type == "HNSW":
+            size += 2 * self.build_params["M"] * 4
+        return size
+
+    def distance(self, raw: float) -> float:
+        """Milvus hit distance as a lower-is-better squared L2 distance."""
+        if self.normalized:
+            return max(0.0, 2.0 - 2.0 * raw)
+        return raw
@@ -0,0 +1,178 @@
+"""
+BM25 keyword index over the ingested chunks.
+
+It uses SQLite FTS5: an inverted index over porter-stemmed unicode61 tokens
+that scores with BM25, stores postings compactly in b-tree segments and
+takes incremental inserts and deletes. MilvusClient mirrors every insert and
+stale-version delete here, so the index follows ingestion without a separate
+pass. To backfill chunks that were ingested before this index existed:
+
+    python -m vectorstore.lexical_index sync | optimize | stats
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+LEXICAL_INDEX_DB = os.getenv("LEXICAL_INDEX_DB", "lexical_index.sqlite")
+LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "1") == "1"
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_SQL_BATCH = 500
+
+_local = threading.local()
+
+
+def _get_conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(LEXICAL_INDEX_DB, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunk_fts USING fts5(
+                chunk, tokenize = 'porter unicode61 remove_diacritics 2'
+            );
+            CREATE TABLE IF NOT EXISTS chunk_docs (
+                rowid INTEGER PRIMARY KEY,
+                pdf_id TEXT NOT NULL UNIQUE,
+                file_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunk_docs_file_id ON chunk_docs (file_id);
+        """)
+        _local.conn = conn
+    return conn
+
+
+def query_terms(query: str) -> list[str]:
+    """Distinct lower-cased word tokens of a query, in order."""
+    return list(dict.fromkeys(token.lower() for token in _TOKEN.findall(query)))
+
+
+def _match_expression(terms: list[str]) -> str:
+    # Any term may match; BM25 rewards chunks that contain more (and rarer) ones.
+    # Quoting keeps FTS5 operators (AND, NEAR, ...) in user input literal.
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _delete_rowids(conn: sqlite3.Connection, rowids: list[int]):
+    for start in range(0, len(rowids), _SQL_BATCH):
+        batch = rowids[start:start + _SQL_BATCH]
+        marks = ",".join("?" * len(batch))
+        conn.execute(f"DELETE FROM chunk_fts WHERE rowid IN ({marks})", batch)
+        conn.execute(f"DELETE FROM chunk_docs WHERE rowid IN ({marks})", batch)
+
+
+def add(pdf_ids: list, file_ids: list, chunks: list):
+    """Index chunks; a chunk whose pdf_id is already indexed is replaced."""
+    if not pdf_ids:
+        return
+    conn = _get_conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        existing = []
+        for start in range(0, len(pdf_ids), _SQL_BATCH):
+            batch = pdf_ids[start:start + _SQL_BATCH]
+            existing += [rowid for (rowid,) in conn.execute(
+                f"SELECT rowid FROM chunk_docs WHERE pdf_id IN ({','.join('?' * len(batch))})", batch)]
+        _delete_rowids(conn, existing)
+        for pdf_id, file_id, chunk in zip(pdf_ids, file_ids, chunks):
+            rowid = conn.execute("INSERT INTO chunk_docs (pdf_id, file_id) VALUES (?, ?)", (pdf_id, file_id)).lastrowid
+            conn.execute("INSERT INTO chunk_fts (rowid, chunk) VALUES (?, ?)", (rowid, chunk))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def delete_stale_rows(file_id: str, keep_prefix: str) -> int:
+    """Lexical counterpart of MilvusClient.delete_stale_rows."""
+    conn = _get_conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rowids = [rowid for (rowid,) in conn.execute(
+            "SELECT rowid FROM chunk_docs WHERE file_id = ? AND substr(pdf_id, 1, ?) != ?",
+            (file_id, len(keep_prefix), keep_prefix),
+        )]
+        _delete_rowids(conn, rowids)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return len(rowids)
+
+
+def search(query: str, top_k: int = 20) -> list[dict]:
+    """
+    Top-k chunks by BM25, in the same shape as search_chunks results.
+    `score` is the BM25 score (higher is better).
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    rows = _get_conn().execute(
+        """
+        SELECT chunk_docs.pdf_id, chunk_docs.file_id, chunk_fts.chunk, bm25(chunk_fts) AS rank
+        FROM chunk_fts JOIN chunk_docs ON chunk_docs.rowid = chunk_fts.rowid
+        WHERE chunk_fts MATCH ?
+        ORDER BY rank
+        LIMIT ?
+        """,
+        (_match_expression(terms), top_k),
+    ).fetchall()
+    # FTS5 reports BM25 negated so that ascending order is best-first
+    return [
+        {"file_id": file_id, "pdf_id": pdf_id, "chunk": chunk, "score": -rank}
+        for pdf_id, file_id, chunk, rank in rows
+    ]
+
+
+def count() -> int:
+    return _get_conn().execute("SELECT COUNT(*) FROM chunk_docs").fetchone()[0]
+
+
+def optimize():
+    """Merge FTS5 b-tree segments into one; worth running after a large ingest."""
+    _get_conn().execute("INSERT INTO chunk_fts (chunk_fts) VALUES ('optimize')")
+
+
+def stats() -> dict:
+    conn = _get_conn()
+    return {
+        "chunks": count(),
+        "files": conn.execute("SELECT COUNT(DISTINCT file_id) FROM chunk_docs").fetchone()[0],
+        "db_mb": round(os.path.getsize(LEXICAL_INDEX_DB) / 1e6, 2) if os.path.exists(LEXICAL_INDEX_DB) else 0.0,
+    }
+
+
+def sync_from_milvus() -> int:
+    """Index every chunk currently in Milvus (idempotent: existing pdf_ids are replaced)."""
+    from vectorstore.local_index import iter_milvus_rows
+
+    total = 0
+    for pdf_ids, file_ids, chunks, _ in iter_milvus_rows(include_embeddings=False):
+        add(pdf_ids, file_ids, chunks)
+        total += len(pdf_ids)
+    optimize()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the BM25 keyword index.")
+    parser.add_argument("command", choices=["sync", "optimize", "stats"])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "sync":
+        print(f"🔤 Indexed {sync_from_milvus()} chunks from Milvus")
+    elif args.command == "optimize":
+        optimize()
+    print(json.dumps(stats(), indent=2))
+    if args.command != "stats":
+        print(f"⏱️ {args.command} took {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
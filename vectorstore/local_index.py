@@ -0,0 +1,603 @@
+"""
+An in-process copy of the `pdf_chunks` vectors for low-latency search.
+
+The embeddings live in a memory-mapped float32 matrix, with a SQLite sidecar
+holding pdf_id/file_id/chunk for every row. Every worker on the host maps
+the same files, so they share one copy in the page cache. Search is exact,
+or IVF over k-means lists when the index has been clustered, done with
+vectorized NumPy. Distances are squared L2, the same as the Milvus search.
+
+On-disk layout (LOCAL_INDEX_DIR):
+
+    CURRENT               name of the live generation
+    gen-<ns>/vectors.f32  rows x dim embeddings
+    gen-<ns>/norms.f32    squared norm per row
+    gen-<ns>/alive.u8     1 = live, 0 = deleted or replaced
+    gen-<ns>/lists.i32    IVF list per row, -1 = unassigned
+    gen-<ns>/centroids.f32
+    gen-<ns>/rows.sqlite  sidecar ids/text and meta (count, base_count, normalized)
+
+Ingestion appends rows and tombstones replaced ones in the live generation
+(MilvusClient mirrors its writes here when LOCAL_INDEX_SYNC is on). `sync`
+builds a fresh generation from a Milvus snapshot and `compact` rebuilds from
+the local rows. Both re-cluster, store rows grouped by IVF list and switch
+CURRENT atomically. Rows written by ingestion while a sync runs land in the
+old generation, so run sync when ingestion is idle.
+
+Rows are stored as the Milvus collection prepared them (unit length under
+COSINE/IP). Sync and mirrored writes record that in meta `normalized`, and
+queries are normalised to match, whatever MILVUS_METRIC says.
+
+    python -m vectorstore.local_index sync | compact | stats
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+# "milvus" sends every query to Milvus, "local" searches the mmap index (falling back to Milvus while it is empty)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "milvus")
+# Mirror ingestion writes into the local index; always on when searching locally
+LOCAL_INDEX_SYNC = SEARCH_BACKEND == "local" or os.getenv("LOCAL_INDEX_SYNC", "0") == "1"
+LOCAL_INDEX_MODE = os.getenv("LOCAL_INDEX_MODE", "auto")  # "auto" = IVF once clustered, "exact" = always scan
+LOCAL_INDEX_NLIST = int(os.getenv("LOCAL_INDEX_NLIST", "0"))  # 0 = about 4 * sqrt(rows)
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "16"))
+LOCAL_INDEX_IVF_MIN_ROWS = int(os.getenv("LOCAL_INDEX_IVF_MIN_ROWS", "20000"))
+LOCAL_INDEX_REFRESH_SECONDS = float(os.getenv("LOCAL_INDEX_REFRESH_SECONDS", "1"))
+
+DIM = 768
+_INITIAL_CAPACITY = 1024
+_SCAN_BLOCK_ROWS = 65536
+_SQL_BATCH = 500
+
+_ARRAYS = {
+    "vectors": ("vectors.f32", np.float32, True),
+    "norms": ("norms.f32", np.float32, False),
+    "alive": ("alive.u8", np.uint8, False),
+    "lists": ("lists.i32", np.int32, False),
+}
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _init_generation(path: str, dim: int, capacity: int = _INITIAL_CAPACITY) -> sqlite3.Connection:
+    os.makedirs(path, exist_ok=True)
+    for name, (filename, dtype, per_dim) in _ARRAYS.items():
+        with open(os.path.join(path, filename), "wb") as f:
+            f.truncate(capacity * np.dtype(dtype).itemsize * (dim if per_dim else 1))
+    conn = _connect(os.path.join(path, "rows.sqlite"))
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS rows (
+            row INTEGER PRIMARY KEY,
+            pdf_id TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            chunk TEXT NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS rows_pdf_id ON rows (pdf_id);
+        CREATE INDEX IF NOT EXISTS rows_file_id ON rows (file_id);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    """)
+    conn.executemany("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)",
+                     [("dim", dim), ("count", 0), ("base_count", 0)])
+    return conn
+
+
+def _meta(conn: sqlite3.Connection) -> dict:
+    return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+
+def _set_normalized(conn: sqlite3.Connection, normalized: bool):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('normalized', ?)", (int(normalized),))
+
+
+def _publish(root: str, generation: str):
+    tmp = os.path.join(root, "CURRENT.tmp")
+    with open(tmp, "w") as f:
+        f.write(generation)
+    os.replace(tmp, os.path.join(root, "CURRENT"))
+
+
+def _current(root: str) -> str | None:
+    try:
+        with open(os.path.join(root, "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _new_generation_name() -> str:
+    return f"gen-{time.time_ns():020d}"
+
+
+def _sq_norms(vectors: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", vectors, vectors)
+
+
+def _nearest_centroid(vectors: np.ndarray, centroids: np.ndarray, centroid_norms: np.ndarray) -> np.ndarray:
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), 8192):
+        block = np.asarray(vectors[start:start + 8192], dtype=np.float32)
+        out[start:start + len(block)] = np.argmin(centroid_norms[None, :] - 2.0 * block @ centroids.T, axis=1)
+    return out
+
+
+def train_ivf(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """k-means centroids over a sample of `vectors` (up to 64 points per list)."""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    nlist = max(1, min(nlist, n))
+    sample = np.asarray(vectors[np.sort(rng.choice(n, size=min(n, nlist * 64), replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest_centroid(sample, centroids, _sq_norms(centroids))
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        used = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[used]
+        centroids[used] = np.add.reduceat(sample[order], starts, axis=0) / counts[used, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            # Re-seed lists that lost all their points
+            centroids[empty] = sample[rng.choice(len(sample), size=len(empty), replace=False)]
+    return centroids
+
+
+class LocalVectorIndex:
+    """
+    One process's handle on the shared index. Readers pick up appended rows,
+    deletions and new generations within LOCAL_INDEX_REFRESH_SECONDS.
+    """
+
+    def __init__(self, root: str = LOCAL_INDEX_DIR, dim: int = DIM):
+        self.root = root
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._checked_at = 0.0
+        self.generation = None
+        os.makedirs(root, exist_ok=True)
+        if _current(root) is None:
+            name = _new_generation_name()
+            _init_generation(os.path.join(root, name), dim).close()
+            _publish(root, name)
+        self._open(_current(root))
+
+    # -- mapping ----------------------------------------------------------------------
+
+    def _path(self, *parts) -> str:
+        return os.path.join(self.root, self.generation, *parts)
+
+    def _open(self, generation: str):
+        self.generation = generation
+        self._conn = _connect(self._path("rows.sqlite"))
+        meta = _meta(self._conn)
+        if meta["dim"] != self.dim:
+            raise ValueError(f"Local index has dim {meta['dim']}, expected {self.dim}")
+        self.count = meta["count"]
+        self.base_count = meta["base_count"]
+        self._normalized = meta.get("normalized")
+        self._map()
+
+        centroids_path = self._path("centroids.f32")
+        if os.path.exists(centroids_path):
+            self.centroids = np.fromfile(centroids_path, dtype=np.float32).reshape(-1, self.dim)
+            self._centroid_norms = _sq_norms(self.centroids)
+            # Rows below base_count are stored grouped by list: list l is rows bounds[l]:bounds[l+1]
+            self._bounds = np.searchsorted(np.asarray(self.lists[:self.base_count]),
+                                           np.arange(len(self.centroids) + 1))
+        else:
+            self.centroids = None
+            self._bounds = None
+        self._checked_at = time.monotonic()
+
+    def _map(self):
+        capacity = os.path.getsize(self._path("norms.f32")) // 4
+        for name, (filename, dtype, per_dim) in _ARRAYS.items():
+            shape = (capacity, self.dim) if per_dim else (capacity,)
+            setattr(self, name, np.memmap(self._path(filename), dtype=dtype, mode="r+", shape=shape))
+        self.capacity = capacity
+
+    def _grow(self, rows: int):
+        capacity = max(rows, self.capacity * 2)
+        for filename, dtype, per_dim in _ARRAYS.values():
+            with open(self._path(filename), "r+b") as f:
+                f.truncate(capacity * np.dtype(dtype).itemsize * (self.dim if per_dim else 1))
+        self._map()
+
+    def refresh(self, force: bool = False):
+        """Pick up rows written by other processes and generation switches."""
+        if not force and time.monotonic() - self._checked_at < LOCAL_INDEX_REFRESH_SECONDS:
+            return
+        with self._lock:
+            current = _current(self.root)
+            if current != self.generation:
+                self._conn.close()
+                self._open(current)
+                return
+            meta = _meta(self._conn)
+            self.count = meta["count"]
+            self._normalized = meta.get("normalized")
+            if self.count > self.capacity:
+                self._map()
+            self._checked_at = time.monotonic()
+
+    @property
+    def normalized(self) -> bool:
+        """Whether rows are unit length; generations written before this was recorded follow MILVUS_METRIC."""
+        if self._normalized is None:
+            from vectorstore.index_config import IndexSpec
+            return IndexSpec.from_env().normalized
+        return bool(self._normalized)
+
+    def prepare_queries(self, vectors) -> np.ndarray:
+        """Query vectors as float32 rows, unit length when the stored rows are."""
+        array = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), self.dim)
+        if self.normalized:
+            norms = np.linalg.norm(array, axis=1, keepdims=True)
+            array = array / np.where(norms > 0, norms, 1.0)
+        return array
+
+    def _rows_conn(self) -> sqlite3.Connection:
+        # Per-thread read connection so concurrent searches don't share a cursor
+        if getattr(self._local, "generation", None) != self.generation:
+            self._local.conn = _connect(self._path("rows.sqlite"))
+            self._local.generation = self.generation
+        return self._local.conn
+
+    # -- writes -----------------------------------------------------------------------
+
+    def _tombstone(self, rows: list[int]):
+        if rows:
+            self.alive[rows] = 0
+            self._conn.executemany("UPDATE rows SET deleted = 1 WHERE row = ?", [(r,) for r in rows])
+
+    def add(self, pdf_ids: list, file_ids: list, chunks: list, embeddings: list, normalized: bool | None = None):
+        """
+        Append rows; an existing row with the same pdf_id is replaced.
+        `normalized` records whether the writer's collection stores unit vectors.
+        """
+        if not pdf_ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(pdf_ids), self.dim)
+        with self._lock:
+            self.refresh(force=True)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                meta = _meta(self._conn)
+                count = meta["count"]
+                if normalized is not None and meta.get("normalized") not in (None, int(normalized)) and count:
+                    print("⚠️ Local index rows were written under another metric; "
+                          "run `python -m vectorstore.local_index sync`")
+                if normalized is not None:
+                    _set_normalized(self._conn, normalized)
+                    self._normalized = int(normalized)
+                replaced = []
+                for start in range(0, len(pdf_ids), _SQL_BATCH):
+                    batch = pdf_ids[start:start + _SQL_BATCH]
+                    replaced += [row for (row,) in self._conn.execute(
+                        f"SELECT row FROM rows WHERE deleted = 0 AND pdf_id IN ({','.join('?' * len(batch))})",
+                        batch)]
+                self._tombstone(replaced)
+
+                end = count + len(pdf_ids)
+                if end > self.capacity:
+                    self._grow(end)
+                self.vectors[count:end] = vectors
+                self.norms[count:end] = _sq_norms(vectors)
+                self.lists[count:end] = (_nearest_centroid(vectors, self.centroids, self._centroid_norms)
+                                         if self.centroids is not None else -1)
+                self.alive[count:end] = 1
+                for array in (self.vectors, self.norms, self.lists, self.alive):
+                    array.flush()
+
+                self._conn.executemany(
+                    "INSERT INTO rows (row, pdf_id, file_id, chunk) VALUES (?, ?, ?, ?)",
+                    zip(range(count, end), pdf_ids, file_ids, chunks),
+                )
+                self._conn.execute("UPDATE meta SET value = ? WHERE key = 'count'", (end,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.count = end
+
+    def delete_stale_rows(self, file_id: str, keep_prefix: str) -> int:
+        """Local counterpart of MilvusClient.delete_stale_rows."""
+        with self._lock:
+            self.refresh(force=True)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = [row for (row,) in self._conn.execute(
+                    "SELECT row FROM rows WHERE file_id = ? AND deleted = 0 AND substr(pdf_id, 1, ?) != ?",
+                    (file_id, len(keep_prefix), keep_prefix),
+                )]
+                self._tombstone(rows)
+                self.alive.flush()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return len(rows)
+
+    # -- search -----------------------------------------------------------------------
+
+    def _candidates(self, query: np.ndarray, nprobe: int, count: int):
+        """Yield (row indices, partial distances ||x||^2 - 2 q.x) to consider."""
+        if self.centroids is None or LOCAL_INDEX_MODE == "exact":
+            for start in range(0, count, _SCAN_BLOCK_ROWS):
+                end = min(start + _SCAN_BLOCK_ROWS, count)
+                yield np.arange(start, end), self.norms[start:end] - 2.0 * (self.vectors[start:end] @ query)
+            return
+
+        centroid_dist = self._centroid_norms - 2.0 * (self.centroids @ query)
+        nprobe = min(max(1, nprobe), len(self.centroids))
+        probe = np.argpartition(centroid_dist, nprobe - 1)[:nprobe]
+        for l in probe:
+            start, end = self._bounds[l], self._bounds[l + 1]
+            if end > start:
+                # Contiguous slice of the mmap, no copy
+                yield np.arange(start, end), self.norms[start:end] - 2.0 * (self.vectors[start:end] @ query)
+        if count > self.base_count:
+            # Rows appended since the last clustering: scan those in probed lists or unassigned
+            tail_lists = np.asarray(self.lists[self.base_count:count])
+            rows = np.flatnonzero(np.isin(tail_lists, probe) | (tail_lists < 0)) + self.base_count
+            if len(rows):
+                yield rows, self.norms[rows] - 2.0 * (self.vectors[rows] @ query)
+
+    def search(self, query_embedding, top_k: int = 20, nprobe: int = LOCAL_INDEX_NPROBE,
+               with_embeddings: bool = False) -> list[dict]:
+        """Top-k rows by squared L2 distance, in the same shape as search_chunks results."""
+        self.refresh()
+        query = np.asarray(query_embedding, dtype=np.float32)
+        count = self.count
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_dist = np.empty(0, dtype=np.float32)
+        for rows, dist in self._candidates(query, nprobe, count):
+            live = np.asarray(self.alive[rows], dtype=bool)
+            rows, dist = np.concatenate((best_rows, rows[live])), np.concatenate((best_dist, dist[live]))
+            if len(rows) > top_k:
+                keep = np.argpartition(dist, top_k - 1)[:top_k]
+                rows, dist = rows[keep], dist[keep]
+            best_rows, best_dist = rows, dist
+
+        order = np.argsort(best_dist, kind="stable")
+        best_rows = best_rows[order].tolist()
+        distances = np.maximum(best_dist[order] + float(query @ query), 0.0).tolist()
+        if not best_rows:
+            return []
+
+        conn = self._rows_conn()
+        found = {
+            row: (pdf_id, file_id, chunk)
+            for row, pdf_id, file_id, chunk in conn.execute(
+                f"SELECT row, pdf_id, file_id, chunk FROM rows WHERE row IN ({','.join('?' * len(best_rows))})",
+                best_rows,
+            )
+        }
+        results = [
+            {"file_id": found[row][1], "pdf_id": found[row][0], "chunk": found[row][2], "score": distance}
+            for row, distance in zip(best_rows, distances) if row in found
+        ]
+        if with_embeddings:
+            rows = [row for row in best_rows if row in found]
+            for result, vector in zip(results, np.asarray(self.vectors[rows]).tolist()):
+                result["embedding"] = vector
+        return results
+
+    def get_embeddings(self, pdf_ids: list) -> dict:
+        """{pdf_id: embedding} for the live rows among `pdf_ids`."""
+        if not pdf_ids:
+            return {}
+        self.refresh()
+        found = self._rows_conn().execute(
+            f"SELECT row, pdf_id FROM rows WHERE deleted = 0 AND pdf_id IN ({','.join('?' * len(pdf_ids))})",
+            list(pdf_ids),
+        ).fetchall()
+        vectors = np.asarray(self.vectors[[row for row, _ in found]]).tolist()
+        return {pdf_id: vector for (_, pdf_id), vector in zip(found, vectors)}
+
+    # -- rebuilds ---------------------------------------------------------------------
+
+    def iter_rows(self, batch_size: int = 1000):
+        """Live rows as (pdf_ids, file_ids, chunks, embeddings) batches."""
+        self.refresh(force=True)
+        conn = self._rows_conn()
+        last = -1
+        while True:
+            batch = conn.execute(
+                "SELECT row, pdf_id, file_id, chunk FROM rows WHERE deleted = 0 AND row > ? ORDER BY row LIMIT ?",
+                (last, batch_size),
+            ).fetchall()
+            if not batch:
+                return
+            rows = [b[0] for b in batch]
+            last = rows[-1]
+            yield [b[1] for b in batch], [b[2] for b in batch], [b[3] for b in batch], np.asarray(self.vectors[rows])
+
+    def stats(self) -> dict:
+        self.refresh(force=True)
+        live = int(np.count_nonzero(self.alive[:self.count]))
+        return {
+            "generation": self.generation,
+            "rows": self.count,
+            "live_rows": live,
+            "deleted_rows": self.count - live,
+            "clustered_rows": self.base_count,
+            "nlist": 0 if self.centroids is None else len(self.centroids),
+            "nprobe": LOCAL_INDEX_NPROBE,
+            "normalized": self.normalized,
+            "mode": "ivf" if self.centroids is not None and LOCAL_INDEX_MODE != "exact" else "exact",
+            "mapped_mb": round(self.capacity * (self.dim * 4 + 9) / 1e6, 1),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def build_generation(batches, root: str = LOCAL_INDEX_DIR, dim: int = DIM, nlist: int = LOCAL_INDEX_NLIST,
+                     normalized: bool | None = None) -> str:
+    """
+    Write a new generation from (pdf_ids, file_ids, chunks, embeddings) batches,
+    cluster it when it is large enough, store rows grouped by list, and make it current.
+    `normalized` is recorded in meta (see LocalVectorIndex.normalized).
+    """
+    name = _new_generation_name()
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    staging_path = os.path.join(path, "staging.f32")
+    conn = _connect(os.path.join(path, "rows.sqlite"))
+    conn.execute("CREATE TABLE staging (row INTEGER PRIMARY KEY, pdf_id TEXT, file_id TEXT, chunk TEXT)")
+
+    n = 0
+    seen = set()
+    with open(staging_path, "wb") as staging:
+        for pdf_ids, file_ids, chunks, embeddings in batches:
+            vectors = np.asarray(embeddings, dtype=np.float32).reshape(-1, dim)
+            keep = [i for i, pdf_id in enumerate(pdf_ids) if pdf_id not in seen]
+            seen.update(pdf_ids)
+            staging.write(vectors[keep].tobytes())
+            conn.execute("BEGIN")
+            conn.executemany("INSERT INTO staging VALUES (?, ?, ?, ?)",
+                             ((n + j, pdf_ids[i], file_ids[i], chunks[i]) for j, i in enumerate(keep)))
+            conn.execute("COMMIT")
+            n += len(keep)
+    conn.close()
+
+    conn = _init_generation(path, dim, capacity=max(n, _INITIAL_CAPACITY))
+    if normalized is not None:
+        _set_normalized(conn, normalized)
+    if n:
+        raw = np.memmap(staging_path, dtype=np.float32, mode="r", shape=(n, dim))
+        if n >= LOCAL_INDEX_IVF_MIN_ROWS:
+            centroids = train_ivf(raw, nlist or int(4 * np.sqrt(n)))
+            lists = _nearest_centroid(raw, centroids, _sq_norms(centroids))
+            order = np.argsort(lists, kind="stable")
+            centroids.tofile(os.path.join(path, "centroids.f32"))
+        else:
+            lists = np.full(n, -1, dtype=np.int32)
+            order = np.arange(n)
+
+        out = {name: np.memmap(os.path.join(path, filename), dtype=dtype, mode="r+",
+                               shape=(max(n, _INITIAL_CAPACITY), dim) if per_dim else (max(n, _INITIAL_CAPACITY),))
+               for name, (filename, dtype, per_dim) in _ARRAYS.items()}
+        for start in range(0, n, _SCAN_BLOCK_ROWS):
+            block = order[start:start + _SCAN_BLOCK_ROWS]
+            vectors = np.asarray(raw[block])
+            out["vectors"][start:start + len(block)] = vectors
+            out["norms"][start:start + len(block)] = _sq_norms(vectors)
+            out["lists"][start:start + len(block)] = lists[block]
+            out["alive"][start:start + len(block)] = 1
+        for array in out.values():
+            array.flush()
+        del raw, out
+
+        conn.execute("BEGIN")
+        conn.execute("CREATE TEMP TABLE perm (new_row INTEGER PRIMARY KEY, old_row INTEGER)")
+        conn.executemany("INSERT INTO perm VALUES (?, ?)", enumerate(order.tolist()))
+        conn.execute("""
+            INSERT INTO rows (row, pdf_id, file_id, chunk)
+            SELECT perm.new_row, staging.pdf_id, staging.file_id, staging.chunk
+            FROM perm JOIN staging ON staging.row = perm.old_row
+        """)
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'count'", (n,))
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'base_count'",
+                     (n if os.path.exists(os.path.join(path, "centroids.f32")) else 0,))
+        conn.execute("COMMIT")
+    conn.execute("DROP TABLE staging")
+    conn.close()
+    os.remove(staging_path)
+
+    previous = _current(root)
+    _publish(root, name)
+    # Keep the previous generation for readers that have not refreshed yet
+    for entry in os.listdir(root):
+        if entry.startswith("gen-") and entry not in (name, previous):
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+    print(f"🗂️ Local index generation {name}: {n} rows")
+    return name
+
+
+def iter_milvus_rows(batch_size: int = 1000, include_embeddings: bool = True, client=None):
+    """
+    Snapshot of a Milvus collection (default: the shared client's) as
+    (pdf_ids, file_ids, chunks, embeddings) batches.
+    """
+    from vectorstore.milvus_client import get_milvus_client
+
+    client = client or get_milvus_client()
+    collection = client.collection
+    collection.load()
+    fields = ["pdf_id", "file_id", "chunk"] + (["embedding"] if include_embeddings else [])
+    iterator = collection.query_iterator(batch_size=batch_size, expr='pdf_id != ""', output_fields=fields)
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                return
+            yield ([r["pdf_id"] for r in batch], [r["file_id"] for r in batch],
+                   [r["chunk"] for r in batch], [client.spec.decode(r.get("embedding")) for r in batch])
+    finally:
+        iterator.close()
+
+
+def sync_from_milvus(root: str = LOCAL_INDEX_DIR) -> str:
+    from vectorstore.milvus_client import get_milvus_client
+
+    client = get_milvus_client()
+    return build_generation(iter_milvus_rows(client=client), root, normalized=client.spec.normalized)
+
+
+def compact(root: str = LOCAL_INDEX_DIR, dim: int = DIM) -> str:
+    """Rebuild from the local rows: drops deleted rows and re-clusters appended ones."""
+    index = LocalVectorIndex(root, dim)
+    try:
+        return build_generation(index.iter_rows(), root, dim, normalized=index.normalized)
+    finally:
+        index.close()
+
+
+_index: LocalVectorIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_local_index() -> LocalVectorIndex:
+    """Process-wide handle on the shared local index."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LocalVectorIndex()
+    return _index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the local memory-mapped vector index.")
+    parser.add_argument("command", choices=["sync", "compact", "stats"])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "sync":
+        sync_from_milvus()
+    elif args.command == "compact":
+        compact()
+    print(json.dumps(LocalVectorIndex().stats(), indent=2))
+    if args.command != "stats":
+        print(f"⏱️ {args.command} took {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
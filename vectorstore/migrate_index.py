@@ -0,0 +1,94 @@
+"""
+Copy the chunks collection into a new collection with a different vector index.
+
+    python -m vectorstore.migrate_index --target pdf_chunks_hnsw --index-type HNSW --metric COSINE
+    python -m vectorstore.migrate_index --target pdf_chunks_sq8 --index-type IVF_SQ8 \
+        --index-params '{"nlist": 2048}' --vector-type FLOAT16
+
+Rows are read with a query iterator and written to the target as they are,
+so nothing is re-embedded: vectors are only normalised (COSINE/IP) and cast
+(FLOAT16) on the way in. The source is left untouched until the row counts
+match; then point MILVUS_COLLECTION at the target (and MILVUS_INDEX_TYPE /
+MILVUS_METRIC / MILVUS_VECTOR_TYPE at its spec) and restart. When the metric
+changes, rebuild the local index too: `python -m vectorstore.local_index sync`.
+"""
+import argparse
+import json
+import time
+
+from pymilvus import utility
+
+from vectorstore.index_config import IndexSpec, INDEX_TYPES, METRICS, VECTOR_TYPES
+from vectorstore.local_index import iter_milvus_rows
+from vectorstore.milvus_client import COLLECTION_NAME, MilvusClient, _connect
+
+
+def _row_count(client: MilvusClient) -> int:
+    rows = client.collection.query(expr="", output_fields=["count(*)"], consistency_level="Strong")
+    return rows[0]["count(*)"]
+
+
+def migrate(source: str, target: str, spec: IndexSpec, batch_size: int = 1000,
+            replace: bool = False, drop_source: bool = False) -> int:
+    """Copy every row of `source` into a new `target` collection built with `spec`; returns the row count."""
+    _connect("migrate_source")
+    if not utility.has_collection(source, using="migrate_source"):
+        raise ValueError(f"Source collection {source} does not exist")
+    if utility.has_collection(target, using="migrate_source"):
+        if not replace:
+            raise ValueError(f"Target collection {target} already exists; pass --replace to drop it")
+        print(f"🗑️ Dropping existing collection {target}")
+        utility.drop_collection(target, using="migrate_source")
+    source_client = MilvusClient(alias="migrate_source", collection_name=source)
+
+    print(f"🔁 {source} ({source_client.spec.index_params()}, {source_client.spec.vector_type}) -> "
+          f"{target} ({spec.index_params()}, {spec.vector_type})")
+    target_client = MilvusClient(alias="migrate_target", collection_name=target, spec=spec)
+    start = time.perf_counter()
+    copied = 0
+    try:
+        # The local and lexical indexes already hold these rows
+        with target_client.bulk_writer(mirror=False) as writer:
+            for pdf_ids, file_ids, chunks, embeddings in iter_milvus_rows(batch_size, client=source_client):
+                writer.add({"pdf_id": pdf_ids, "file_id": file_ids, "chunk": chunks, "embedding": embeddings})
+                copied += len(pdf_ids)
+                print(f"📦 {copied} rows copied ({copied / (time.perf_counter() - start):.0f} rows/s)")
+
+        utility.wait_for_index_building_complete(target, using=target_client.alias)
+        target_client.load()
+        # num_entities counts sealed segments, deletes and duplicate keys included; count(*) is what a query sees
+        expected = _row_count(source_client)
+        actual = _row_count(target_client)
+        if actual != expected:
+            raise RuntimeError(f"Row count mismatch: {source} has {expected}, {target} has {actual}")
+        print(f"✅ {actual} rows migrated to {target} in {time.perf_counter() - start:.1f}s")
+
+        if drop_source:
+            print(f"🗑️ Dropping source collection {source}")
+            source_client.collection.release()
+            utility.drop_collection(source, using=source_client.alias)
+        return actual
+    finally:
+        source_client.close()
+        target_client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-index the chunks collection into a new collection.")
+    parser.add_argument("--source", default=COLLECTION_NAME)
+    parser.add_argument("--target", required=True)
+    parser.add_argument("--index-type", choices=INDEX_TYPES, required=True)
+    parser.add_argument("--metric", choices=METRICS, default="COSINE")
+    parser.add_argument("--vector-type", choices=list(VECTOR_TYPES), default="FLOAT")
+    parser.add_argument("--index-params", default="{}", help="JSON build params, merged over the defaults")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--replace", action="store_true", help="Drop the target collection if it exists")
+    parser.add_argument("--drop-source", action="store_true", help="Drop the source once the counts match")
+    args = parser.parse_args()
+
+    spec = IndexSpec(args.index_type, args.metric, args.vector_type, json.loads(args.index_params))
+    migrate(args.source, args.target, spec, args.batch_size, args.replace, args.drop_source)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,90 @@
 from pymilvus import connections, Collection, utility, FieldSchema, CollectionSchema, DataType
 import os
+import queue
+import threading
+from contextlib import contextmanager
+from utils import response_cache
+from utils.instrumentation import MILVUS_ROWS, MILVUS_BYTES, span
+from vectorstore.index_config import DIM, IndexSpec
+from vectorstore.local_index import LOCAL_INDEX_SYNC, get_local_index
+from vectorstore import lexical_index
+
+COLLECTION_NAME = os.getenv("MILVUS_COLLECTION", "pdf_chunks")
+MILVUS_POOL_SIZE = int(os.getenv("MILVUS_POOL_SIZE", "4"))
+
+# Bulk writes: buffer rows until either limit is hit, flush (seal segments) only at the end or on a timer
+MILVUS_BULK_MAX_ROWS = int(os.getenv("MILVUS_BULK_MAX_ROWS", "5000"))
+MILVUS_BULK_MAX_BYTES = int(os.getenv("MILVUS_BULK_MAX_BYTES", str(64 * 1024 * 1024)))
+MILVUS_FLUSH_INTERVAL = float(os.getenv("MILVUS_FLUSH_INTERVAL", "0"))  # seconds, 0 = only at close
+MILVUS_COMPACT_AFTER_INGEST = os.getenv("MILVUS_COMPACT_AFTER_INGEST", "0") == "1"
+
+COLUMNS = ("pdf_id", "file_id", "chunk", "embedding")
+
+
+def _mirror(name: str, update):
+    # Secondary indexes follow Milvus writes; a failure there must not fail ingestion
+    try:
+        update()
+    except Exception as e:
+        print(f"⚠️ {name} update failed, run `python -m vectorstore.{name} sync`: {e}")
+
+
+def _connect(alias: str):
+    uri = os.getenv("MILVUS_URL")
+    user = os.getenv("MILVUS_USER")
+    password = os.getenv("MILVUS_PASSWORD")
+    connections.connect(alias=alias, uri=uri, user=user, password=password)
+
 
 class MilvusClient:
-    def __init__(self):
-        self.collection_name = "pdf_chunks"
-        self.index_params = {
-            "index_type": "IVF_FLAT",
-            "metric_type": "L2",
-            "params": {"nlist": 128}
-        }
+    def __init__(self, alias: str = "default", collection_name: str = COLLECTION_NAME,
+                 spec: IndexSpec | None = None):
+        """
+        `spec` (default: from the environment) is only used to create a missing
+        collection; an existing one is always used with the index it was built with.
+        """
+        self.collection_name = collection_name
+        self.alias = alias
 
-        uri = os.getenv("MILVUS_URL")
-        user = os.getenv("MILVUS_USER")
-        password = os.getenv("MILVUS_PASSWORD")
-        connections.connect(alias="default", uri=uri, user=user, password=password)
+        _connect(self.alias)
 
-        if not utility.has_collection(self.collection_name):
-            self._create_schema()
+        if not utility.has_collection(self.collection_name, using=self.alias):
+            self._create_schema(spec or IndexSpec.from_env())
 
-        self.collection = Collection(self.collection_name)
+        self.collection = Collection(self.collection_name, using=self.alias)
+        self.spec = IndexSpec.from_collection(self.collection)
 
-    def _create_schema(self):
+    def _create_schema(self, spec: IndexSpec):
         fields = [
             FieldSchema(name="pdf_id", dtype=DataType.VARCHAR, max_length=100, is_primary=True, auto_id=False),
             FieldSchema(name="file_id", dtype=DataType.VARCHAR, max_length=2048),
             FieldSchema(name="chunk", dtype=DataType.VARCHAR, max_length=8192),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=768),
+            FieldSchema(name="embedding", dtype=spec.dtype, dim=DIM),
         ]
         schema = CollectionSchema(fields, description="PDF Embeddings")
-        collection = Collection(name=self.collection_name, schema=schema)
+        collection = Collection(name=self.collection_name, schema=schema, using=self.alias)
 
         # Create index on embedding vector field
-        for field in fields:
-            if field.dtype == DataType.FLOAT_VECTOR:
-                collection.create_index(field_name=field.name, index_params=self.index_params)
-                break
+        collection.create_index(field_name="embedding", index_params=spec.index_params())
 
         collection.load()  # Load collection to make it ready for insert/search
 
-    def insert(self, data: dict):
+    def reconnect(self):
+        """Drop the (possibly broken) channel for this alias and open a fresh one."""
+        try:
+            connections.disconnect(self.alias)
+        except Exception as e:
+            print(f"⚠️ Milvus disconnect for alias {self.alias} failed: {e}")
+        _connect(self.alias)
+        self.collection = Collection(self.collection_name, using=self.alias)
+
+    def load(self):
+        self.collection.load()
+
+    def close(self):
+        connections.disconnect(self.alias)
+
+    def insert(self, data: dict, flush: bool = True, mirror: bool = True):
         # Data should be list of lists, each list representing column values for many rows
         # Example:
         # data = {
@@ -47,10 +93,249 @@ class MilvusClient:
         #    "chunk": [chunk1, chunk2, chunk3],
         #    "embedding": [embedding1, embedding2, embedding3]
         # }
-        self.collection.insert([
+        # Embeddings are stored as the index expects them (unit length for COSINE/IP, float16).
+        # Upsert, not insert: chunk ids are deterministic, so a retried or resumed file writes the
+        # same primary keys again, and Milvus does not deduplicate inserted keys
+        self.collection.upsert([
             data["pdf_id"],
             data["file_id"],
             data["chunk"],
-            data["embedding"]
+            self.spec.prepare(data["embedding"])
         ])
-        self.collection.flush()
+        MILVUS_ROWS.inc(len(data["pdf_id"]), op="insert")
+        MILVUS_BYTES.inc(sum(BulkWriter._row_bytes(*row) for row in zip(*(data[c] for c in COLUMNS))), op="insert")
+        # Every flush seals a segment; bulk ingestion should go through bulk_writer() instead
+        if flush:
+            self.collection.flush()
+        if not mirror:
+            return
+        if LOCAL_INDEX_SYNC:
+            # The local index ranks by L2, which matches the collection's order on normalized vectors
+            _mirror("local_index", lambda: get_local_index().add(
+                data["pdf_id"], data["file_id"], data["chunk"], self.spec.normalize(data["embedding"]),
+                normalized=self.spec.normalized))
+        if lexical_index.LEXICAL_INDEX_ENABLED:
+            _mirror("lexical_index", lambda: lexical_index.add(data["pdf_id"], data["file_id"], data["chunk"]))
+        # Cached search responses may now be missing these rows
+        response_cache.invalidate()
+
+    def delete_stale_rows(self, file_id: str, keep_prefix: str):
+        """
+        Remove rows of older versions of `file_id`. Called after the new version
+        has been inserted, so the file never disappears from search in between.
+        """
+        result = self.collection.delete(f'file_id == "{file_id}" and not (pdf_id like "{keep_prefix}%")')
+        deleted = getattr(result, "delete_count", 0) or 0
+        MILVUS_ROWS.inc(deleted, op="delete")
+        if LOCAL_INDEX_SYNC:
+            _mirror("local_index", lambda: get_local_index().delete_stale_rows(file_id, keep_prefix))
+        if lexical_index.LEXICAL_INDEX_ENABLED:
+            _mirror("lexical_index", lambda: lexical_index.delete_stale_rows(file_id, keep_prefix))
+        if deleted:
+            response_cache.invalidate()
+
+    def bulk_writer(self, **kwargs) -> "BulkWriter":
+        return BulkWriter(self, **kwargs)
+
+    def compact_and_reindex(self, rebuild_index: bool = False):
+        """
+        Merge the small segments left by ingestion and optionally rebuild the
+        vector index over the merged segments.
+        """
+        print("🧹 Compacting collection...")
+        self.collection.compact()
+        self.collection.wait_for_compaction_completed()
+        if rebuild_index:
+            print("🔁 Rebuilding vector index...")
+            self.collection.release()
+            self.collection.drop_index()
+            self.collection.create_index(field_name="embedding", index_params=self.spec.index_params())
+            self.collection.load()
+
+
+class BulkWriter:
+    """
+    Buffers column batches and inserts them in large batches.
+
+    Rows are sent once MILVUS_BULK_MAX_ROWS rows or MILVUS_BULK_MAX_BYTES bytes
+    are buffered; the collection is flushed only on flush()/close() or every
+    `flush_interval` seconds. Use it as a context manager so the final flush
+    always happens:
+
+        with milvus.bulk_writer() as writer:
+            writer.add({"pdf_id": [...], "file_id": [...], "chunk": [...], "embedding": [...]})
+    """
+
+    def __init__(self, client: MilvusClient, max_rows: int = MILVUS_BULK_MAX_ROWS,
+                 max_bytes: int = MILVUS_BULK_MAX_BYTES, flush_interval: float = MILVUS_FLUSH_INTERVAL,
+                 compact_on_close: bool = MILVUS_COMPACT_AFTER_INGEST, mirror: bool = True):
+        self.client = client
+        self.mirror = mirror
+        self.max_rows = max(1, max_rows)
+        self.max_bytes = max(1, max_bytes)
+        self.compact_on_close = compact_on_close
+        self._buffer = {column: [] for column in COLUMNS}
+        self._buffered_bytes = 0
+        self._unflushed = False
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+
+        self.rows_inserted = 0
+        self.inserts = 0
+        self.flushes = 0
+
+        self._timer = None
+        if flush_interval and flush_interval > 0:
+            self._timer = threading.Thread(target=self._flush_periodically, args=(flush_interval,), daemon=True)
+            self._timer.start()
+
+    @staticmethod
+    def _row_bytes(pdf_id, file_id, chunk, embedding) -> int:
+        return len(pdf_id) + len(file_id) + len(chunk.encode("utf-8")) + 4 * len(embedding)
+
+    def add(self, data: dict):
+        with self._lock:
+            if self._closed.is_set():
+                raise RuntimeError("BulkWriter is closed")
+            for row in zip(*(data[column] for column in COLUMNS)):
+                for column, value in zip(COLUMNS, row):
+                    self._buffer[column].append(value)
+                self._buffered_bytes += self._row_bytes(*row)
+            if len(self._buffer["pdf_id"]) >= self.max_rows or self._buffered_bytes >= self.max_bytes:
+                self._insert_buffer()
+
+    def _insert_buffer(self):
+        rows = len(self._buffer["pdf_id"])
+        if not rows:
+            return
+        with span("insert", pipeline="ingest", rows=rows):
+            self.client.insert(self._buffer, flush=False, mirror=self.mirror)
+        self._buffer = {column: [] for column in COLUMNS}
+        self._buffered_bytes = 0
+        self._unflushed = True
+        self.rows_inserted += rows
+        self.inserts += 1
+
+    def flush(self):
+        with self._lock:
+            self._insert_buffer()
+            if self._unflushed:
+                self.client.collection.flush()
+                self._unflushed = False
+                self.flushes += 1
+                if self.mirror:
+                    response_cache.invalidate()
+
+    def _flush_periodically(self, interval: float):
+        while not self._closed.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Periodic Milvus flush failed: {e}")
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        try:
+            self.flush()
+        finally:
+            self._closed.set()
+        print(f"💾 Bulk writer: {self.rows_inserted} rows in {self.inserts} inserts, {self.flushes} flush(es)")
+        if self.compact_on_close and self.rows_inserted:
+            self.client.compact_and_reindex()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class MilvusSearchPool:
+    """
+    A fixed set of Milvus connections, each on its own alias and therefore its
+    own gRPC channel, handed out to concurrent searches. A search that fails on
+    a broken channel reconnects that alias and is retried once.
+    """
+
+    def __init__(self, size: int = MILVUS_POOL_SIZE):
+        self._clients = [MilvusClient(alias=f"{COLLECTION_NAME}_search_{i}") for i in range(max(1, size))]
+        self.spec = self._clients[0].spec
+        # Loading is collection-wide on the server; one call is enough
+        self._clients[0].load()
+        self._idle: queue.Queue[MilvusClient] = queue.Queue()
+        for client in self._clients:
+            self._idle.put(client)
+
+    @contextmanager
+    def acquire(self):
+        client = self._idle.get()
+        try:
+            yield client
+        finally:
+            self._idle.put(client)
+
+    def search(self, **kwargs):
+        with self.acquire() as client:
+            try:
+                return client.collection.search(**kwargs)
+            except Exception as e:
+                print(f"⚠️ Milvus search on {client.alias} failed ({e}); reconnecting")
+                client.reconnect()
+                return client.collection.search(**kwargs)
+
+    def close(self):
+        for client in self._clients:
+            try:
+                client.close()
+            except Exception as e:
+                print(f"⚠️ Error closing Milvus alias {client.alias}: {e}")
+
+
+_client: MilvusClient | None = None
+_pool: MilvusSearchPool | None = None
+_lock = threading.Lock()
+
+
+def get_milvus_client() -> MilvusClient:
+    """Process-wide client used by ingestion; created on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = MilvusClient()
+                configured = IndexSpec.from_env()
+                if (_client.spec.index_params(), _client.spec.vector_type) != (configured.index_params(),
+                                                                              configured.vector_type):
+                    print(f"⚠️ Collection {_client.collection_name} was built as {_client.spec.index_params()} "
+                          f"({_client.spec.vector_type}), not the configured {configured.index_params()} "
+                          f"({configured.vector_type}); run `python -m vectorstore.migrate_index` to switch")
+    return _client
+
+
+def get_search_pool() -> MilvusSearchPool:
+    """Process-wide search pool; created on first use if startup didn't connect."""
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = MilvusSearchPool()
+    return _pool
+
+
+def connect_milvus():
+    """Open the shared client and search pool and make sure the collection is loaded."""
+    get_milvus_client()
+    get_search_pool()
+
+
+def close_milvus():
+    global _client, _pool
+    with _lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        if _client is not None:
+            _client.close()
+            _client = None